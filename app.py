@@ -1,58 +1,139 @@
+import os
 from flask import Flask, render_template
 from flask_login import LoginManager
-from flask_migrate import Migrate
-from models.database import db
-from models.user import User
-from controllers.auth_controller import auth_bp
-from controllers.admin_controller import admin_bp
-from controllers.user_controller import user_bp
-from controllers.api_controller import api_bp
-from models.user import create_admin_user  
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'bae15670c1336191a65f0968'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///parking_app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-
-# Initialize login manager
+from models.database import db, database_uri, engine_options, configure_sqlite
+from services import timezones
+from services.jobs import job_runner
+from services.metrics import request_metrics
+from services.occupancy import occupancy_index
+
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Served from the per-process identity cache; misses fall back to the database
+    from services.identity import user_cache
+    return user_cache.load(int(user_id))
+
+def create_app(config=None):
+    """Build the application.
+
+    Settings come from the environment, then the PARKING_SETTINGS file, then
+    ``config``. Nothing here touches the database; run ``flask init-db`` once
+    per deployment to create the tables and the admin user.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'bae15670c1336191a65f0968'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///parking_app.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    app.config['AVAILABILITY_CACHE_TTL'] = int(os.environ.get('AVAILABILITY_CACHE_TTL', 5))
+    app.config['OCCUPANCY_STREAM_HEARTBEAT'] = int(os.environ.get('OCCUPANCY_STREAM_HEARTBEAT', 15))
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 300))
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    app.config['DISPLAY_TIMEZONE'] = os.environ.get('DISPLAY_TIMEZONE', 'Asia/Kolkata')
+    app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+    app.config['LISTING_TOTALS'] = os.environ.get('LISTING_TOTALS', 'approximate')
+    app.config['BOOKING_HORIZON_DAYS'] = int(os.environ.get('BOOKING_HORIZON_DAYS', 30))
+    app.config['BOOKING_MAX_HOURS'] = int(os.environ.get('BOOKING_MAX_HOURS', 24))
+    app.config['BOOKING_CHECK_IN_MINUTES'] = int(os.environ.get('BOOKING_CHECK_IN_MINUTES', 15))
+    app.config['JOBS_ENABLED'] = os.environ.get('JOBS_ENABLED', '0') == '1'
+    app.config['JOBS_POLL_SECONDS'] = int(os.environ.get('JOBS_POLL_SECONDS', 30))
+    app.config['JOBS_LEASE_SECONDS'] = int(os.environ.get('JOBS_LEASE_SECONDS', 300))
+    app.config['JOBS_RUN_SECONDS'] = int(os.environ.get('JOBS_RUN_SECONDS', 20))
+    app.config['OVERSTAY_SWEEP_SECONDS'] = int(os.environ.get('OVERSTAY_SWEEP_SECONDS', 300))
+    app.config['OVERSTAY_BATCH_SIZE'] = int(os.environ.get('OVERSTAY_BATCH_SIZE', 500))
+    app.config['OVERSTAY_HOURS'] = int(os.environ.get('OVERSTAY_HOURS', 24))
+    # 0 only flags overstays; otherwise reservations parked this long are released and billed
+    app.config['OVERSTAY_RELEASE_HOURS'] = int(os.environ.get('OVERSTAY_RELEASE_HOURS', 0))
+    # How often each worker reloads lots whose spots other processes freed or took; 0 disables
+    app.config['OCCUPANCY_RECONCILE_SECONDS'] = int(os.environ.get('OCCUPANCY_RECONCILE_SECONDS', 30))
+    app.config['OCCUPANCY_SERIES_SECONDS'] = int(os.environ.get('OCCUPANCY_SERIES_SECONDS', 900))
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '0') == '1'
+    app.config['METRICS_SLOW_MS'] = int(os.environ.get('METRICS_SLOW_MS', 500))
+    app.config['METRICS_SAMPLE_INTERVAL_MS'] = int(os.environ.get('METRICS_SAMPLE_INTERVAL_MS', 5))
+    app.config['METRICS_OUTLIERS'] = int(os.environ.get('METRICS_OUTLIERS', 20))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Only used when served through asgi.py; derived from DATABASE_URL when unset
+    app.config['ASYNC_DATABASE_URL'] = os.environ.get('ASYNC_DATABASE_URL')
+    app.config['ASYNC_WSGI_THREADS'] = int(os.environ.get('ASYNC_WSGI_THREADS', 32))
+
+    # Deployment overrides from a Python config file, e.g. PARKING_SETTINGS=/etc/parking/settings.py
+    app.config.from_envvar('PARKING_SETTINGS', silent=True)
+    if config:
+        app.config.update(config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+    # Initialize extensions
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
+        # Installs its hooks only when METRICS_ENABLED is set
+        request_metrics.init_app(app, db.engine)
+    login_manager.init_app(app)
+    timezones.init_app(app)
+    occupancy_index.init_app(app)
+
+    # Register blueprints (imported here so importing this module stays cheap)
+    from controllers.auth_controller import auth_bp
+    from controllers.admin_controller import admin_bp
+    from controllers.user_controller import user_bp
+    from controllers.api_controller import api_bp
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(user_bp)
+    app.register_blueprint(api_bp)
+
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+
+    # Background jobs; the runner only starts in workers when JOBS_ENABLED is set
+    from services.occupancy_series import update_series_job
+    from services.overstays import sweep_overstays
+    job_runner.register('overstay-sweep', sweep_overstays, 'OVERSTAY_SWEEP_SECONDS')
+    job_runner.register('occupancy-series', update_series_job, 'OCCUPANCY_SERIES_SECONDS')
+    job_runner.init_app(app)
 
-# Register blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(user_bp)
-app.register_blueprint(api_bp)
+    @app.route('/')
+    def index():
+        return render_template('index.html')
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+    @app.errorhandler(404)
+    def page_not_found(e):
+        return render_template('404.html'), 404
 
-@app.errorhandler(404)
-def page_not_found(e):
-    return render_template('404.html'), 404
+    @app.errorhandler(500)
+    def internal_server_error(e):
+        return render_template('500.html'), 500
 
-@app.errorhandler(500)
-def internal_server_error(e):
-    return render_template('500.html'), 500
+    return app
 
 # Create the admin user and all tables when the app is first set up
-def initialize_app():
+def initialize_app(app):
+    from models.user import User, create_admin_user
+    from services.search import search_index
     with app.app_context():
         db.create_all()
         admin = User.query.filter_by(email='admin@parking.com').first()
         if not admin:
             create_admin_user()
+        # Create the full-text search tables (or load the fallback index)
+        search_index.install()
 
 if __name__ == '__main__':
-    initialize_app()
-    app.run(debug=True)
\ No newline at end of file
+    app = create_app()
+    initialize_app(app)
+    app.run(debug=True)
@@ -0,0 +1,167 @@
+"""ASGI entry point: the read-only API views served async, everything else by the Flask app.
+
+    uvicorn --factory asgi:create_asgi_app
+
+Needs an ASGI server and the database's async driver (aiosqlite, asyncpg
+or aiomysql), neither of which the WSGI deployment uses.
+"""
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.ext.asyncio import create_async_engine
+from app import create_app
+from models.database import async_database_uri, async_engine_options, configure_sqlite
+
+
+def build_environ(scope, body):
+    """A WSGI environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def asgi_headers(headers):
+    """ASGI header pairs of WSGI headers, less Date, which the ASGI server adds to every response"""
+    return [(name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers if name.lower() != 'date']
+
+
+class WsgiBridge:
+    """Serves a WSGI app to an ASGI server from a bounded thread pool.
+
+    Response bodies are pulled from the app one chunk at a time on the pool
+    and sent as they come, so streamed responses keep streaming; a client
+    that disconnects stops the pull at the next chunk.
+    """
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, environ, receive, send):
+        loop = asyncio.get_running_loop()
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]), headers]
+
+        body = await loop.run_in_executor(self.executor, self.wsgi_app, environ, start_response)
+        chunks = iter(body)
+        disconnected = asyncio.ensure_future(receive())
+        try:
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            status, headers = started
+            await send({'type': 'http.response.start', 'status': status, 'headers': asgi_headers(headers)})
+            while chunk is not None and not disconnected.done():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            if hasattr(body, 'close'):
+                await loop.run_in_executor(self.executor, body.close)
+
+
+async def send_response(response, environ, send):
+    """Send a buffered Flask response the way a WSGI server would.
+
+    Running it as a WSGI app lets werkzeug drop the body of 304, 204 and
+    HEAD responses and the entity headers of a 304.
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+
+    body = response(environ, start_response)
+    try:
+        status, headers = started
+        await send({'type': 'http.response.start', 'status': status, 'headers': asgi_headers(headers)})
+        for chunk in body:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+class AsgiApp:
+    """Routes the async API views to AsyncApi and every other request to the Flask app"""
+
+    def __init__(self, app, engine):
+        from controllers.async_api import AsyncApi
+        self.app = app
+        self.engine = engine
+        self.api = AsyncApi(app, engine)
+        self.wsgi = WsgiBridge(app.wsgi_app, app.config['ASYNC_WSGI_THREADS'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        body = await read_body(receive)
+        if body is None:
+            return
+        environ = build_environ(scope, body)
+        response = await self.api.handle(environ)
+        if response is None:
+            return await self.wsgi(environ, receive, send)
+        await send_response(response, environ, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.wsgi.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(config=None):
+    """Build the Flask app (see create_app) and wrap it for an ASGI server"""
+    app = create_app(config)
+    if not app.config.get('ASYNC_DATABASE_URL'):
+        app.config['ASYNC_DATABASE_URL'] = async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    engine = create_async_engine(app.config['ASYNC_DATABASE_URL'], **async_engine_options(app.config))
+    configure_sqlite(engine.sync_engine, app.config)
+    return AsgiApp(app, engine)
@@ -0,0 +1,262 @@
+"""Read-heavy API under 1,000 concurrent clients: sync WSGI workers vs the ASGI entry point.
+
+Serves the same scratch database two ways, each in its own subprocess:
+
+    sync    the Flask app on a pool of THREADS worker threads (a gthread
+            worker), every request holding a thread for its whole duration
+    async   asgi.py under uvicorn: /api/parking-stats, /api/revenue-stats
+            and /api/available-spots/<lot_id> run on the async engine with
+            their queries fanned out, the rest on the WSGI bridge
+
+Every SQL statement sleeps LATENCY_MS in the driver thread to stand in for
+a database across the network, and the availability cache is off so each
+request reaches the database. CLIENTS concurrent clients send REQUESTS
+requests, spread over the three endpoints, as the admin. Reports requests/s
+and latency per mode, and exits non-zero if any request fails or the two
+modes answer an endpoint differently.
+
+    python benchmarks/bench_async.py [--clients 1000] [--requests 20000] [--latency-ms 50] [--threads 32] [--pool 100]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOTS = 50
+SPOTS_PER_LOT = 100
+PORTS = {'sync': 5081, 'async': 5082}
+
+
+def seed(db):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    from services import rollups
+    db.session.execute(User.__table__.insert(), [
+        {'id': 1, 'name': 'Admin', 'email': 'admin@parking.com', 'password_hash': '!', 'is_admin': True},
+    ])
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road', 'pin_code': '560001',
+         'max_spots': SPOTS_PER_LOT}
+        for i in range(1, LOTS + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'O' if n % 4 == 0 else 'A'}
+        for lot_id in range(1, LOTS + 1) for n in range(1, SPOTS_PER_LOT + 1)
+    ])
+    start = datetime.utcnow() - timedelta(days=365)
+    db.session.execute(Reservation.__table__.insert(), [
+        {'spot_id': n % (LOTS * SPOTS_PER_LOT) + 1, 'user_id': 1, 'vehicle_number': 'KA01 1234',
+         'parking_time': start + timedelta(hours=n), 'leaving_time': start + timedelta(hours=n, minutes=90),
+         'parking_cost': 30.0, 'is_active': False}
+        for n in range(365 * 24)
+    ])
+    fill_reservation_lots()
+    db.session.commit()
+    rollups.backfill()
+
+
+def add_latency(engine, seconds):
+    """Make every statement on the engine's connections take ``seconds`` longer, in the driver's thread"""
+    from sqlalchemy import event
+    from sqlalchemy.util import await_only
+
+    @event.listens_for(engine, 'connect')
+    def _slow_down(dbapi_connection, connection_record):
+        callback = lambda statement: time.sleep(seconds)
+        driver = connection_record.driver_connection
+        if isinstance(driver, sqlite3.Connection):
+            driver.set_trace_callback(callback)
+        else:
+            # aiosqlite runs the statement, and so the callback, on its own thread
+            await_only(driver.set_trace_callback(callback))
+
+
+def serve_sync(port, latency, threads, pool):
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+    from app import create_app
+    from models.database import db
+
+    class PooledWSGIServer(BaseWSGIServer):
+        """Hands connections to a fixed pool of threads, like a gthread worker"""
+        request_queue_size = 4096
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._process, request, client_address)
+
+        def _process(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    # SQLite's default pool is 5 + 10 connections; size it like the async engine's
+    app = create_app({'SQLALCHEMY_ENGINE_OPTIONS': dict(
+        pool_size=pool, max_overflow=0, connect_args={'timeout': 5},
+    )})
+    with app.app_context():
+        add_latency(db.engine, latency)
+    PooledWSGIServer('127.0.0.1', port, app, handler=QuietHandler).serve_forever()
+
+
+def serve_async(port, latency):
+    import uvicorn
+    from asgi import create_asgi_app
+    from models.database import db
+    asgi_app = create_asgi_app()
+    add_latency(asgi_app.engine.sync_engine, latency)
+    with asgi_app.app.app_context():
+        add_latency(db.engine, latency)
+    uvicorn.run(asgi_app, host='127.0.0.1', port=port, log_level='warning', backlog=4096, lifespan='on')
+
+
+async def fetch(port, path, cookie):
+    """(status, body, seconds) of one GET on a fresh connection"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: session={cookie}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1]) if head else 0
+    return status, body, time.perf_counter() - start
+
+
+def paths(n):
+    return ('/api/parking-stats', '/api/revenue-stats', f'/api/available-spots/{n % LOTS + 1}')[n % 3]
+
+
+async def load(port, cookie, clients, requests):
+    """(seconds, [latency], failures) for REQUESTS requests from CLIENTS concurrent clients"""
+    latencies, failures = [], []
+    issued = iter(range(requests))
+
+    async def client():
+        for n in issued:
+            try:
+                status, _, seconds = await fetch(port, paths(n), cookie)
+            except OSError as e:
+                failures.append(type(e).__name__)
+                continue
+            if status != 200:
+                failures.append(status)
+            latencies.append(seconds)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return time.perf_counter() - start, latencies, failures
+
+
+async def wait_until_up(port):
+    for _ in range(200):
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def bodies(port, cookie):
+    """Each endpoint's JSON answer; the first requests also put the admin in the identity cache"""
+    answers = {}
+    for n in range(3):
+        for _ in range(2):
+            status, body, _ = await fetch(port, paths(n), cookie)
+        answers[paths(n)] = (status, json.loads(body) if status == 200 else None)
+    return answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Simulated time per SQL statement.')
+    parser.add_argument('--threads', type=int, default=32, help='Worker threads of the sync server.')
+    parser.add_argument('--pool', type=int, default=100, help='Database connections per server.')
+    parser.add_argument('--serve', choices=PORTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    if args.serve:
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        if args.serve == 'sync':
+            serve_sync(PORTS['sync'], latency, args.threads, args.pool)
+        else:
+            serve_async(PORTS['async'], latency)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='parking-async-')
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "async.db")}',
+        'AVAILABILITY_CACHE_TTL': '0',
+        'DB_POOL_SIZE': str(args.pool),
+        'DB_MAX_OVERFLOW': '0',
+        'ASYNC_WSGI_THREADS': str(args.threads),
+    })
+    from app import create_app
+    from models.database import db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(db)
+    cookie = app.session_interface.get_signing_serializer(app).dumps({'_user_id': '1', '_fresh': True})
+
+    answers = {}
+    failed = False
+    print(f'{args.clients} clients, {args.requests:,} requests, {args.latency_ms:g} ms per statement, '
+          f'{args.threads} sync threads, {args.pool} connections')
+    for mode, port in PORTS.items():
+        server = subprocess.Popen([sys.executable, __file__, '--serve', mode, '--threads', str(args.threads),
+                                   '--latency-ms', str(args.latency_ms), '--pool', str(args.pool)])
+        try:
+            asyncio.run(wait_until_up(port))
+            answers[mode] = asyncio.run(bodies(port, cookie))
+            elapsed, latencies, failures = asyncio.run(load(port, cookie, args.clients, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+        print(f'{mode:<6} {args.requests / elapsed:8.1f} requests/s  p50 {statistics.median(latencies) * 1000:7.1f} ms'
+              f'  p99 {p99 * 1000:7.1f} ms  {len(failures)} failed')
+        if failures:
+            print(f'  failures: {sorted(set(map(str, failures)))}')
+            failed = True
+
+    for path, (status, body) in answers['sync'].items():
+        if status != 200 or answers['async'][path] != (status, body):
+            print(f'MISMATCH {path}: sync {status}, async {answers["async"][path][0]}')
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Polling throughput of /api/available-spots/<lot_id>.
+
+Compares the uncached endpoint (TTL 0), cached full responses, conditional
+requests answered with 304, and the compact formats, reporting requests/sec
+and SQL statements per request for one process.
+
+    python benchmarks/bench_availability.py [--lots 50] [--spots 2000] [--requests 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, lots, spots):
+    from models.parking import ParkingLot, ParkingSpot
+    rng = random.Random(3)
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': spots}
+        for i in range(1, lots + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'O' if rng.random() < 0.6 else 'A'}
+        for lot_id in range(1, lots + 1) for n in range(1, spots + 1)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--spots', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-availability-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "availability.db")}'
+    from app import create_app
+    from models.database import db
+    from services.availability_cache import availability_cache
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(db, args.lots, args.spots)
+        engine = db.engine
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *a, **kw: statements.append(a[2]))
+    client = app.test_client()
+    etags = {}
+
+    def poll(label, ttl, query='', conditional=False):
+        app.config['AVAILABILITY_CACHE_TTL'] = ttl
+        availability_cache.invalidate()
+        for lot_id in range(1, args.lots + 1):
+            etags[lot_id] = client.get(f'/api/available-spots/{lot_id}{query}').headers['ETag']
+        statements.clear()
+        status = None
+        start = time.perf_counter()
+        for n in range(args.requests):
+            lot_id = n % args.lots + 1
+            headers = {'If-None-Match': etags[lot_id]} if conditional else {}
+            status = client.get(f'/api/available-spots/{lot_id}{query}', headers=headers).status_code
+        elapsed = time.perf_counter() - start
+        print(f'{label:<22} {status}  {args.requests / elapsed:9,.0f} req/s  '
+              f'{len(statements) / args.requests:5.2f} statements/request')
+
+    poll('uncached full', 0)
+    poll('cached full', 60)
+    poll('cached ?format=rle', 60, '?format=rle')
+    poll('cached ?format=counts', 60, '?format=counts')
+    poll('conditional (304)', 60, conditional=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Pricing many reservations: per-stay Tariff.price vs the batch billing engine.
+
+Prices RESERVATIONS synthetic stays across lots on a mix of tariffs (flat,
+15-minute increments with a minimum charge, daily caps, daytime and
+overnight peak hours) one at a time, with the pure-Python batch and with the
+NumPy batch when NumPy is installed, and checks that they agree. Then seeds
+REBILL reservations into a scratch database and times ``rebill()``, which
+reads, re-prices and writes them back and rebuilds the revenue rollups.
+
+    python benchmarks/bench_billing.py [--reservations 1000000] [--lots 500] [--rebill 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def tariff_rules(lot_id):
+    """LotTariff column values for a lot, or None for the flat hourly price"""
+    kind = lot_id % 4
+    if kind == 0:
+        return None
+    if kind == 1:
+        return {'increment_minutes': 15, 'minimum_charge': 20.0}
+    if kind == 2:
+        return {'increment_minutes': 60, 'daily_cap': 250.0}
+    if lot_id % 8 == 3:
+        return {'peak_start': clock(8), 'peak_end': clock(20), 'peak_price': 45.0, 'daily_cap': 400.0}
+    return {'peak_start': clock(22), 'peak_end': clock(6), 'peak_price': 10.0, 'minimum_charge': 15.0}
+
+
+def make_stays(count, lots):
+    rng = random.Random(11)
+    start = datetime(2025, 1, 1)
+    stays = []
+    for _ in range(count):
+        parked = start + timedelta(seconds=rng.randrange(365 * 86400))
+        minutes = rng.choice([rng.randint(1, 59), rng.randint(60, 600), rng.randint(600, 4 * 1440)])
+        stays.append((rng.randint(1, lots), parked, parked + timedelta(minutes=minutes, seconds=rng.randrange(60))))
+    return stays
+
+
+def seed(db, lots, stays):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0 + i % 5 * 5, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': 1}
+        for i in range(1, lots + 1)
+    ])
+    # One spot per lot whose id equals the lot id
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'id': i, 'lot_id': i, 'spot_number': 1, 'status': 'A'} for i in range(1, lots + 1)
+    ])
+    db.session.execute(User.__table__.insert(), [
+        {'id': 1, 'name': 'Bench', 'email': 'bench@example.com', 'password_hash': '!', 'is_admin': False}
+    ])
+    prices = {i: 20.0 + i % 5 * 5 for i in range(1, lots + 1)}
+    for offset in range(0, len(stays), 100_000):
+        db.session.execute(Reservation.__table__.insert(), [
+            {'spot_id': lot_id, 'user_id': 1, 'vehicle_number': 'KA01 1234', 'parking_time': parked,
+             'leaving_time': left, 'is_active': False,
+             'parking_cost': round((left - parked).total_seconds() / 3600 * prices[lot_id], 2)}
+            for lot_id, parked, left in stays[offset:offset + 100_000]
+        ])
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def set_tariffs(db, lots):
+    from models.tariff import LotTariff
+    for lot_id in range(1, lots + 1):
+        rules = tariff_rules(lot_id)
+        if rules:
+            db.session.add(LotTariff(lot_id=lot_id, **rules))
+    db.session.commit()
+
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<28} {elapsed:8.2f} s   {count / elapsed:12,.0f} stays/s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=1_000_000)
+    parser.add_argument('--lots', type=int, default=500)
+    parser.add_argument('--rebill', type=int, default=200_000, help='Reservations for the rebill run (0 skips it).')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-billing-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "billing.db")}'
+    from app import create_app
+    from models.database import db
+    from services import billing, rollups
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(db, args.lots, make_stays(args.rebill, args.lots))
+        set_tariffs(db, args.lots)
+        tariffs = billing.tariffs_for_lots()
+
+        stays = make_stays(args.reservations, args.lots)
+        lot_ids = [lot_id for lot_id, _, _ in stays]
+        starts = [billing.to_epoch(parked) for _, parked, _ in stays]
+        ends = [billing.to_epoch(left) for _, _, left in stays]
+
+        print(f'{args.reservations:,} stays over {args.lots} lots')
+        single = timed('Tariff.price per stay', len(stays),
+                       lambda: [tariffs[lot_id].price(parked, left) for lot_id, parked, left in stays])
+        offsets = timed('  local offsets', len(stays), lambda: billing.utc_offsets(starts))
+        python = timed('batch, pure Python', len(stays),
+                       lambda: billing._price_python(tariffs, lot_ids, starts, ends, offsets))
+        results = [('pure Python batch', python)]
+        if billing.np is not None:
+            vectorized = timed('batch, NumPy', len(stays),
+                               lambda: billing._price_numpy(tariffs, lot_ids, starts, ends, offsets).tolist())
+            results.append(('NumPy batch', vectorized))
+        else:
+            print('NumPy is not installed; skipping the vectorized batch')
+
+        failed = False
+        for label, costs in results:
+            worst = max(abs(a - b) for a, b in zip(single, costs))
+            print(f'{label} vs per-stay: max difference {worst:.4f}')
+            # NumPy rounds the last cent of exact half-paise ties differently from round()
+            failed = failed or worst > 0.01 + 1e-9
+
+        if args.rebill:
+            print(f'\nrebill of {args.rebill:,} stored reservations')
+            priced, changed = timed('rebill() incl. rollups', args.rebill, billing.rebill)
+            mismatches = rollups.verify()
+            print(f'{priced:,} priced, {changed:,} changed, rollup mismatches: {len(mismatches)}')
+            failed = failed or bool(mismatches) or priced != args.rebill
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Availability over a time window with 1M future bookings: booking index vs SQL.
+
+Seeds one lot of SPOTS spots and BOOKINGS bookings spread over the next 30
+days, each spot's a run of non-overlapping windows of one to five hours,
+then answers QUERIES random windows (one to four hours, within the booking
+horizon) two ways:
+
+    sql      COUNT of the lot's spots with NOT EXISTS an overlapping booking,
+             served by ix_bookings_spot_start
+    index    booking_index.count_free, a bisection per spot over its sorted
+             schedule (the first query also loads the lot)
+
+checks that both count the same spots, and then times BOOK bookings made
+through services.bookings.book. Exits non-zero if the counts differ or a
+booking overlaps another on its spot.
+
+    python benchmarks/bench_bookings.py [--spots 10000] [--bookings 1000000] [--queries 200] [--book 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HORIZON = timedelta(days=30)
+CHUNK_SIZE = 50_000
+
+
+def seed(db, rng, spots, bookings, origin):
+    """Users 1-1000 hold the seeded bookings; 1001-2000 book during the benchmark"""
+    from models.booking import Booking
+    from models.parking import ParkingLot, ParkingSpot
+    from models.user import User
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!', 'is_admin': False}
+        for i in range(1, 2001)
+    ])
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': 1, 'name': 'Lot 1', 'price': 20.0, 'address': '1 Main Road', 'pin_code': '560001', 'max_spots': spots}
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'id': n, 'lot_id': 1, 'spot_number': n, 'status': 'A'} for n in range(1, spots + 1)
+    ])
+    # Per spot, windows separated by gaps that fill the horizon on average
+    per_spot = bookings // spots
+    mean_gap = HORIZON / per_spot - timedelta(hours=3)
+    rows = []
+    for spot_id in range(1, spots + 1):
+        at = origin
+        for _ in range(per_spot + (1 if spot_id <= bookings % spots else 0)):
+            at += timedelta(minutes=rng.randint(0, 2 * mean_gap // timedelta(minutes=1)))
+            ends = at + timedelta(minutes=rng.randint(60, 300))
+            rows.append({'spot_id': spot_id, 'user_id': rng.randint(1, 1000), 'vehicle_number': 'KA01 1234',
+                         'starts_at': at, 'ends_at': ends, 'status': 'B'})
+            at = ends
+        if len(rows) >= CHUNK_SIZE:
+            db.session.execute(Booking.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Booking.__table__.insert(), rows)
+    db.session.commit()
+
+
+def sql_count(db, lot_id, starts_at, ends_at):
+    from sqlalchemy import exists, func, select
+    from models.booking import Booking
+    from models.parking import ParkingSpot
+    return db.session.execute(select(func.count()).where(
+        ParkingSpot.lot_id == lot_id,
+        ~exists().where(Booking.spot_id == ParkingSpot.id, Booking.status == 'B',
+                        Booking.starts_at < ends_at, Booking.ends_at > starts_at)
+    )).scalar()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    print(f'{label:<8} p50 {statistics.median(timings):9.2f} ms   p99 {timings[int(len(timings) * 0.99)]:9.2f} ms'
+          f'   max {timings[-1]:9.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spots', type=int, default=10_000)
+    parser.add_argument('--bookings', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--book', type=int, default=200, help='Bookings to time through services.bookings.book.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='parking-bookings-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bookings.db")}'
+    from app import create_app
+    from models.database import db
+    from services import bookings
+    from services.bookings import booking_index
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        origin = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(hours=1)
+        _, seed_ms = timed(seed, db, rng, args.spots, args.bookings, origin)
+        print(f'1 lot, {args.spots:,} spots, {args.bookings:,} bookings seeded in {seed_ms / 1000:.1f}s')
+
+        _, load_ms = timed(booking_index.refresh_lot, 1)
+        print(f'index loaded in {load_ms:.0f} ms')
+
+        sql_ms, index_ms = [], []
+        mismatches = 0
+        for _ in range(args.queries):
+            starts_at = origin + timedelta(minutes=rng.randrange(0, (HORIZON - timedelta(hours=5)) // timedelta(minutes=1)))
+            ends_at = starts_at + timedelta(minutes=rng.randint(60, 240))
+            expected, elapsed = timed(sql_count, db, 1, starts_at, ends_at)
+            sql_ms.append(elapsed)
+            (free, _), elapsed = timed(booking_index.count_free, 1, starts_at, ends_at)
+            index_ms.append(elapsed)
+            if free != expected:
+                mismatches += 1
+                print(f'MISMATCH {starts_at:%Y-%m-%d %H:%M}-{ends_at:%H:%M}: sql {expected}, index {free}')
+        print(f'{args.queries} availability queries over {args.spots:,} spots:')
+        report('sql', sql_ms)
+        report('index', index_ms)
+        print(f'index is {statistics.median(sql_ms) / statistics.median(index_ms):.0f}x faster at p50')
+
+        book_ms, failed = [], 0
+        for n in range(args.book):
+            starts_at = origin + timedelta(minutes=rng.randrange(0, (HORIZON - timedelta(hours=5)) // timedelta(minutes=1)))
+            ends_at = starts_at + timedelta(hours=2)
+            start = time.perf_counter()
+            booking = bookings.book(1001 + n % 1000, 1, starts_at, ends_at, 'KA01 AB 1234')
+            db.session.commit()
+            book_ms.append((time.perf_counter() - start) * 1000)
+            if booking is None:
+                failed += 1
+            else:
+                booking_index.add(1, booking)
+        if book_ms:
+            print(f'{args.book} bookings ({failed} found no free spot):')
+            report('book', book_ms)
+
+        # Sorted by start, a spot's windows overlap only if one starts before the previous ends
+        overlaps = db.session.execute(db.text(
+            "SELECT count(*) FROM (SELECT starts_at, lag(ends_at) OVER (PARTITION BY spot_id ORDER BY starts_at) "
+            "AS previous_end FROM bookings WHERE status = 'B') WHERE previous_end > starts_at"
+        )).scalar()
+        if overlaps:
+            print(f'{overlaps} overlapping booking pair(s)')
+
+    if mismatches or overlaps:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Throughput of /user/dashboard with and without the identity cache.
+
+Seeds lots and users (each with past reservations, half of them parked
+right now), then renders the dashboard as random logged-in users with
+``USER_CACHE_SIZE = 0`` and with the cache enabled, reporting requests/sec,
+SQL statements per request and the cache hit rate.
+
+    python benchmarks/bench_dashboard.py [--users 200] [--requests 3000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, lots, spots, users):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    rng = random.Random(7)
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': spots}
+        for i in range(1, lots + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'id': (lot_id - 1) * spots + n, 'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, lots + 1) for n in range(1, spots + 1)
+    ])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!',
+         'address': 'Street', 'pin_code': '560001', 'is_admin': False}
+        for i in range(1, users + 1)
+    ])
+    now = datetime.utcnow()
+    rows = []
+    for user_id in range(1, users + 1):
+        for n in range(10):
+            parked = now - timedelta(days=n + 1)
+            rows.append({'spot_id': rng.randint(1, lots * spots), 'user_id': user_id, 'vehicle_number': 'KA01 1234',
+                         'parking_time': parked, 'leaving_time': parked + timedelta(hours=2),
+                         'parking_cost': 40.0, 'is_active': False})
+    db.session.execute(Reservation.__table__.insert(), rows)
+    # Every other user is parked right now, on spot number == user id
+    active = [{'spot_id': user_id, 'user_id': user_id, 'vehicle_number': 'KA01 1234',
+               'parking_time': now - timedelta(hours=1), 'is_active': True}
+              for user_id in range(1, users + 1, 2)]
+    db.session.execute(Reservation.__table__.insert(), active)
+    db.session.execute(ParkingSpot.__table__.update().where(
+        ParkingSpot.id.in_([row['spot_id'] for row in active])
+    ).values(status='O'))
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots', type=int, default=100)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=3000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-dashboard-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "dashboard.db")}'
+    from app import create_app
+    from models.database import db
+    from services.identity import user_cache
+    from services.occupancy import occupancy_index
+
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        seed(db, args.lots, args.spots, args.users)
+        occupancy_index.warm()
+        engine = db.engine
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *a, **kw: statements.append(a[2]))
+
+    clients = {}
+    for user_id in range(1, args.users + 1):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        clients[user_id] = client
+
+    for label, cache_size in (('no identity cache', 0), ('identity cache', 1024)):
+        app.config['USER_CACHE_SIZE'] = cache_size
+        user_cache.invalidate()
+        user_cache.hits = user_cache.misses = 0
+        rng = random.Random(1)
+        statements.clear()
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            response = clients[rng.randint(1, args.users)].get('/user/dashboard')
+            assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - start
+        hit_rate = user_cache.stats()['hit_rate'] if cache_size else 0.0
+        print(f'{label:<20} {args.requests / elapsed:8.0f} req/s   '
+              f'{len(statements) / args.requests:5.2f} statements/request   hit rate {hit_rate:.1%}')
+
+        # The user_loader on its own, one fresh session per lookup like a request
+        with app.test_request_context():
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                user_cache.load(rng.randint(1, args.users))
+                db.session.remove()
+            loader_us = (time.perf_counter() - start) / args.requests * 1e6
+        print(f'{"":<20} user_loader {loader_us:6.0f} µs/lookup')
+
+
+if __name__ == '__main__':
+    main()
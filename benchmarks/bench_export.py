@@ -0,0 +1,173 @@
+"""Exporting many reservations: buffered JSON vs streamed NDJSON/CSV vs cursor pages.
+
+Seeds RESERVATIONS reservations into a scratch SQLite database once, then
+runs each mode in its own subprocess so that peak RSS is measured
+independently:
+
+    buffered  every row loaded and dumped as one JSON document (no streaming)
+    ndjson    GET /api/reservations/export?format=ndjson
+    csv       GET /api/reservations/export?format=csv
+    pages     GET /api/reservations?limit=1000, following next_cursor
+
+Every mode checks that each reservation arrives exactly once and the script
+exits non-zero if one does not.
+
+    python benchmarks/bench_export.py [--reservations 1000000] [--modes ndjson csv]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('buffered', 'ndjson', 'csv', 'pages')
+LOTS = 50
+SPOTS_PER_LOT = 20
+USERS = 100
+
+
+def seed(db, reservations):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!', 'is_admin': i == 1}
+        for i in range(1, USERS + 1)
+    ])
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road', 'pin_code': '560001',
+         'max_spots': SPOTS_PER_LOT}
+        for i in range(1, LOTS + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, LOTS + 1) for n in range(1, SPOTS_PER_LOT + 1)
+    ])
+    rng = random.Random(17)
+    start = datetime(2024, 1, 1)
+    for offset in range(0, reservations, 100_000):
+        rows = []
+        for _ in range(min(100_000, reservations - offset)):
+            # Whole minutes so that many reservations share a parking_time
+            parked = start + timedelta(minutes=rng.randrange(2 * 365 * 1440))
+            rows.append({
+                'spot_id': rng.randint(1, LOTS * SPOTS_PER_LOT), 'user_id': rng.randint(1, USERS),
+                'vehicle_number': f'KA01 {rng.randint(1000, 9999)}', 'parking_time': parked,
+                'leaving_time': parked + timedelta(minutes=rng.randint(10, 600)), 'parking_cost': 40.0,
+                'is_active': False
+            })
+        db.session.execute(Reservation.__table__.insert(), rows)
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def _export_ids(client, fmt):
+    response = client.get(f'/api/reservations/export?format={fmt}', buffered=False)
+    assert response.status_code == 200, response.status_code
+    pending = b''
+    header = fmt == 'csv'
+    for chunk in response.response:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if header:
+                header = False
+                continue
+            # NDJSON lines start with {"id":N, and CSV lines with N,
+            yield int(line.split(b',', 1)[0].lstrip(b'{"id:'))
+    response.close()
+
+
+def _page_ids(client):
+    url = '/api/reservations?limit=1000'
+    while url:
+        body = client.get(url).get_json()
+        for row in body['reservations']:
+            yield row['id']
+        url = body['next_cursor'] and f'/api/reservations?limit=1000&cursor={body["next_cursor"]}'
+
+
+def _buffered_ids(db):
+    from services import exports
+    rows = db.session.execute(exports.reservation_query()).all()
+    document = json.dumps([exports.serialize(row) for row in rows])
+    return [row['id'] for row in json.loads(document)]
+
+
+def run_mode(mode, database, reservations):
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    from app import create_app
+    from models.database import db
+
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = '1'
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        seen = bytearray(reservations + 1)
+        count = duplicates = 0
+        start = time.perf_counter()
+        if mode == 'buffered':
+            ids = _buffered_ids(db)
+        elif mode == 'pages':
+            ids = _page_ids(client)
+        else:
+            ids = _export_ids(client, mode)
+        for reservation_id in ids:
+            duplicates += seen[reservation_id]
+            seen[reservation_id] = 1
+            count += 1
+        elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ok = count == reservations and not duplicates
+    print(f'{mode:<9} {count:>11,} rows  {elapsed:7.1f} s  {count / elapsed:10,.0f} rows/s  '
+          f'peak RSS {peak_rss / 1024:7.1f} MiB (+{(peak_rss - baseline_rss) / 1024:.1f} MiB)'
+          + ('' if ok else f'  FAILED: {duplicates} duplicates'))
+    if not ok:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=1_000_000)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.database, args.reservations)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='parking-export-')
+    database = os.path.join(workdir, 'export.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    from app import create_app
+    from models.database import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.reservations)
+        print(f'seeded {args.reservations:,} reservations in {time.perf_counter() - start:.1f} s')
+
+    failed = False
+    for mode in args.modes:
+        result = subprocess.run([sys.executable, __file__, '--mode', mode, '--database', database,
+                                 '--reservations', str(args.reservations)])
+        failed = failed or result.returncode != 0
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""History, users page and user-stats latency for users with long histories.
+
+Seeds USERS users with RESERVATIONS past reservations each and times
+``/user/history``, ``/admin/users`` and ``/api/user-stats/<id>``, reporting
+SQL statements per request alongside latency.
+
+    python benchmarks/bench_history.py [--users 5] [--reservations 50000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, users, reservations):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': 1, 'name': 'Lot 1', 'price': 20.0, 'address': '1 Main Road', 'pin_code': '560001', 'max_spots': 100}
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'id': n, 'lot_id': 1, 'spot_number': n, 'status': 'A'} for n in range(1, 101)
+    ])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!',
+         'address': 'Street', 'pin_code': '560001', 'is_admin': i == 1}
+        for i in range(1, users + 2)
+    ])
+    start = datetime(2023, 1, 1)
+    for user_id in range(2, users + 2):
+        rows = []
+        for n in range(reservations):
+            parked = start + timedelta(hours=3 * n)
+            rows.append({'spot_id': n % 100 + 1, 'user_id': user_id, 'vehicle_number': 'KA01 1234',
+                         'parking_time': parked, 'leaving_time': parked + timedelta(hours=2),
+                         'parking_cost': 40.0, 'is_active': False})
+        db.session.execute(Reservation.__table__.insert(), rows)
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--reservations', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-history-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "history.db")}'
+    from app import create_app
+    from models.database import db
+
+    app = create_app({'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        seed(db, args.users, args.reservations)
+        engine = db.engine
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *a, **kw: statements.append(a[2]))
+
+    def client_for(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    admin, user = client_for(1), client_for(2)
+    for label, client, url in [
+        ('history p1', user, '/user/history'),
+        ('history p100', user, '/user/history?page=100'),
+        ('admin users', admin, '/admin/users'),
+        ('user stats', admin, '/api/user-stats/2'),
+    ]:
+        timings = []
+        for _ in range(args.repeat):
+            statements.clear()
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f'{label:<13} {response.status_code}  median {statistics.median(timings):9.1f} ms  '
+              f'{len(statements):>4} statements')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Hot controller queries with and without the composite indexes.
+
+Seeds a large dataset, times every read query from the query plan audit
+(``flask explain-queries``) with the indexes in place, then drops them and
+times the same statements again.
+
+    python benchmarks/bench_indexes.py [--lots 200] [--spots 500] [--users 10000] [--reservations 1000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK = 100_000
+
+
+def seed(db, lots, spots, users, reservations):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    rng = random.Random(11)
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': spots}
+        for i in range(1, lots + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, lots + 1) for n in range(1, spots + 1)
+    ])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!',
+         'address': 'Street', 'pin_code': '560001', 'is_admin': i == 0}
+        for i in range(1, users + 1)
+    ])
+    start = datetime.utcnow() - timedelta(days=730)
+    for offset in range(0, reservations, CHUNK):
+        rows = []
+        for n in range(offset, min(offset + CHUNK, reservations)):
+            parked = start + timedelta(minutes=n * 730 * 1440 // reservations)
+            rows.append({'spot_id': rng.randint(1, lots * spots), 'user_id': rng.randint(1, users),
+                         'vehicle_number': 'KA01 1234', 'parking_time': parked,
+                         'leaving_time': parked + timedelta(hours=2), 'parking_cost': 40.0,
+                         'is_active': False})
+        db.session.execute(Reservation.__table__.insert(), rows)
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def time_statements(db, statements, repeat):
+    results = {}
+    for name, statement in statements:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            db.session.execute(statement).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--reservations', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-indexes-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "indexes.db")}'
+    from app import create_app
+    from models.database import db
+    from models.parking import ParkingSpot, Reservation
+    from services.query_audit import audited_statements
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.lots, args.spots, args.users, args.reservations)
+        print(f'seeded in {time.perf_counter() - start:.1f}s')
+        db.session.execute(db.text('ANALYZE'))
+
+        statements = audited_statements()
+        with_indexes = time_statements(db, statements, args.repeat)
+
+        for table in (ParkingSpot.__table__, Reservation.__table__):
+            for index in table.indexes:
+                index.drop(db.engine)
+        db.session.execute(db.text('ANALYZE'))
+        without_indexes = time_statements(db, statements, args.repeat)
+
+    print(f'{"query":<50} {"no index":>12} {"indexed":>12} {"speedup":>9}')
+    for name, _ in statements:
+        before, after = without_indexes[name], with_indexes[name]
+        print(f'{name:<50} {before:>9.2f} ms {after:>9.2f} ms {before / after if after else 0:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Login storm: password hashing inline vs in the bounded process pool.
+
+Starts the app in a threaded HTTP server (one subprocess per mode), fires
+LOGINS sign-ins from CONCURRENCY client threads and meanwhile polls the
+home page, reporting login throughput and the latency the rest of the app
+sees during the storm.
+
+    python benchmarks/bench_login.py [--logins 2000] [--concurrency 500] [--method pbkdf2:sha256:60000]
+"""
+import argparse
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'correct horse'
+
+
+def seed(users, method):
+    from app import create_app
+    from models.database import db
+    from models.user import User
+    from werkzeug.security import generate_password_hash
+    app = create_app()
+    password_hash = generate_password_hash(PASSWORD, method=method)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': password_hash,
+             'is_admin': False}
+            for i in range(1, users + 1)
+        ])
+        db.session.commit()
+
+
+def serve(port):
+    from werkzeug.serving import BaseWSGIServer, make_server
+    from app import create_app
+    app = create_app({'WTF_CSRF_ENABLED': False})
+    # Exit cleanly on terminate so the hashing pool's workers are shut down too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # Let the whole storm queue up instead of overflowing the default listen backlog
+    BaseWSGIServer.request_queue_size = 4096
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def request(port, method, path, body=None):
+    """Return (status, seconds)"""
+    start = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+        connection.request(method, path, body=body, headers=headers)
+        status = connection.getresponse().status
+    except OSError:
+        status = 0
+    finally:
+        connection.close()
+    return status, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+
+def storm(port, logins, concurrency, users):
+    probes = []
+    storming = threading.Event()
+    storming.set()
+
+    def probe():
+        while storming.is_set():
+            status, elapsed = request(port, 'GET', '/')
+            if status == 200:
+                probes.append(elapsed)
+            time.sleep(0.01)
+
+    def login(n):
+        body = urlencode({'email': f'user{n % users + 1}@example.com', 'password': PASSWORD})
+        return request(port, 'POST', '/login', body)
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    storming.clear()
+    prober.join()
+
+    succeeded = [seconds for status, seconds in results if status == 302]
+    shed = sum(1 for status, _ in results if status == 503)
+    failed = sorted(status for status, _ in results if status not in (302, 503))
+    return {
+        'logins_per_sec': len(succeeded) / elapsed,
+        'login_p99': percentile(succeeded, 0.99),
+        'shed': shed,
+        'failed': failed,
+        'probe_p50': percentile(probes, 0.5),
+        'probe_p99': percentile(probes, 0.99),
+        'probes': len(probes),
+    }
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if request(port, 'GET', '/')[0] == 200:
+            return
+        time.sleep(0.2)
+    raise SystemExit(f'server on port {port} did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--method', default='pbkdf2:sha256:60000', help='Werkzeug hash method of the seeded users.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Process pool size of the pool run.')
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='parking-login-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "login.db")}'
+    os.environ['PASSWORD_HASH_METHOD'] = args.method
+    seed(args.users, args.method)
+
+    print(f'{args.logins} logins from {args.concurrency} clients, {args.method}')
+    for label, workers in (('inline hashing', 0), (f'process pool ({args.workers})', args.workers)):
+        env = dict(os.environ, PASSWORD_HASH_WORKERS=str(workers))
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for(args.port)
+            idle = [request(args.port, 'GET', '/')[1] for _ in range(50)]
+            result = storm(args.port, args.logins, args.concurrency, args.users)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'{label:<20} {result["logins_per_sec"]:7.1f} logins/s   login p99 {result["login_p99"] * 1000:7.0f} ms   '
+              f'shed {result["shed"]}, failed {len(result["failed"])}')
+        if result['failed']:
+            print(f'{"":<20} failed statuses: {dict(Counter(result["failed"]))}')
+        print(f'{"":<20} home page idle p50 {statistics.median(idle) * 1000:.1f} ms, during storm '
+              f'p50 {result["probe_p50"] * 1000:.1f} ms / p99 {result["probe_p99"] * 1000:.1f} ms ({result["probes"]} probes)')
+
+
+if __name__ == '__main__':
+    main()
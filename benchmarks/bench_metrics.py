@@ -0,0 +1,152 @@
+"""Cost of the request metrics layer: the same request mix with METRICS_ENABLED off and on.
+
+Builds two apps over one scratch database, one with metrics off and one
+with them on, and serves BATCHES alternating batches of the request mix
+(admin, user and API pages) from each, so drift in machine speed hits both
+equally. Reports requests/s per mode and the overhead, and exits non-zero
+if it is above --max-overhead percent, if the disabled app has any metrics
+hook installed, or if the enabled one fails to record counts, SQL,
+templates or a slow-request profile.
+
+    python benchmarks/bench_metrics.py [--batches 40] [--batch-size 100] [--max-overhead 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOTS = 20
+SPOTS_PER_LOT = 50
+USERS = 200
+# (url, logged in as) for the request mix; user 2 has the long history
+URLS = [
+    ('/admin/dashboard', 1),
+    ('/admin/users', 1),
+    ('/admin/parking-lots', 1),
+    ('/admin/parking-spots/1', 1),
+    ('/api/parking-stats', 1),
+    ('/user/dashboard', 2),
+    ('/user/history', 2),
+    ('/api/available-spots/1', 2),
+]
+
+
+def seed(db):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!',
+         'address': 'Street', 'pin_code': '560001', 'is_admin': i == 1}
+        for i in range(1, USERS + 1)
+    ])
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road', 'pin_code': '560001',
+         'max_spots': SPOTS_PER_LOT}
+        for i in range(1, LOTS + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, LOTS + 1) for n in range(1, SPOTS_PER_LOT + 1)
+    ])
+    start = datetime(2024, 1, 1)
+    db.session.execute(Reservation.__table__.insert(), [
+        {'spot_id': n % (LOTS * SPOTS_PER_LOT) + 1, 'user_id': 2 + n % (USERS - 1), 'vehicle_number': 'KA01 1234',
+         'parking_time': start + timedelta(minutes=7 * n), 'leaving_time': start + timedelta(minutes=7 * n + 90),
+         'parking_cost': 30.0, 'is_active': False}
+        for n in range(20000)
+    ])
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def hooks_installed(app, engine):
+    from sqlalchemy import event
+    from services.metrics import request_metrics
+    return (request_metrics._before_request in app.before_request_funcs.get(None, [])
+            or event.contains(engine, 'before_cursor_execute', request_metrics._before_cursor_execute))
+
+
+def serve(client, requests):
+    for n in range(requests):
+        url, user_id = URLS[n % len(URLS)]
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+
+
+def check_enabled(client, requests):
+    """Problems with what the enabled app recorded"""
+    from services.metrics import request_metrics
+    problems = []
+    rows = {row['endpoint']: row for row in request_metrics.endpoints()}
+    history = rows.get('user.history', {})
+    if history.get('requests', 0) < requests // len(URLS):
+        problems.append('requests not counted')
+    if not history.get('sql_per_request') or not history.get('template_ms_per_request'):
+        problems.append('SQL or template time not recorded')
+    if 'parking_request_duration_seconds_count{endpoint="user.history"}' not in request_metrics.prometheus():
+        problems.append('prometheus output incomplete')
+    # Every request counts as slow from here on, which must leave stack samples behind
+    request_metrics.slow_after = 0.0
+    request_metrics.sample_interval = 0.001
+    serve(client, len(URLS) * 3)
+    if not any(outlier['samples'] for outlier in request_metrics.outliers()):
+        problems.append('no profile samples for slow requests')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--max-overhead', type=float, default=2.0, help='Percent.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-metrics-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "metrics.db")}'
+    from app import create_app
+    from models.database import db
+
+    apps = {'off': create_app({'TESTING': True}), 'on': create_app({'TESTING': True, 'METRICS_ENABLED': True})}
+    with apps['off'].app_context():
+        db.create_all()
+        seed(db)
+
+    problems = []
+    clients = {}
+    for mode, app in apps.items():
+        with app.app_context():
+            if hooks_installed(app, db.engine) != (mode == 'on'):
+                problems.append(f'{mode}: metrics hooks {"missing" if mode == "on" else "installed"}')
+        clients[mode] = app.test_client()
+        serve(clients[mode], len(URLS) * 5)
+
+    elapsed = {'off': 0.0, 'on': 0.0}
+    for batch in range(args.batches):
+        # Alternate which mode goes first so neither always runs on a warmer cache
+        for mode in (('off', 'on') if batch % 2 == 0 else ('on', 'off')):
+            start = time.perf_counter()
+            serve(clients[mode], args.batch_size)
+            elapsed[mode] += time.perf_counter() - start
+
+    requests = args.batches * args.batch_size
+    for mode in ('off', 'on'):
+        print(f'metrics {mode:<3}  {requests:,} requests  {requests / elapsed[mode]:8.1f} requests/s')
+    overhead = (elapsed['on'] / elapsed['off'] - 1) * 100
+    print(f'overhead with metrics on: {overhead:+.2f}%')
+
+    problems += check_enabled(clients['on'], requests)
+    for problem in problems:
+        print(f'FAILED: {problem}')
+    if problems or overhead > args.max_overhead:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
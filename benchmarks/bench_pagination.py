@@ -0,0 +1,146 @@
+"""Listing pages at depth: OFFSET pagination vs keyset cursors, page 1 vs page 10,000.
+
+Seeds one user (in the middle of the users listing) with PAGES * 10 reservations, PAGES * 50 users, PAGES * 20
+lots and one lot with PAGES * 120 spots (the page sizes of user.history,
+admin.users, admin.parking_lots and admin.parking_spots), then times the
+first and the last page of each listing three ways:
+
+    offset    LIMIT/OFFSET plus an exact COUNT, what .paginate() does
+    keyset    keyset_page() with the cursor of the previous page's last row
+    request   the whole GET with that cursor, rendered
+
+and checks that both methods return the same rows.
+
+    python benchmarks/bench_pagination.py [--pages 10000] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def history_user(pages):
+    return pages * 25
+
+
+def seed(db, pages):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!',
+         'address': 'Street', 'pin_code': '560001', 'is_admin': i == 1}
+        for i in range(1, pages * 50 + 2)
+    ])
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road', 'pin_code': '560001',
+         'max_spots': pages * 120 if i == 1 else 1}
+        for i in range(1, pages * 20 + 1)
+    ])
+    spots = pages * 120
+    for offset in range(0, spots, 200_000):
+        db.session.execute(ParkingSpot.__table__.insert(), [
+            {'lot_id': 1, 'spot_number': n, 'status': 'A'} for n in range(offset + 1, min(offset + 200_000, spots) + 1)
+        ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': i, 'spot_number': 1, 'status': 'A'} for i in range(2, pages * 20 + 1)
+    ])
+    start = datetime(2020, 1, 1)
+    db.session.execute(Reservation.__table__.insert(), [
+        {'spot_id': n % 100 + 1, 'user_id': history_user(pages), 'vehicle_number': 'KA01 1234',
+         'parking_time': start + timedelta(hours=n), 'leaving_time': start + timedelta(hours=n, minutes=30),
+         'parking_cost': 10.0, 'is_active': False}
+        for n in range(pages * 10)
+    ])
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def listings(pages):
+    """(name, url, query, key columns, descending, per page, user) for each listing"""
+    from controllers.admin_controller import LOTS_PER_PAGE, SPOTS_PER_PAGE, USERS_PER_PAGE
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import history_query
+    return [
+        ('user.history', '/user/history', history_query(history_user(pages)), (Reservation.parking_time, Reservation.id),
+         True, 10, history_user(pages)),
+        ('admin.users', '/admin/users', User.query.filter_by(is_admin=False), (User.id,), False, USERS_PER_PAGE, 1),
+        ('admin.parking_lots', '/admin/parking-lots', ParkingLot.query, (ParkingLot.id,), False, LOTS_PER_PAGE, 1),
+        ('admin.parking_spots', '/admin/parking-spots/1', ParkingSpot.query.filter_by(lot_id=1),
+         (ParkingSpot.spot_number, ParkingSpot.id), False, SPOTS_PER_PAGE, 1),
+    ]
+
+
+def median_ms(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=10000, help='Depth of the last page timed.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-pagination-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "pagination.db")}'
+    from app import create_app
+    from models.database import db
+    from services import rollups
+    from services.pagination import encode_cursor, keyset_page
+
+    app = create_app({'TESTING': True})
+    results = []
+    failed = False
+    with app.app_context():
+        db.create_all()
+        seed(db, args.pages)
+        rollups.backfill()
+        for name, url, query, columns, descending, per_page, user_id in listings(args.pages):
+            order = [column.desc() if descending else column for column in columns]
+            for page in (1, args.pages):
+                offset = (page - 1) * per_page
+
+                def by_offset():
+                    ordered = query.order_by(None).order_by(*order)
+                    return ordered.limit(per_page).offset(offset).all(), query.order_by(None).count()
+
+                cursor = None
+                if offset:
+                    last = query.order_by(None).order_by(*order).offset(offset - 1).first()
+                    cursor = encode_cursor([getattr(last, column.key) for column in columns])
+                offset_ms, (expected, _) = median_ms(by_offset, args.repeat)
+                keyset_ms, result = median_ms(
+                    lambda: keyset_page(query, columns, per_page, after_cursor=cursor, descending=descending,
+                                        estimate=lambda: 0), args.repeat)
+                same = [row.id for row in result.items] == [row.id for row in expected] and len(expected) == per_page
+                results.append((name, url, user_id, page, cursor, offset_ms, keyset_ms, same))
+
+    # Requests run outside the setup app context so each gets its own (and its own logged-in user)
+    client = app.test_client()
+    print(f'{"listing":<20} {"page":>6} {"offset":>10} {"keyset":>10} {"request":>10}')
+    for name, url, user_id, page, cursor, offset_ms, keyset_ms, same in results:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        request_ms, response = median_ms(
+            lambda: client.get(url, query_string={'after': cursor} if cursor else None), args.repeat)
+        failed = failed or not same or response.status_code != 200
+        print(f'{name:<20} {page:>6} {offset_ms:8.2f}ms {keyset_ms:8.2f}ms {request_ms:8.2f}ms'
+              + ('' if same else '  MISMATCH') + ('' if response.status_code == 200 else f'  HTTP {response.status_code}'))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
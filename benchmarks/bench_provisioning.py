@@ -0,0 +1,75 @@
+"""Creating many large lots: per-object ORM inserts vs. bulk provisioning.
+
+Each mode runs in its own subprocess against a fresh SQLite database so that
+peak RSS is measured independently.
+
+    python benchmarks/bench_provisioning.py [--lots 100] [--spots 10000]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def create_orm(db, lots, spots):
+    """What admin.new_parking_lot did before: one ParkingSpot object per spot"""
+    from models.parking import ParkingLot, ParkingSpot
+    for i in range(lots):
+        lot = ParkingLot(name=f'Lot {i}', price=20.0, address=f'{i} Main Road', pin_code='560001', max_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        for n in range(1, spots + 1):
+            db.session.add(ParkingSpot(lot_id=lot.id, spot_number=n))
+        db.session.commit()
+
+
+def create_bulk(db, lots, spots):
+    from services.provisioning import import_lots
+    import_lots([
+        {'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road', 'pin_code': '560001', 'max_spots': spots}
+        for i in range(lots)
+    ])
+
+
+def run_mode(mode, lots, spots):
+    workdir = tempfile.mkdtemp(prefix='parking-provision-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "provision.db")}'
+    from app import create_app
+    from models.database import db
+    from models.parking import ParkingSpot
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        (create_orm if mode == 'orm' else create_bulk)(db, lots, spots)
+        elapsed = time.perf_counter() - start
+        created = ParkingSpot.query.count()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'{mode:<5} {created:>10,} spots  {elapsed:8.1f} s  peak RSS {peak_rss / 1024:7.1f} MiB '
+          f'(+{(peak_rss - baseline_rss) / 1024:.1f} MiB)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=100)
+    parser.add_argument('--spots', type=int, default=10000)
+    parser.add_argument('--mode', choices=['orm', 'bulk'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.lots, args.spots)
+        return
+    for mode in ('orm', 'bulk'):
+        subprocess.run([sys.executable, __file__, '--mode', mode,
+                        '--lots', str(args.lots), '--spots', str(args.spots)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Reserve-path latency: occupancy index vs. scanning parking_spots.
+
+Seeds LOTS x SPOTS spots into a scratch SQLite database and times the work
+``user.reserve`` does per request (build the "lots with availability" list,
+pick a spot, mark it occupied) with the old queries and with the index.
+
+    python benchmarks/bench_reserve.py [--lots 500] [--spots 2000] [--reservations 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, lots, spots):
+    from models.parking import ParkingLot, ParkingSpot
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': spots}
+        for i in range(1, lots + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, lots + 1) for n in range(1, spots + 1)
+    ])
+    db.session.commit()
+
+
+def reserve_scan(db, lot_id):
+    from models.parking import ParkingLot, ParkingSpot
+    ParkingLot.query.filter(
+        ParkingLot.id.in_(
+            db.session.query(ParkingSpot.lot_id).filter_by(status='A').group_by(ParkingSpot.lot_id)
+        )
+    ).all()
+    spot = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').first()
+    spot.status = 'O'
+    db.session.commit()
+
+
+def reserve_index(db, lot_id):
+    from models.parking import ParkingLot
+    from services.occupancy import occupancy_index, allocate_spot
+    ParkingLot.query.filter(ParkingLot.id.in_(occupancy_index.available_lot_ids())).all()
+    spot = allocate_spot(lot_id)
+    spot.status = 'O'
+    db.session.commit()
+
+
+def run(label, fn, db, lot_ids):
+    timings = []
+    for lot_id in lot_ids:
+        start = time.perf_counter()
+        fn(db, lot_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f'{label:<8} mean {statistics.mean(timings):8.3f} ms   p50 {timings[len(timings) // 2]:8.3f} ms   p99 {p99:8.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=500)
+    parser.add_argument('--spots', type=int, default=2000)
+    parser.add_argument('--reservations', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    from app import create_app
+    from models.database import db
+    from services.occupancy import occupancy_index
+
+    app = create_app()
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.lots, args.spots)
+        print(f'seeded {args.lots * args.spots:,} spots in {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        occupancy_index.warm()
+        print(f'index warm-up {time.perf_counter() - start:.2f}s')
+
+        lot_ids = [rng.randint(1, args.lots) for _ in range(args.reservations)]
+        run('scan', reserve_scan, db, lot_ids)
+        # The scan run occupied spots behind the index's back; reload before timing it
+        occupancy_index.warm()
+        run('index', reserve_index, db, lot_ids)
+        print(f'drift after run: {len(occupancy_index.check_consistency())} lot(s)')
+
+
+if __name__ == '__main__':
+    main()
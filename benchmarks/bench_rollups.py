@@ -0,0 +1,124 @@
+"""Revenue dashboards: scanning reservations vs. reading the rollup tables.
+
+Seeds RESERVATIONS completed reservations spread over two years, builds the
+rollups with the backfill, then times the daily/monthly revenue queries the
+dashboards used to run against ``/api/revenue-stats`` served from rollups.
+
+    python benchmarks/bench_rollups.py [--reservations 10000000] [--lots 50] [--users 1000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK = 100_000
+
+
+def seed(db, reservations, lots, users, spots_per_lot=20):
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    rng = random.Random(7)
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': spots_per_lot}
+        for i in range(1, lots + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, lots + 1) for n in range(1, spots_per_lot + 1)
+    ])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'name': f'User {i}', 'email': f'user{i}@example.com', 'password_hash': '!',
+         'address': 'Street', 'pin_code': '560001', 'is_admin': i == 1}
+        for i in range(1, users + 1)
+    ])
+    now = datetime.utcnow()
+    span = 2 * 365 * 24 * 3600
+    total_spots = lots * spots_per_lot
+    for offset in range(0, reservations, CHUNK):
+        rows = []
+        for _ in range(min(CHUNK, reservations - offset)):
+            parked = now - timedelta(seconds=rng.randrange(span))
+            hours = rng.uniform(0.25, 8)
+            rows.append({'spot_id': rng.randint(1, total_spots), 'user_id': rng.randint(2, users),
+                         'vehicle_number': 'KA01 1234', 'parking_time': parked,
+                         'leaving_time': parked + timedelta(hours=hours),
+                         'parking_cost': round(hours * 20.0, 2), 'is_active': False})
+        db.session.execute(Reservation.__table__.insert(), rows)
+        db.session.commit()
+    fill_reservation_lots()
+    db.session.commit()
+
+
+def scan_revenue(db):
+    """The queries /api/revenue-stats ran before the rollups existed"""
+    from models.parking import Reservation
+    from sqlalchemy import func
+    since = datetime.utcnow() - timedelta(days=30)
+    db.session.query(
+        func.date(Reservation.leaving_time), func.sum(Reservation.parking_cost)
+    ).filter(
+        Reservation.leaving_time >= since, Reservation.leaving_time.isnot(None)
+    ).group_by(func.date(Reservation.leaving_time)).all()
+    month = func.strftime('%Y-%m', Reservation.leaving_time)
+    db.session.query(month, func.sum(Reservation.parking_cost)).filter(
+        Reservation.leaving_time.isnot(None)
+    ).group_by(month).order_by(month.desc()).limit(12).all()
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=10_000_000)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-rollups-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "rollups.db")}'
+    from app import create_app
+    from models.database import db
+    from services import rollups
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.reservations, args.lots, args.users)
+        print(f'seeded {args.reservations:,} reservations in {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        counts = rollups.backfill()
+        print(f'backfill {time.perf_counter() - start:.1f}s -> {counts}')
+
+        start = time.perf_counter()
+        mismatches = rollups.verify()
+        print(f'verify {time.perf_counter() - start:.1f}s -> {len(mismatches)} mismatch(es)')
+
+        print(f'scan    revenue queries  median {timed(lambda: scan_revenue(db), args.repeat):10.1f} ms')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    print(f'rollup  /api/revenue-stats median {timed(lambda: client.get("/api/revenue-stats"), args.repeat):10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
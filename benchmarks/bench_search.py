@@ -0,0 +1,150 @@
+"""Lot and user search: substring LIKE scans vs the full-text search index.
+
+Seeds lots (with a few spots each) and users with realistic names and
+addresses, then times the old ``.contains()`` queries (plus one COUNT per
+matching lot, as user.search did) against a ranked page from the FTS5
+tables and from the in-process fallback index.
+
+    python benchmarks/bench_search.py [--lots 100000] [--users 1000000] [--no-fallback]
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK = 100_000
+SPOTS_PER_LOT = 4
+
+AREAS = ['Koramangala', 'Indiranagar', 'Whitefield', 'Jayanagar', 'Malleswaram', 'Hebbal', 'Marathahalli',
+         'Banashankari', 'Yelahanka', 'Basavanagudi', 'Electronic City', 'Rajajinagar', 'Ulsoor', 'Domlur']
+KINDS = ['Parking', 'Plaza', 'Mall', 'Metro Station', 'Tech Park', 'Market', 'Hospital', 'Stadium']
+FIRST_NAMES = ['Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rohan', 'Divya',
+               'Karthik', 'Meera', 'Siddharth', 'Pooja', 'Nikhil', 'Lakshmi', 'Aditya', 'Shreya', 'Manoj', 'Isha']
+LAST_NAMES = ['Sharma', 'Iyer', 'Reddy', 'Nair', 'Gowda', 'Patel', 'Rao', 'Menon', 'Kulkarni', 'Das',
+              'Hegde', 'Shetty', 'Pillai', 'Joshi', 'Verma', 'Kapoor']
+QUERIES = ['koramangala', 'kor', 'whitefield tech', 'metro', '560034', 'priya', 'sharma', 'pri sha', 'zzz']
+
+
+def pin_code(rng):
+    return str(560001 + rng.randrange(120))
+
+
+def seed(db, lots, users):
+    from models.parking import ParkingLot, ParkingSpot
+    from models.user import User
+    rng = random.Random(5)
+    for offset in range(0, lots, CHUNK):
+        ids = range(offset + 1, min(offset + CHUNK, lots) + 1)
+        db.session.execute(ParkingLot.__table__.insert(), [
+            {'id': i, 'name': f'{rng.choice(AREAS)} {rng.choice(KINDS)} {i}', 'price': 20.0,
+             'address': f'{rng.randint(1, 400)} {rng.choice(AREAS)} Main Road', 'pin_code': pin_code(rng),
+             'max_spots': SPOTS_PER_LOT}
+            for i in ids
+        ])
+        db.session.execute(ParkingSpot.__table__.insert(), [
+            {'lot_id': i, 'spot_number': n, 'status': rng.choice('AAO')}
+            for i in ids for n in range(1, SPOTS_PER_LOT + 1)
+        ])
+    for offset in range(0, users, CHUNK):
+        rows = []
+        for i in range(offset + 1, min(offset + CHUNK, users) + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            rows.append({'id': i, 'name': f'{first} {last}', 'email': f'{first.lower()}.{last.lower()}{i}@example.com',
+                         'password_hash': '!', 'address': f'{rng.randint(1, 900)} {rng.choice(AREAS)} Cross',
+                         'pin_code': pin_code(rng), 'is_admin': False})
+        db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+
+
+def like_search(db, query):
+    """The pre-index user.search and admin.search queries"""
+    from models.parking import ParkingLot, ParkingSpot
+    from models.user import User
+    lots = ParkingLot.query.filter(
+        (ParkingLot.name.contains(query)) |
+        (ParkingLot.address.contains(query)) |
+        (ParkingLot.pin_code.contains(query))
+    ).all()
+    for lot in lots:
+        ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
+    users = User.query.filter(
+        (User.name.contains(query)) |
+        (User.email.contains(query)) |
+        (User.address.contains(query)) |
+        (User.pin_code.contains(query))
+    ).filter_by(is_admin=False).all()
+    db.session.expunge_all()
+    return len(lots), len(users)
+
+
+def index_search(db, index, query):
+    lots = index.search_lots(query)
+    users = index.search_users(query)
+    db.session.expunge_all()
+    return lots.total, users.total
+
+
+def timed(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-fallback', action='store_true', help='Skip the in-process fallback index.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-search-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "search.db")}'
+    from app import create_app
+    from models.database import db
+    from services.search import SearchIndex
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.lots, args.users)
+        print(f'seeded {args.lots:,} lots and {args.users:,} users in {time.perf_counter() - start:.1f} s')
+
+        fts = SearchIndex()
+        start = time.perf_counter()
+        fts.install()
+        print(f'FTS5 index built in {time.perf_counter() - start:.1f} s (backend: {fts.backend})')
+
+        fallback = None
+        if not args.no_fallback:
+            fallback = SearchIndex()
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            start = time.perf_counter()
+            fallback._backend = 'memory'
+            fallback._load_memory()
+            elapsed = time.perf_counter() - start
+            rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+            print(f'fallback index built in {elapsed:.1f} s, peak RSS +{rss_growth / 1024:.0f} MiB')
+
+        print(f'\n{"query":<18}{"LIKE ms":>10}{"FTS5 ms":>10}{"fallback ms":>13}   matches (lots/users)')
+        for query in QUERIES:
+            like_ms, like_counts = timed(args.repeat, like_search, db, query)
+            fts_ms, fts_counts = timed(args.repeat, index_search, db, fts, query)
+            fallback_ms = timed(args.repeat, index_search, db, fallback, query)[0] if fallback else None
+            fallback_cell = f'{fallback_ms:>13.1f}' if fallback else f'{"-":>13}'
+            print(f'{query:<18}{like_ms:>10.1f}{fts_ms:>10.1f}{fallback_cell}   '
+                  f'LIKE {like_counts[0]}/{like_counts[1]}, index {fts_counts[0]}/{fts_counts[1]}')
+
+
+if __name__ == '__main__':
+    main()
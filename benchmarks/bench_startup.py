@@ -0,0 +1,76 @@
+"""Worker startup cost: cold import, create_app() and the first requests.
+
+Each sample is a fresh interpreter, like a new gunicorn worker or a
+short-lived test process, timing ``import app``, ``create_app()`` and the
+first GET of a few pages through the test client. Also lists which heavy
+optional modules a booted worker has loaded.
+
+    python benchmarks/bench_startup.py [--samples 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGES = ['/', '/login', '/register']
+HEAVY_MODULES = ['alembic', 'flask_migrate', 'wtforms', 'email_validator']
+
+SAMPLE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+booted = [name for name in %(heavy)r if name in sys.modules]
+client = application.test_client()
+pages = {}
+for page in %(pages)r:
+    page_start = time.perf_counter()
+    assert client.get(page).status_code == 200, page
+    pages[page] = time.perf_counter() - page_start
+print(json.dumps({'import': imported - start, 'create_app': created - imported, 'pages': pages, 'loaded': booted}))
+'''
+
+
+def sample(env):
+    code = SAMPLE % {'heavy': HEAVY_MODULES, 'pages': PAGES}
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--samples', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-startup-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "startup.db")}'
+    from app import create_app, initialize_app
+    initialize_app(create_app())
+
+    results = [sample(dict(os.environ)) for _ in range(args.samples)]
+
+    def report(label, values):
+        values = [value * 1000 for value in values]
+        print(f'{label:<22} median {statistics.median(values):7.1f} ms   max {max(values):7.1f} ms')
+
+    print(f'{args.samples} fresh interpreters')
+    report('import app', [result['import'] for result in results])
+    report('create_app()', [result['create_app'] for result in results])
+    for page in PAGES:
+        report(f'first GET {page}', [result['pages'][page] for result in results])
+    report('boot to first response', [result['import'] + result['create_app'] + result['pages'][PAGES[0]]
+                                      for result in results])
+    print(f'heavy modules loaded at boot: {", ".join(results[0]["loaded"]) or "none"}')
+
+
+if __name__ == '__main__':
+    main()
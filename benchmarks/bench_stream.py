@@ -0,0 +1,127 @@
+"""Fan-out of /api/occupancy/stream to many subscribers.
+
+Attaches SUBSCRIBERS streaming clients (one thread each, through the Flask
+test client), then reserves/releases spots through the occupancy index and
+measures how long each delta takes to reach every subscriber, plus the
+Python heap used per open connection.
+
+    python benchmarks/bench_stream.py [--subscribers 1000] [--events 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=200)
+    parser.add_argument('--lots', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-stream-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "stream.db")}'
+    from app import create_app
+    from models.database import db
+    from models.user import User
+    from services.occupancy import occupancy_index
+    from services.occupancy_stream import occupancy_publisher
+    from services.provisioning import import_lots
+
+    app = create_app({'TESTING': True, 'OCCUPANCY_STREAM_HEARTBEAT': 1})
+    occupancy_publisher.max_queue = max(256, args.events * 2)
+    with app.app_context():
+        db.create_all()
+        import_lots([{'name': f'Lot {i}', 'price': 20, 'address': f'{i} Main Road',
+                      'pin_code': '560001', 'max_spots': 500} for i in range(args.lots)])
+        user = User(name='Viewer', email='viewer@example.com', password_hash='!', is_admin=True)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        occupancy_index.warm()
+
+    received = [dict() for _ in range(args.subscribers)]
+    ready = threading.Barrier(args.subscribers + 1)
+    done = threading.Event()
+    expected_last = threading.Event()
+    last_id = [None]
+
+    def subscriber(slot):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        response = client.get('/api/occupancy/stream', buffered=False)
+        frames = iter(response.response)
+        next(frames)  # snapshot
+        ready.wait()
+        for frame in frames:
+            now = time.perf_counter()
+            frame = frame.decode() if isinstance(frame, bytes) else frame
+            if frame.startswith('id: '):
+                event_id = int(frame.split('\n', 1)[0][4:])
+                received[slot][event_id] = now
+                if expected_last.is_set() and event_id >= last_id[0]:
+                    break
+            if done.is_set():
+                break
+        response.close()
+
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    threads = [threading.Thread(target=subscriber, args=(slot,), daemon=True) for slot in range(args.subscribers)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    heap_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'{occupancy_publisher.subscriber_count} subscribers attached, '
+          f'{(heap_after - heap_before) / args.subscribers / 1024:.1f} KiB Python heap per connection')
+
+    published = {}
+    with app.app_context():
+        start = time.perf_counter()
+        claimed = None
+        for n in range(args.events):
+            # Alternate claim/release on the same lot so counts stay bounded
+            lot_id = n // 2 % args.lots + 1
+            published_at = time.perf_counter()
+            if claimed is None:
+                claimed = occupancy_index.claim_spot(lot_id)
+            else:
+                occupancy_index.release_spot(lot_id, claimed)
+                claimed = None
+            published[occupancy_publisher.last_event_id] = published_at
+        publish_elapsed = time.perf_counter() - start
+    last_id[0] = occupancy_publisher.last_event_id
+    expected_last.set()
+
+    deadline = time.time() + 60
+    for thread in threads:
+        thread.join(timeout=max(0, deadline - time.time()))
+    done.set()
+
+    latencies = [
+        (arrival[event_id] - published_at) * 1000
+        for arrival in received for event_id, published_at in published.items() if event_id in arrival
+    ]
+    delivered = len(latencies)
+    expected = len(published) * args.subscribers
+    latencies.sort()
+    print(f'published {len(published)} events in {publish_elapsed * 1000:.1f} ms; '
+          f'delivered {delivered:,}/{expected:,} ({occupancy_publisher.dropped} subscribers dropped)')
+    if latencies:
+        print(f'delivery latency p50 {statistics.median(latencies):.2f} ms   '
+              f'p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.2f} ms   '
+              f'max {latencies[-1]:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Overstay sweeps over 1M active reservations stay incremental.
+
+Seeds LOTS lots with ACTIVE spots, users and active reservations in all,
+parked evenly over the last 25 hours, plus TAIL older ones parked two to
+three days ago. With OVERSTAY_HOURS=24 and OVERSTAY_RELEASE_HOURS=48 it
+runs the overstay-sweep job through the job runner: once to catch up, then
+SWEEPS more with the clock moved on by --interval minutes each time, and a
+last one with nothing new to do. SQLite's progress handler counts the
+virtual machine steps of each sweep, next to those of one scan over the
+active reservations. Exits non-zero if a sweep's work grows with the number
+of parked cars instead of with the reservations that became overdue (an
+idle sweep costing over 1% of a scan, or a sweep costing over twice the
+catch-up's steps per reservation), if the flagged and released
+reservations differ from what the clock says they should be, or if the
+revenue rollups disagree with the released reservations.
+
+    python benchmarks/bench_sweeper.py [--active 1000000] [--lots 100] [--tail 1000] [--sweeps 12] [--interval 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK_SIZE = 50_000
+# Progress handler granularity, in virtual machine instructions
+STEP = 100
+
+
+def seed(db, rng, active, lots, tail, origin):
+    """Reservation n is user n's, on spot n; the first ``tail`` are the old ones"""
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.user import User
+    from services.reservations import fill_reservation_lots
+    per_lot = -(-active // lots)
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': lot, 'name': f'Lot {lot}', 'price': 20.0, 'address': f'{lot} Main Road', 'pin_code': '560001',
+         'max_spots': per_lot}
+        for lot in range(1, lots + 1)
+    ])
+    window = 25 * 3600
+    for start in range(1, active + 1, CHUNK_SIZE):
+        ids = range(start, min(start + CHUNK_SIZE, active + 1))
+        db.session.execute(User.__table__.insert(), [
+            {'id': n, 'name': f'User {n}', 'email': f'user{n}@example.com', 'password_hash': '!', 'is_admin': False}
+            for n in ids
+        ])
+        db.session.execute(ParkingSpot.__table__.insert(), [
+            {'id': n, 'lot_id': (n - 1) // per_lot + 1, 'spot_number': (n - 1) % per_lot + 1, 'status': 'O'}
+            for n in ids
+        ])
+        db.session.execute(Reservation.__table__.insert(), [
+            {'id': n, 'spot_id': n, 'user_id': n, 'vehicle_number': 'KA01 AB 1234', 'is_active': True,
+             'parking_time': origin - timedelta(seconds=rng.randrange(48 * 3600, 72 * 3600) if n <= tail
+                                                 else rng.randrange(window))}
+            for n in ids
+        ])
+    fill_reservation_lots()
+    db.session.commit()
+
+
+class StepCounter:
+    """Virtual machine steps run on one SQLite connection, in units of STEP"""
+
+    def __init__(self, connection):
+        self.steps = 0
+        connection.set_progress_handler(self._tick, STEP)
+
+    def _tick(self):
+        self.steps += STEP
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--active', type=int, default=1_000_000)
+    parser.add_argument('--lots', type=int, default=100)
+    parser.add_argument('--tail', type=int, default=1000, help='Reservations old enough to be released.')
+    parser.add_argument('--sweeps', type=int, default=12)
+    parser.add_argument('--interval', type=int, default=5, help='Minutes between sweeps.')
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='parking-sweeper-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "sweeper.db")}'
+    from app import create_app
+    from models.database import db
+    from models.jobs import Overstay
+    from models.parking import Reservation
+    from services import rollups
+    from services.jobs import job_runner
+    from services.occupancy import occupancy_index
+
+    # One pooled connection, so the step counter sees every statement
+    app = create_app({
+        'SQLALCHEMY_ENGINE_OPTIONS': dict(pool_size=1, max_overflow=0, connect_args={'timeout': 30}),
+        'OVERSTAY_HOURS': 24, 'OVERSTAY_RELEASE_HOURS': 48, 'OVERSTAY_BATCH_SIZE': args.batch,
+        'JOBS_RUN_SECONDS': 3600,
+    })
+    failures = []
+    with app.app_context():
+        db.create_all()
+        origin = datetime.utcnow().replace(microsecond=0)
+        start = time.perf_counter()
+        seed(db, rng, args.active, args.lots, args.tail, origin)
+        print(f'{args.active:,} active reservations in {args.lots} lots seeded in {time.perf_counter() - start:.1f}s')
+        # Released spots go back to the occupancy index; load it up front rather than inside the first sweep
+        occupancy_index.ensure_loaded()
+        counter = StepCounter(db.session.connection().connection.driver_connection)
+        db.session.commit()
+
+        before = counter.steps
+        start = time.perf_counter()
+        db.session.execute(db.text(
+            'SELECT count(*) FROM reservations NOT INDEXED WHERE is_active = 1 AND parking_time < :cutoff'
+        ), {'cutoff': origin}).scalar()
+        scan_steps = counter.steps - before
+        print(f'one scan of the active reservations: {scan_steps:,} steps, {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        print(f'{"sweep":<10} {"items":>7} {"ms":>8} {"steps":>12} {"steps/item":>11} {"vs scan":>8}')
+        sweeps = [('catch-up', origin)]
+        sweeps += [(f'+{n * args.interval} min', origin + timedelta(minutes=n * args.interval))
+                   for n in range(1, args.sweeps + 1)]
+        sweeps.append(('idle', sweeps[-1][1]))
+        per_item = None
+        for label, now in sweeps:
+            before = counter.steps
+            result = job_runner.run('overstay-sweep', now=now, force=True)
+            steps = counter.steps - before
+            if result['error'] or result['more']:
+                failures.append(f'{label}: {result["error"] or "did not finish"}')
+            items = result['processed']
+            ratio = steps / max(items, 1)
+            print(f'{label:<10} {items:7,d} {result["duration_ms"]:8.1f} {steps:12,d} {ratio:11.0f} '
+                  f'{steps / scan_steps:8.2%}')
+            if label == 'catch-up':
+                per_item = ratio
+            elif label == 'idle':
+                if steps > scan_steps / 100:
+                    failures.append(f'an idle sweep took {steps:,} steps, {steps / scan_steps:.1%} of a scan')
+            elif ratio > 2 * per_item:
+                failures.append(f'{label}: {ratio:.0f} steps per item against {per_item:.0f} when catching up')
+
+        # Every reservation parked over 24 hours before the last sweep is flagged, and released over 48 hours
+        now = sweeps[-1][1]
+        overdue = db.session.query(Reservation).filter(Reservation.parking_time < now - timedelta(hours=24)).count()
+        flagged = db.session.query(Overstay).count()
+        released = db.session.query(Overstay).filter(Overstay.released_at.isnot(None)).count()
+        still_active = db.session.query(Reservation).filter(
+            Reservation.is_active == True, Reservation.parking_time < now - timedelta(hours=48)
+        ).count()
+        print(f'{flagged:,} overstays flagged ({overdue:,} expected), {released:,} released ({args.tail:,} expected)')
+        if flagged != overdue or released != args.tail or still_active:
+            failures.append('flagged or released reservations differ from the expected ones')
+        mismatches = rollups.verify()
+        if mismatches:
+            failures.append(f'{len(mismatches)} revenue rollup row(s) differ from the released reservations')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
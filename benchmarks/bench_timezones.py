@@ -0,0 +1,120 @@
+"""Rendering a long reservation history: per-row pytz properties vs the timezone layer.
+
+Renders the timestamp cells of a ROWS-row history table three ways: the old
+per-row ``to_ist`` property (a pytz lookup and conversion per access, when
+pytz is installed), the ``localtime`` template filter, and columns converted
+up front with ``to_local_many``.
+
+    python benchmarks/bench_timezones.py [--rows 10000] [--zone Asia/Kolkata]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROPERTY_TEMPLATE = '''{% for row in rows %}
+<tr><td>{{ row.parking_time_ist.strftime('%d/%m/%Y') }}</td>
+<td>{{ row.parking_time_ist.strftime('%d/%m/%Y %H:%M:%S') }}</td>
+<td>{% if row.leaving_time_ist %}{{ row.leaving_time_ist.strftime('%d/%m/%Y %H:%M:%S') }}{% endif %}</td></tr>
+{% endfor %}'''
+
+FILTER_TEMPLATE = '''{% for row in rows %}
+<tr><td>{{ row.parking_time|localtime('%d/%m/%Y') }}</td>
+<td>{{ row.parking_time|localtime('%d/%m/%Y %H:%M:%S') }}</td>
+<td>{{ row.leaving_time|localtime('%d/%m/%Y %H:%M:%S') }}</td></tr>
+{% endfor %}'''
+
+BULK_TEMPLATE = '''{% for row in rows %}
+<tr><td>{{ row.parked_at|localtime('%d/%m/%Y') }}</td>
+<td>{{ row.parked_at|localtime('%d/%m/%Y %H:%M:%S') }}</td>
+<td>{{ row.left_at|localtime('%d/%m/%Y %H:%M:%S') }}</td></tr>
+{% endfor %}'''
+
+
+class PytzRow:
+    """A history row with the pre-zoneinfo IST properties"""
+
+    def __init__(self, parking_time, leaving_time):
+        self.parking_time = parking_time
+        self.leaving_time = leaving_time
+
+    @staticmethod
+    def to_ist(utc_dt):
+        if utc_dt is None:
+            return None
+        from pytz import timezone, utc
+        ist = timezone('Asia/Kolkata')
+        return utc_dt.replace(tzinfo=utc).astimezone(ist)
+
+    @property
+    def parking_time_ist(self):
+        return self.to_ist(self.parking_time)
+
+    @property
+    def leaving_time_ist(self):
+        return self.to_ist(self.leaving_time)
+
+
+def make_rows(count):
+    rng = random.Random(3)
+    now = datetime.utcnow()
+    rows = []
+    for n in range(count):
+        parked = now - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        left = parked + timedelta(minutes=rng.randint(10, 600)) if n else None
+        rows.append(PytzRow(parked, left))
+    return rows
+
+
+def timed(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--zone', default='Asia/Kolkata', help='DISPLAY_TIMEZONE for the filter and bulk runs.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from services.timezones import to_local_many
+
+    app = create_app({'DISPLAY_TIMEZONE': args.zone})
+    rows = make_rows(args.rows)
+    env = app.jinja_env
+
+    def render_bulk():
+        parked_at = to_local_many([row.parking_time for row in rows])
+        left_at = to_local_many([row.leaving_time for row in rows])
+        page = [SimpleNamespace(parked_at=parked, left_at=left) for parked, left in zip(parked_at, left_at)]
+        return env.from_string(BULK_TEMPLATE).render(rows=page)
+
+    runs = [('localtime filter', lambda: env.from_string(FILTER_TEMPLATE).render(rows=rows)),
+            ('to_local_many + filter', render_bulk)]
+    try:
+        import pytz  # noqa: F401
+        runs.insert(0, ('pytz to_ist properties', lambda: env.from_string(PROPERTY_TEMPLATE).render(rows=rows)))
+    except ImportError:
+        print('pytz is not installed; skipping the old per-row properties')
+
+    print(f'{args.rows:,} history rows, 3 timestamp cells each, {args.zone}')
+    with app.app_context():
+        for label, render in runs:
+            render()
+            print(f'{label:<26} {timed(args.repeat, render):8.1f} ms/render')
+
+
+if __name__ == '__main__':
+    main()
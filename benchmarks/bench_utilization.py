@@ -0,0 +1,139 @@
+"""A year of occupancy analytics for 500 lots renders in under a second.
+
+Generates LOTS lots with YEARS of reservations (benchmarks/datagen.py),
+times a full rebuild of the occupancy series from the reservations, then
+GET /api/analytics/utilization over the last 366 days for every lot, and
+one lot's /api/lots/<id>/occupancy. Checks the lot-day with the most
+arrivals against a plain recount of the reservations overlapping it, and
+times the utilization view again without NumPy for comparison. Exits
+non-zero if the median utilization render takes a second or more, or if
+the series disagrees with the recount.
+
+    python benchmarks/bench_utilization.py [--lots 500] [--spots 6] [--users 20000] [--years 1] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen  # noqa: E402
+
+
+def timed_get(client, url, repeat):
+    """Median milliseconds of ``repeat`` GETs of ``url``, and the last response"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f'{url} answered {response.status_code}')
+    return statistics.median(samples), response
+
+
+def recount(lot_id, day, now):
+    """(occupied seconds, peak, arrivals) per local hour of a lot-day, straight from the reservations"""
+    from models.database import db
+    from models.parking import ParkingSpot, Reservation
+    from services import occupancy_series
+    from services.timezones import display_zone
+    zone = display_zone()
+    start, end = occupancy_series.day_start(day, zone), occupancy_series.day_start(day + 1, zone)
+    stays = db.session.execute(
+        db.select(Reservation.parking_time, Reservation.leaving_time)
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .where(ParkingSpot.lot_id == lot_id, Reservation.parking_time < end,
+               db.or_(Reservation.leaving_time.is_(None), Reservation.leaving_time > start))
+    ).all()
+    stays = [(parking, leaving or now) for parking, leaving in stays]
+    hours = []
+    for hour in range(24):
+        low = start + timedelta(hours=hour)
+        high = low + timedelta(hours=1)
+        occupied = sum(max(0.0, (min(leaving, high) - max(parking, low)).total_seconds()) for parking, leaving in stays)
+        instants = [low] + [t for stay in stays for t in stay if low <= t < high]
+        peak = max(sum(1 for parking, leaving in stays if parking <= t < leaving) for t in instants)
+        arrivals = sum(1 for parking, _ in stays if low <= parking < high)
+        hours.append((occupied, peak, arrivals))
+    return hours
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=500)
+    parser.add_argument('--spots', type=int, default=6, help='Typical spots per lot.')
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--years', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-utilization-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "utilization.db")}'
+    from app import create_app
+    from models.database import db
+    from models.rollup import LotOccupancyMonth
+    from services import occupancy_series
+
+    app = create_app({'JOBS_RUN_SECONDS': 3600})
+    failures = []
+    with app.app_context():
+        stats = datagen.generate(db, seed=args.seed, lots=args.lots, spots=args.spots, users=args.users,
+                                 years=args.years)
+        print(f'{stats["reservations"]:,} reservations in {stats["lots"]} lots ({stats["spots"]:,} spots) '
+              f'generated in {stats["total_seconds"]:.1f}s')
+
+        end = datetime.fromisoformat(stats['end'])
+        start = time.perf_counter()
+        occupancy_series.update_series(end)
+        rows = db.session.query(LotOccupancyMonth).count()
+        print(f'occupancy series rebuilt in {time.perf_counter() - start:.1f}s: {rows:,} lot-months')
+
+        # The lot-day with the most arrivals, recounted the slow way
+        first, last = occupancy_series.local_day(end) - 365, occupancy_series.local_day(end)
+        names = [name for name, _, _ in occupancy_series.COLUMNS]
+        lot_id, day, (occupied, peak, arrivals, _, _) = max(
+            occupancy_series._days(occupancy_series._load(first, last, None, names), names, first, last),
+            key=lambda entry: sum(entry[2][2])
+        )
+        wrong = [hour for hour, (stored, counted) in enumerate(zip(zip(occupied, peak, arrivals), recount(lot_id, day, end)))
+                 if abs(stored[0] - counted[0]) > 1 or stored[1:] != counted[1:]]
+        print(f'lot {lot_id} on {occupancy_series.day_iso(day)}: {24 - len(wrong)}/24 hours match a recount')
+        if wrong:
+            failures.append(f'lot {lot_id} on {occupancy_series.day_iso(day)} differs from a recount in hours {wrong}')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+    since, until = occupancy_series.day_iso(first), occupancy_series.day_iso(last)
+    url = f'/api/analytics/utilization?since={since}&until={until}'
+    median, response = timed_get(client, url, args.repeat)
+    lots = response.get_json()['lots']
+    print(f'{url}: {len(lots)} lots in {median:.0f} ms (median of {args.repeat}), {len(response.data):,} bytes')
+    if median >= 1000:
+        failures.append(f'the utilization view took {median:.0f} ms')
+    if len(lots) != stats['lots']:
+        failures.append(f'the utilization view listed {len(lots)} of {stats["lots"]} lots')
+
+    series_url = f'/api/lots/{lot_id}/occupancy?since={since}&until={until}'
+    median, _ = timed_get(client, series_url, args.repeat)
+    print(f'{series_url}: {median:.0f} ms')
+
+    if occupancy_series.np is not None:
+        occupancy_series.np = None
+        median, _ = timed_get(client, url, 1)
+        print(f'{url} without NumPy: {median:.0f} ms')
+
+    for failure in failures:
+        print(f'FAILED {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
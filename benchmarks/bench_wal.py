@@ -0,0 +1,120 @@
+"""Concurrent reserve/release throughput: SQLite's default journal vs WAL.
+
+Runs the load_reserve workload (every thread loops reserve -> release as its
+own user against a few contended lots) once per journal configuration, each
+in a fresh process and database, and reports requests/sec, latency, lock
+errors and double bookings.
+
+    python benchmarks/bench_wal.py [--users 64] [--threads 32] [--cycles 40] [--lots 4] [--spots 8]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = [
+    # label, journal_mode, synchronous (SQLite's own defaults first)
+    ('default (DELETE/FULL)', 'DELETE', 'FULL'),
+    ('WAL/FULL', 'WAL', 'FULL'),
+    ('WAL/NORMAL', 'WAL', 'NORMAL'),
+]
+
+
+def run(args):
+    """One measurement in this process; prints a JSON result line"""
+    from load_reserve import seed, check_bookings
+    from sqlalchemy.exc import OperationalError
+    from app import create_app
+    from models.database import db
+    from services.occupancy import occupancy_index
+
+    app = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        db.create_all()
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        user_ids = seed(db, args.users, args.lots, args.spots)
+        occupancy_index.warm()
+
+    def worker(index, user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        latencies, errors = [], 0
+        for cycle in range(args.cycles):
+            lot_id = (index + cycle) % args.lots + 1
+            for path, data in (('/user/reserve', {'lot_id': lot_id, 'vehicle_number': f'KA01 {user_id:04d}'}),
+                               ('/user/release', {})):
+                start = time.perf_counter()
+                try:
+                    status = client.post(path, data=data).status_code
+                except OperationalError:
+                    # TESTING propagates the error a user would see as a 500 (e.g. "database is locked")
+                    status = 500
+                latencies.append(time.perf_counter() - start)
+                errors += status >= 500
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(worker, range(len(user_ids)), user_ids))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+    with app.app_context():
+        problems = check_bookings(db)
+    print(json.dumps({
+        'journal_mode': journal_mode,
+        'requests': len(latencies),
+        'req_per_sec': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'errors': sum(errors for _, errors in results),
+        'double_bookings': len(problems),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--cycles', type=int, default=40, help='reserve/release cycles per user')
+    parser.add_argument('--lots', type=int, default=4)
+    parser.add_argument('--spots', type=int, default=8)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args)
+        return
+
+    print(f'{args.users} users x {args.cycles} cycles on {args.threads} threads, '
+          f'{args.lots} lots x {args.spots} spots')
+    failed = False
+    for label, journal_mode, synchronous in MODES:
+        workdir = tempfile.mkdtemp(prefix='parking-wal-')
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "wal.db")}',
+                   SQLITE_JOURNAL_MODE=journal_mode, SQLITE_SYNCHRONOUS=synchronous)
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run'] + sys.argv[1:],
+            env=env, capture_output=True, text=True
+        )
+        if process.returncode:
+            sys.exit(f'{label} run failed:\n{process.stderr}')
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        print(f'{label:<22} {result["req_per_sec"]:7.0f} req/s   p50 {result["p50_ms"]:6.1f} ms   '
+              f'p99 {result["p99_ms"]:7.1f} ms   errors {result["errors"]}   '
+              f'double bookings {result["double_bookings"]}   (journal_mode={result["journal_mode"]})')
+        failed = failed or result['double_bookings']
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
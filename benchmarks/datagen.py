@@ -0,0 +1,313 @@
+"""Seeded synthetic data: lots, spots, users and years of reservations.
+
+Arrivals at each lot follow a Poisson process whose rate moves with the
+local hour and the day of the week (morning and evening peaks, quiet nights
+and weekends); stays are lognormal, a mix of errands, working days and
+the odd multi-day park, and morning arrivals are more likely to stay the
+day. Every arrival takes the lowest numbered free spot, drivers who find a
+lot full go away, and users park with Zipf-like frequency, so a few have
+long histories and most have a handful. Stays still running when the data
+ends are left active, with their spots occupied. Costs come from the
+billing engine, some lots get tariff plans, and the revenue rollups,
+occupancy series and search index are rebuilt at the end.
+
+The same seed and sizes give the same rows, relative to the hour the data
+ends (the current one unless --end is given). Rows are bulk inserted in
+chunks with the reservation indexes dropped and rebuilt afterwards.
+
+    python benchmarks/datagen.py --database bench.db [--seed 1] [--lots 20] [--spots 40] [--users 5000] [--years 2]
+"""
+import argparse
+import bisect
+import heapq
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from datetime import time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULTS = {'seed': 1, 'lots': 20, 'spots': 40, 'users': 5000, 'years': 2.0}
+# Users 2 .. SCENARIO_USERS + 1 (user 1 is the admin) can sign in with PASSWORD and hold no spot at the end
+SCENARIO_USERS = 10
+PASSWORD = 'benchmark-password'
+CHUNK_SIZE = 50_000
+# Stays per spot per day at a lot of average popularity
+TURNOVER = 1.5
+# Relative arrival rate by local hour of the day and by weekday (Monday first)
+HOURLY = (0.1, 0.05, 0.05, 0.05, 0.1, 0.3, 0.8, 1.6, 2.2, 2.0, 1.4, 1.2,
+          1.3, 1.2, 1.0, 1.0, 1.2, 1.6, 1.8, 1.5, 1.0, 0.7, 0.4, 0.2)
+WEEKLY = (1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.6)
+# (median hours, sigma) of the lognormal stay lengths
+ERRAND = (1.5, 0.7)
+WORKDAY = (8.5, 0.25)
+LONG_STAY = (30.0, 0.8)
+MIN_STAY = timedelta(minutes=5)
+MAX_STAY = timedelta(days=7)
+
+AREAS = ('Koramangala', 'Indiranagar', 'Whitefield', 'Jayanagar', 'Malleshwaram', 'Hebbal', 'Marathahalli',
+         'Yelahanka', 'Banashankari', 'Electronic City', 'Rajajinagar', 'Basavanagudi')
+KINDS = ('Metro Station', 'Mall', 'Tech Park', 'Market', 'Hospital', 'Stadium', 'Central')
+FIRST_NAMES = ('Aarav', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nikhil', 'Priya', 'Rahul',
+               'Rohan', 'Sanjana', 'Siddharth', 'Sneha', 'Tanvi', 'Varun', 'Vikram', 'Zara')
+LAST_NAMES = ('Agarwal', 'Bhat', 'Das', 'Gupta', 'Iyer', 'Joshi', 'Kumar', 'Menon', 'Nair', 'Patel',
+              'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma')
+
+
+def _pin_code(rng, area):
+    return f'5600{AREAS.index(area) + 10:02d}' if rng.random() < 0.9 else f'{rng.randint(560001, 560099)}'
+
+
+def _vehicle_number(rng):
+    letters = ''.join(rng.choice('ABCDEFGHJKLMNPRSTUVWXYZ') for _ in range(2))
+    return f'KA{rng.randint(1, 60):02d} {letters} {rng.randint(1000, 9999)}'
+
+
+def _stay(rng, local_hour):
+    """Length of one stay; morning arrivals are mostly commuters"""
+    draw = rng.random()
+    commuters = 0.5 if 7 <= local_hour <= 10 else 0.1
+    median, sigma = WORKDAY if draw < commuters else LONG_STAY if draw > 0.95 else ERRAND
+    hours = rng.lognormvariate(math.log(median), sigma)
+    return min(max(timedelta(hours=hours), MIN_STAY), MAX_STAY)
+
+
+def make_lots(rng, count, spots):
+    """(lot rows, spot rows, tariff rows)"""
+    lots, spot_rows, tariffs = [], [], []
+    spot_id = 0
+    for lot_id in range(1, count + 1):
+        area = AREAS[(lot_id - 1) % len(AREAS)]
+        size = max(5, round(rng.lognormvariate(math.log(spots), 0.5)))
+        price = float(rng.choice((10, 20, 20, 30, 40, 50, 60)))
+        lots.append({'id': lot_id, 'name': f'{area} {rng.choice(KINDS)} {lot_id}', 'price': price,
+                     'address': f'{rng.randint(1, 200)} {area} Main Road, Bengaluru',
+                     'pin_code': _pin_code(rng, area), 'max_spots': size})
+        for number in range(1, size + 1):
+            spot_id += 1
+            spot_rows.append({'id': spot_id, 'lot_id': lot_id, 'spot_number': number, 'status': 'A'})
+        if lot_id % 3 == 0:
+            tariffs.append({'lot_id': lot_id, 'increment_minutes': 15, 'minimum_charge': price / 2,
+                            'daily_cap': price * 8, 'peak_start': clock(8), 'peak_end': clock(11),
+                            'peak_price': price * 1.5})
+    return lots, spot_rows, tariffs
+
+
+def make_users(rng, count, password_hash):
+    users = []
+    for user_id in range(2, count + 2):
+        area = rng.choice(AREAS)
+        users.append({'id': user_id, 'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                      'email': f'user{user_id}@example.com',
+                      'password_hash': password_hash if user_id <= SCENARIO_USERS + 1 else '!',
+                      'address': f'{rng.randint(1, 500)} {area} Cross, Bengaluru',
+                      'pin_code': _pin_code(rng, area), 'is_admin': False})
+    return users
+
+
+class LotSimulation:
+    """Spot bookkeeping for one lot while its arrivals are played in time order"""
+
+    def __init__(self, lot_id, spot_ids, popularity):
+        self.lot_id = lot_id
+        self.popularity = popularity
+        self.free = [(number, spot_id) for number, spot_id in enumerate(spot_ids, 1)]
+        self.busy = []  # (leaving, spot_number, spot_id)
+
+    def park(self, arrival, leaving):
+        """The spot id taken from ``arrival`` to ``leaving``, or None if the lot is full"""
+        while self.busy and self.busy[0][0] <= arrival:
+            _, number, spot_id = heapq.heappop(self.busy)
+            heapq.heappush(self.free, (number, spot_id))
+        if not self.free:
+            return None
+        number, spot_id = heapq.heappop(self.free)
+        heapq.heappush(self.busy, (leaving, number, spot_id))
+        return spot_id
+
+
+def reservations(rng, lots, spots, users, start, end):
+    """Yield reservation rows (without costs) in parking time order"""
+    from services.timezones import to_local
+    spot_ids = {}
+    for spot in spots:
+        spot_ids.setdefault(spot['lot_id'], []).append(spot['id'])
+    simulations = [LotSimulation(lot['id'], spot_ids[lot['id']], rng.uniform(0.6, 1.4)) for lot in lots]
+
+    # Zipf-like: the user with rank r parks 1/r as often as the most frequent one
+    user_ids = [user['id'] for user in users]
+    rng.shuffle(user_ids)
+    cumulative, total = [], 0.0
+    for rank in range(1, len(user_ids) + 1):
+        total += 1 / rank
+        cumulative.append(total)
+    vehicles = {user['id']: _vehicle_number(rng) for user in users}
+    active_users = set()
+    hourly_mean = sum(HOURLY) / len(HOURLY)
+    weekly_mean = sum(WEEKLY) / len(WEEKLY)
+
+    hour = start
+    while hour < end:
+        local = to_local(hour)
+        profile = HOURLY[local.hour] / hourly_mean * WEEKLY[local.weekday()] / weekly_mean
+        arrivals = []
+        for lot in simulations:
+            # Arrivals per second this hour
+            rate = (len(lot.free) + len(lot.busy)) * TURNOVER * lot.popularity * profile / 86400
+            offset = rng.expovariate(rate) if rate else 3600
+            while offset < 3600:
+                arrivals.append((offset, lot))
+                offset += rng.expovariate(rate)
+        arrivals.sort(key=lambda arrival: arrival[0])
+        for offset, lot in arrivals:
+            parked = hour + timedelta(seconds=offset)
+            leaving = parked + _stay(rng, local.hour)
+            user_id = user_ids[bisect.bisect_left(cumulative, rng.random() * total)]
+            active = leaving > end
+            if active:
+                # One active reservation per user, and none for the users the scenarios sign in as
+                for _ in range(10):
+                    if user_id not in active_users and user_id > SCENARIO_USERS + 1:
+                        break
+                    user_id = user_ids[rng.randrange(len(user_ids))]
+                else:
+                    continue
+            spot_id = lot.park(parked, leaving)
+            if spot_id is None:
+                continue
+            if active:
+                active_users.add(user_id)
+            yield {'spot_id': spot_id, 'user_id': user_id, 'vehicle_number': vehicles[user_id],
+                   'parking_time': parked.replace(microsecond=0), 'is_active': active,
+                   'leaving_time': None if active else leaving.replace(microsecond=0),
+                   'lot_id': lot.lot_id}
+        hour += timedelta(hours=1)
+
+
+def _price(rows, tariffs):
+    from services.billing import price_batch, to_epoch
+    closed = [row for row in rows if not row['is_active']]
+    costs = price_batch(tariffs, [row['lot_id'] for row in closed],
+                        [to_epoch(row['parking_time']) for row in closed],
+                        [to_epoch(row['leaving_time']) for row in closed])
+    for row, cost in zip(closed, costs):
+        row['parking_cost'] = cost
+    for row in rows:
+        row.setdefault('parking_cost', None)
+    return rows
+
+
+def generate(db, seed=DEFAULTS['seed'], lots=DEFAULTS['lots'], spots=DEFAULTS['spots'],
+             users=DEFAULTS['users'], years=DEFAULTS['years'], end=None, log=None):
+    """Fill an empty database; call inside an app context. Returns row counts and timings"""
+    from models.parking import ParkingLot, ParkingSpot, Reservation
+    from models.tariff import LotTariff
+    from models.user import User, create_admin_user
+    from services import rollups
+    from services.billing import tariffs_for_lots
+    from services.jobs import job_runner
+    from services.passwords import passwords
+    from services.search import search_index
+
+    log = log or (lambda message: None)
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    end = end or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=round(365 * years))
+
+    db.create_all()
+    create_admin_user()
+    lot_rows, spot_rows, tariff_rows = make_lots(rng, lots, spots)
+    user_rows = make_users(rng, users, passwords.hash(PASSWORD))
+    db.session.execute(ParkingLot.__table__.insert(), lot_rows)
+    db.session.execute(ParkingSpot.__table__.insert(), spot_rows)
+    if tariff_rows:
+        db.session.execute(LotTariff.__table__.insert(), tariff_rows)
+    for offset in range(0, len(user_rows), CHUNK_SIZE):
+        db.session.execute(User.__table__.insert(), user_rows[offset:offset + CHUNK_SIZE])
+    db.session.commit()
+    tariffs = tariffs_for_lots()
+
+    # Secondary indexes are cheaper to build once at the end than to maintain row by row
+    table = Reservation.__table__
+    connection = db.session.connection()
+    for index in table.indexes:
+        index.drop(connection)
+    count = 0
+    occupied = []
+    chunk = []
+    for row in reservations(rng, lot_rows, spot_rows, user_rows, start, end):
+        chunk.append(row)
+        if row['is_active']:
+            occupied.append(row['spot_id'])
+        if len(chunk) == CHUNK_SIZE:
+            db.session.execute(table.insert(), _price(chunk, tariffs))
+            count += len(chunk)
+            chunk = []
+            log(f'{count:,} reservations')
+    if chunk:
+        db.session.execute(table.insert(), _price(chunk, tariffs))
+        count += len(chunk)
+    if occupied:
+        db.session.execute(ParkingSpot.__table__.update().where(ParkingSpot.id.in_(occupied)).values(status='O'))
+    for index in table.indexes:
+        index.create(connection)
+    db.session.commit()
+    loaded = time.perf_counter()
+
+    rollups.backfill()
+    # The occupancy series, through its job so the next scheduled run only redoes the last day
+    while True:
+        result = job_runner.run('occupancy-series', now=end, force=True)
+        if result['error']:
+            raise RuntimeError(result['error'])
+        if not result['more']:
+            break
+    search_index.install()
+    search_index.rebuild()
+    return {
+        'lots': len(lot_rows),
+        'spots': len(spot_rows),
+        'users': len(user_rows) + 1,
+        'reservations': count,
+        'active': len(occupied),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'load_seconds': loaded - started,
+        'total_seconds': time.perf_counter() - started,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file to create.')
+    parser.add_argument('--seed', type=int, default=DEFAULTS['seed'])
+    parser.add_argument('--lots', type=int, default=DEFAULTS['lots'])
+    parser.add_argument('--spots', type=int, default=DEFAULTS['spots'], help='Typical spots per lot.')
+    parser.add_argument('--users', type=int, default=DEFAULTS['users'])
+    parser.add_argument('--years', type=float, default=DEFAULTS['years'])
+    parser.add_argument('--end', type=datetime.fromisoformat, help='Hour the data ends (UTC), default now.')
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.database)}'
+    from app import create_app
+    from models.database import db
+
+    app = create_app()
+    with app.app_context():
+        stats = generate(db, args.seed, args.lots, args.spots, args.users, args.years, args.end,
+                         log=lambda message: print(message, end='\r', flush=True))
+    print(f'{stats["lots"]:,} lots, {stats["spots"]:,} spots, {stats["users"]:,} users, '
+          f'{stats["reservations"]:,} reservations ({stats["active"]:,} active) '
+          f'from {stats["start"]} to {stats["end"]}')
+    print(f'loaded in {stats["load_seconds"]:.1f}s, {stats["reservations"] / stats["load_seconds"]:,.0f} '
+          f'reservations/s; {stats["total_seconds"]:.1f}s with rollups and search index')
+
+
+if __name__ == '__main__':
+    main()
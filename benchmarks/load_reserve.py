@@ -0,0 +1,137 @@
+"""Concurrent reserve/release load test through the Flask test client.
+
+Every worker thread logs in as its own user and loops reserve -> release
+against a small pool of lots, so spots are heavily contended. Afterwards the
+database is checked for double bookings (more than one active reservation per
+spot or per user, or a spot whose status disagrees with its reservations).
+
+    python benchmarks/load_reserve.py [--users 64] [--threads 32] [--cycles 40] [--lots 4] [--spots 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, users, lots, spots):
+    from models.parking import ParkingLot, ParkingSpot
+    from models.user import User
+    db.session.execute(ParkingLot.__table__.insert(), [
+        {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+         'pin_code': '560001', 'max_spots': spots}
+        for i in range(1, lots + 1)
+    ])
+    db.session.execute(ParkingSpot.__table__.insert(), [
+        {'lot_id': lot_id, 'spot_number': n, 'status': 'A'}
+        for lot_id in range(1, lots + 1) for n in range(1, spots + 1)
+    ])
+    # Password hashing is irrelevant here; sessions are injected directly
+    db.session.execute(User.__table__.insert(), [
+        {'name': f'Load User {i}', 'email': f'load{i}@example.com', 'password_hash': '!',
+         'address': 'Load Street', 'pin_code': '560001', 'is_admin': False}
+        for i in range(users)
+    ])
+    db.session.commit()
+    return [u.id for u in User.query.filter_by(is_admin=False).all()]
+
+
+def check_bookings(db):
+    from models.parking import ParkingSpot, Reservation
+    from sqlalchemy import func
+    problems = []
+    for column in (Reservation.spot_id, Reservation.user_id):
+        dupes = db.session.query(column, func.count()).filter(
+            Reservation.is_active == True
+        ).group_by(column).having(func.count() > 1).all()
+        problems += [f'{column.key} {key} has {n} active reservations' for key, n in dupes]
+    active_spots = {r.spot_id for r in Reservation.query.filter_by(is_active=True)}
+    occupied_spots = {s.id for s in ParkingSpot.query.filter_by(status='O')}
+    if active_spots != occupied_spots:
+        problems.append(f'{len(active_spots ^ occupied_spots)} spot(s) disagree with their reservations')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--cycles', type=int, default=40, help='reserve/release cycles per user')
+    parser.add_argument('--lots', type=int, default=4)
+    parser.add_argument('--spots', type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='parking-load-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "load.db")}'
+    from app import create_app
+    from models.database import db
+    from services.occupancy import occupancy_index
+
+    app = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        db.create_all()
+        user_ids = seed(db, args.users, args.lots, args.spots)
+        occupancy_index.warm()
+
+    latencies = []
+    outcomes = {'reserved': 0, 'released': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def worker(index, user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        for cycle in range(args.cycles):
+            lot_id = (index + cycle) % args.lots + 1
+            start = time.perf_counter()
+            response = client.post('/user/reserve', data={'lot_id': lot_id, 'vehicle_number': f'KA01 {user_id:04d}'})
+            reserve_ms = (time.perf_counter() - start) * 1000
+            with client.session_transaction() as session:
+                flashes = [message for _, message in session.pop('_flashes', [])]
+            reserved = any('reserved successfully' in message for message in flashes)
+
+            start = time.perf_counter()
+            if reserved:
+                client.post('/user/release')
+            release_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                if response.status_code >= 500:
+                    outcomes['errors'] += 1
+                latencies.append(reserve_ms)
+                outcomes['reserved' if reserved else 'rejected'] += 1
+                if reserved:
+                    latencies.append(release_ms)
+                    outcomes['released'] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for future in [pool.submit(worker, i, user_id) for i, user_id in enumerate(user_ids)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'{len(latencies):,} requests in {elapsed:.1f}s -> {len(latencies) / elapsed:,.0f} req/s')
+    print(f'p50 {p50:.1f} ms   p99 {p99:.1f} ms   '
+          f'reserved {outcomes["reserved"]}, released {outcomes["released"]}, '
+          f'rejected {outcomes["rejected"]}, errors {outcomes["errors"]}')
+
+    with app.app_context():
+        problems = check_bookings(db)
+        drift = occupancy_index.check_consistency()
+    for problem in problems:
+        print(f'DOUBLE BOOKING: {problem}')
+    print(f'index drift: {len(drift)} lot(s)')
+    if problems:
+        sys.exit(1)
+    print('OK: zero double bookings')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Replay a day of arrivals at one large lot under every spot allocation strategy.
+
+Arrivals follow datagen's hourly profile and stay lengths, starting from an
+empty lot at midnight, and are identical for every strategy. Spots are laid
+out over LEVELS levels with the entrance in the middle of each, which only
+nearest_entrance looks at. For each strategy the lot is driven through the
+same LotOccupancy the occupancy index uses, and the script reports the time
+per claim and release, how far from the entrance cars were put, and how
+evenly the day's occupied time spread over the spots (the coefficient of
+variation; lower means more even wear). Exits non-zero if a strategy hands
+out an occupied spot or turns a car away while spots are free.
+
+    python benchmarks/sim_allocation.py [--spots 20000] [--levels 4] [--turnover 1.5] [--seed 1]
+"""
+import argparse
+import heapq
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagen import HOURLY, TURNOVER, _stay
+
+DAY = 24 * 3600
+
+
+def arrivals(rng, spots, turnover):
+    """(arrival second, stay seconds) of one day, in arrival order"""
+    events = []
+    per_hour = spots * turnover / sum(HOURLY)
+    for hour, weight in enumerate(HOURLY):
+        at = hour * 3600.0
+        while True:
+            at += rng.expovariate(per_hour * weight / 3600)
+            if at >= (hour + 1) * 3600:
+                break
+            events.append((at, _stay(rng, hour).total_seconds()))
+    return events
+
+
+def layout(spots, levels):
+    """{spot_id: Spot} with spot id = number, numbered level by level with each level's entrance in its middle"""
+    from services.allocation import Spot
+    per_level = -(-spots // levels)
+    return {
+        number: Spot(number, (number - 1) // per_level, abs((number - 1) % per_level - per_level // 2))
+        for number in range(1, spots + 1)
+    }
+
+
+def simulate(strategy, spots, events):
+    """Replay the day; returns the numbers to report, or raises AssertionError on a broken invariant"""
+    from services.occupancy import LotOccupancy
+    lot = LotOccupancy(1, strategy)
+    for spot_id, spot in spots.items():
+        lot.add(spot_id, spot, 'A')
+
+    departures = []  # (second, spot_id)
+    parked_at = {}
+    occupied_seconds = dict.fromkeys(spots, 0.0)
+    claims, releases, placements = [], [], []
+    turned_away = 0
+    clock = time.perf_counter_ns
+
+    for at, stay in events:
+        while departures and departures[0][0] <= at:
+            leaving, spot_id = heapq.heappop(departures)
+            occupied_seconds[spot_id] += leaving - parked_at.pop(spot_id)
+            start = clock()
+            lot.release(spot_id)
+            releases.append(clock() - start)
+        free_before = lot.available
+        start = clock()
+        spot_id = lot.claim()
+        claims.append(clock() - start)
+        if spot_id is None:
+            assert free_before == 0, f'{strategy} turned a car away with {free_before} free spots'
+            turned_away += 1
+            continue
+        assert spot_id not in parked_at, f'{strategy} handed out occupied spot {spot_id}'
+        parked_at[spot_id] = at
+        placements.append(spots[spot_id])
+        heapq.heappush(departures, (at + stay, spot_id))
+
+    for spot_id, since in parked_at.items():
+        occupied_seconds[spot_id] += DAY - since
+    shares = sorted(seconds / DAY for seconds in occupied_seconds.values())
+    claims.sort()
+    return {
+        'claim_p50': claims[len(claims) // 2] / 1000,
+        'claim_p99': claims[int(len(claims) * 0.99)] / 1000,
+        'release_p50': statistics.median(releases) / 1000 if releases else 0,
+        'turned_away': turned_away,
+        'mean_level': statistics.mean(spot.level for spot in placements),
+        'mean_distance': statistics.mean(spot.distance for spot in placements),
+        'unused': sum(1 for share in shares if share == 0),
+        'p10': shares[len(shares) // 10],
+        'p90': shares[len(shares) * 9 // 10],
+        'cv': statistics.pstdev(shares) / statistics.mean(shares),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spots', type=int, default=20000)
+    parser.add_argument('--levels', type=int, default=4)
+    parser.add_argument('--turnover', type=float, default=TURNOVER, help='Stays per spot per day.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    from services.allocation import STRATEGIES
+
+    events = arrivals(random.Random(args.seed), args.spots, args.turnover)
+    spots = layout(args.spots, args.levels)
+    print(f'{args.spots:,} spots on {args.levels} level(s), {len(events):,} arrivals')
+    print(f'{"strategy":<20} {"claim p50/p99 µs":>17} {"release µs":>10} {"away":>6} {"level":>6} '
+          f'{"distance":>8} {"unused":>7} {"occupied p10/p90":>17} {"cv":>5}')
+    failed = False
+    for name in STRATEGIES:
+        try:
+            result = simulate(name, spots, events)
+        except AssertionError as error:
+            print(f'{name:<20} FAILED: {error}')
+            failed = True
+            continue
+        print(f'{name:<20} {result["claim_p50"]:8.1f}/{result["claim_p99"]:<8.1f} {result["release_p50"]:10.1f} '
+              f'{result["turned_away"]:6d} {result["mean_level"]:6.2f} {result["mean_distance"]:8.0f} '
+              f'{result["unused"]:7d} {result["p10"]:8.0%}/{result["p90"]:<8.0%} {result["cv"]:5.2f}')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""Latency percentiles and SQL statements per request for every route in OPENAPI.yaml.
+
+Generates a dataset with datagen.py (years of reservations, see there),
+then replays one scripted scenario per documented operation through the
+Flask test client: WARMUP untimed requests, then ITERATIONS timed ones,
+each counting the statements it sends to the database. Writes that need
+state (reserve/release, deleting a lot) set it up untimed before each
+request. Reports p50/p95/p99 and statements per request per scenario, and
+exits non-zero if a request answers with an unexpected status or an
+operation in OPENAPI.yaml has no scenario.
+
+--save writes the results and the dataset parameters to a JSON baseline.
+--compare regenerates the baseline's dataset and also fails if a
+scenario's median statement count went up or, with at least
+MIN_COMPARE_ITERATIONS iterations, its p50 is more than --tolerance
+percent (plus --slack-ms, so sub-millisecond routes don't flap) above the
+baseline's. The gate uses p50 because p95 of a few dozen samples is one
+or two outliers. Timings only compare on the machine that recorded the
+baseline; statement counts compare anywhere.
+
+    python benchmarks/suite.py [--iterations 30] [--only /api/] [--save FILE | --compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen
+
+OPENAPI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'OPENAPI.yaml')
+# Who each scenario runs as; user 2 browses and books, user 3 reserves and releases, user 4 signs in,
+# user 5 checks in on bookings
+ROLES = {'guest': None, 'admin': 1, 'user': 2, 'parker': 3, 'booker': 5}
+LOGIN_USER = 4
+# Below this, --compare checks statement counts only: a few samples make p50 noise
+MIN_COMPARE_ITERATIONS = 10
+
+
+class Scenario:
+    """One request replayed ITERATIONS times.
+
+    ``path`` and ``data`` may use {placeholders} from the fixture; ``prepare``
+    runs untimed before every request and may return more of them.
+    ``operation`` is the OPENAPI.yaml (method, path) it covers when the
+    route the app serves differs from the documented one.
+    """
+
+    def __init__(self, method, path, role, status=200, data=None, prepare=None,
+                 operation=None, stream=False):
+        self.method = method
+        self.path = path
+        self.role = role
+        self.status = status
+        self.data = data
+        self.prepare = prepare
+        self.operation = operation or (method.lower(), re.sub(r'\?.*', '', path))
+        self.stream = stream
+
+    @property
+    def name(self):
+        return f'{self.method} {self.path}'
+
+
+def scenarios():
+    parked = lambda runner, _: runner.ensure_parked(True)
+    unparked = lambda runner, _: runner.ensure_parked(False)
+    unique = lambda runner, n: {'n': f'{runner.token}-{n}'}
+    # Hour-long windows from tomorrow on, a different one per request
+    window = lambda runner, n: runner.window(timedelta(days=1, hours=n))
+    booked = lambda runner, n: {'booking_id': runner.book('user', timedelta(days=5, hours=n))}
+    return [
+        Scenario('GET', '/login', 'guest'),
+        Scenario('POST', '/login', 'guest', 302, {'email': 'user{login_user}@example.com', 'password': '{password}'}),
+        Scenario('GET', '/register', 'guest'),
+        Scenario('POST', '/register', 'guest', 302,
+                 {'name': 'Bench User', 'email': 'bench{n}@example.com', 'password': '{password}',
+                  'confirm_password': '{password}', 'address': '1 Bench Road', 'pin_code': '560001'},
+                 prepare=unique),
+        Scenario('GET', '/logout', 'user', 302),
+        Scenario('GET', '/user/dashboard', 'user'),
+        Scenario('GET', '/user/reserve', 'parker', prepare=unparked),
+        Scenario('POST', '/user/reserve', 'parker', 302, {'lot_id': '{lot_id}', 'vehicle_number': 'KA01 AB 1234'},
+                 prepare=unparked),
+        Scenario('GET', '/user/release', 'parker', prepare=parked),
+        Scenario('POST', '/user/release', 'parker', 302, {}, prepare=parked),
+        Scenario('GET', '/user/history', 'user'),
+        Scenario('GET', '/user/summary', 'user'),
+        Scenario('GET', '/user/search?query={lot_area}', 'user'),
+        Scenario('POST', '/user/search?query={lot_area}', 'user'),
+        Scenario('GET', '/admin/dashboard', 'admin'),
+        Scenario('GET', '/admin/parking-lots', 'admin'),
+        # Documented as POST /admin/parking-lots; the form posts to /admin/parking-lot/new
+        Scenario('POST', '/admin/parking-lot/new', 'admin', 302,
+                 {'name': 'Bench Lot {n}', 'price': '20', 'address': '1 Bench Road', 'pin_code': '560001',
+                  'max_spots': '10'},
+                 prepare=unique, operation=('post', '/admin/parking-lots')),
+        Scenario('GET', '/admin/parking-lot/{lot_id}/edit', 'admin'),
+        Scenario('POST', '/admin/parking-lot/{lot_id}/edit', 'admin', 302,
+                 {'name': '{lot_name}', 'price': '{lot_price}', 'address': '{lot_address}',
+                  'pin_code': '{lot_pin_code}', 'max_spots': '{lot_max_spots}'}),
+        Scenario('POST', '/admin/parking-lot/{spare_lot_id}/delete', 'admin', 302, {},
+                 prepare=lambda runner, _: {'spare_lot_id': runner.spare_lot()}),
+        Scenario('GET', '/admin/parking-spots/{lot_id}', 'admin'),
+        Scenario('GET', '/admin/users', 'admin'),
+        Scenario('GET', '/admin/summary', 'admin'),
+        Scenario('GET', '/admin/search?query={user_surname}', 'admin'),
+        Scenario('POST', '/admin/search?query={user_surname}', 'admin'),
+        Scenario('GET', '/api/parking-stats', 'admin'),
+        Scenario('GET', '/api/revenue-stats', 'admin'),
+        Scenario('GET', '/api/user-stats/{user_id}', 'user'),
+        Scenario('GET', '/api/available-spots/{lot_id}', 'user'),
+        Scenario('GET', '/api/occupancy-check', 'admin'),
+        Scenario('GET', '/api/cache-stats', 'admin'),
+        Scenario('GET', '/api/analytics/utilization?since={last_year}', 'admin'),
+        Scenario('GET', '/api/lots/{lot_id}/occupancy?since={last_year}', 'admin'),
+        # Endless; timed to the snapshot frame
+        Scenario('GET', '/api/occupancy/stream', 'admin', stream=True),
+        Scenario('GET', '/api/reservations', 'user'),
+        Scenario('GET', '/api/reservations/export?since={last_week}', 'admin'),
+        Scenario('GET', '/api/lots/{lot_id}/availability?start={start}&end={end}', 'guest', prepare=window),
+        Scenario('GET', '/api/bookings', 'user'),
+        Scenario('POST', '/api/bookings', 'user', 201,
+                 {'lot_id': '{lot_id}', 'vehicle_number': 'KA01 AB 1234', 'start': '{start}', 'end': '{end}'},
+                 prepare=window),
+        Scenario('POST', '/api/bookings/{booking_id}/cancel', 'user', data={}, prepare=booked),
+        Scenario('POST', '/api/bookings/{booking_id}/check-in', 'booker', data={},
+                 prepare=lambda runner, _: {'booking_id': runner.check_in_ready()}),
+    ]
+
+
+def documented_operations():
+    """(method, path) of every operation in OPENAPI.yaml"""
+    operations = []
+    path = None
+    with open(OPENAPI) as f:
+        for line in f:
+            match = re.match(r'^  (/\S*):\s*$', line)
+            if match:
+                path = match.group(1)
+                continue
+            match = re.match(r'^    (get|post|put|patch|delete):\s*$', line)
+            if match and path:
+                operations.append((match.group(1), path))
+    return operations
+
+
+def _covers(scenario, operation):
+    method, path = operation
+    pattern = re.sub(r'\\{\w+\\}', r'\\{\\w+\\}', re.escape(path))
+    return scenario.operation[0] == method and re.fullmatch(pattern, scenario.operation[1])
+
+
+class Runner:
+    """Drives scenarios through one test client and counts SQL statements"""
+
+    def __init__(self, app, engine, fixture):
+        self.app = app
+        self.client = app.test_client()
+        self.fixture = fixture
+        self.token = uuid.uuid4().hex[:8]
+        self.statements = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args, **kwargs):
+        self.statements += 1
+
+    def sign_in(self, role):
+        with self.client.session_transaction() as session:
+            session.clear()
+            if ROLES[role] is not None:
+                session['_user_id'] = str(ROLES[role])
+                session['_fresh'] = True
+
+    def ensure_parked(self, parked, role='parker'):
+        """Reserve or release untimed so the user starts the request as needed"""
+        self.sign_in(role)
+        if (self.client.get('/user/release').status_code == 200) != parked:
+            if parked:
+                self.client.post('/user/reserve', data={'lot_id': self.fixture['lot_id'],
+                                                        'vehicle_number': 'KA01 AB 1234'})
+            else:
+                self.client.post('/user/release')
+
+    @staticmethod
+    def window(offset, hours=1):
+        start = datetime.utcnow().replace(second=0, microsecond=0) + offset
+        return {'start': start.isoformat(), 'end': (start + timedelta(hours=hours)).isoformat()}
+
+    def book(self, role, offset):
+        """Id of a booking made untimed for the role, in the hour-long window ``offset`` from now"""
+        self.sign_in(role)
+        response = self.client.post('/api/bookings', json={
+            'lot_id': self.fixture['lot_id'], 'vehicle_number': 'KA01 AB 1234', **self.window(offset)})
+        return response.json['id']
+
+    def check_in_ready(self):
+        """Id of a booking the booker can check in on now, with the booker not parked"""
+        self.ensure_parked(False, 'booker')
+        return self.book('booker', timedelta(minutes=5))
+
+    def spare_lot(self):
+        """Id of a lot the benchmark created (or creates now), to be deleted"""
+        from models.database import db
+        from models.parking import ParkingLot
+        with self.app.app_context():
+            lot_id = db.session.query(db.func.max(ParkingLot.id)).scalar()
+        if lot_id > self.fixture['generated_lots']:
+            return lot_id
+        self.sign_in('admin')
+        self.client.post('/admin/parking-lot/new', data={
+            'name': f'Bench Lot {self.token}', 'price': '20', 'address': '1 Bench Road', 'pin_code': '560001',
+            'max_spots': '10'})
+        return self.spare_lot()
+
+    def run(self, scenario, n):
+        """(seconds, statements, status) of one request"""
+        values = dict(self.fixture)
+        if scenario.prepare:
+            values.update(scenario.prepare(self, n) or {})
+        self.sign_in(scenario.role)
+        url = scenario.path.format(**values)
+        data = None
+        if scenario.data is not None:
+            data = {key: value.format(**values) for key, value in scenario.data.items()}
+
+        self.statements = 0
+        start = time.perf_counter()
+        response = self.client.open(url, method=scenario.method, data=data, buffered=not scenario.stream)
+        if scenario.stream:
+            next(iter(response.response))
+            response.close()
+        elapsed = time.perf_counter() - start
+        return elapsed, self.statements, response.status_code
+
+
+def fixture(app, stats):
+    """Ids and values the scenarios fill their paths and forms with"""
+    from models.database import db
+    from models.parking import ParkingLot
+    from models.user import User
+    with app.app_context():
+        # The biggest lot, so the parker always finds a free spot
+        lot = ParkingLot.query.order_by(ParkingLot.max_spots.desc(), ParkingLot.id).first()
+        user = db.session.get(User, ROLES['user'])
+        values = {
+            'lot_id': lot.id,
+            'lot_name': lot.name,
+            'lot_price': str(lot.price),
+            'lot_address': lot.address,
+            'lot_pin_code': lot.pin_code,
+            'lot_max_spots': str(lot.max_spots),
+            'lot_area': lot.name.split()[0],
+            'user_id': user.id,
+            'user_surname': user.name.split()[-1],
+        }
+    end = datetime.fromisoformat(stats['end'])
+    values.update(login_user=LOGIN_USER, password=datagen.PASSWORD, generated_lots=stats['lots'],
+                  last_week=(end - timedelta(days=7)).strftime('%Y-%m-%d'),
+                  last_year=(end - timedelta(days=364)).strftime('%Y-%m-%d'))
+    return values
+
+
+def percentile(samples, p):
+    return statistics.quantiles(samples, n=100, method='inclusive')[p - 1] if len(samples) > 1 else samples[0]
+
+
+def measure(runner, scenario, warmup, iterations):
+    timings, statements, failures = [], [], []
+    for n in range(warmup + iterations):
+        elapsed, count, status = runner.run(scenario, n)
+        if status != scenario.status:
+            failures.append(status)
+        if n >= warmup:
+            timings.append(elapsed * 1000)
+            statements.append(count)
+    return {
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'statements': statistics.median_low(statements),
+        'max_statements': max(statements),
+        'unexpected_status': sorted(set(failures)),
+    }
+
+
+def regressions(results, baseline, tolerance, slack_ms, timings=True):
+    """{scenario: [reasons]} for results worse than the baseline"""
+    found = {}
+    for name, result in results.items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        reasons = []
+        limit = base['p50_ms'] * (1 + tolerance / 100) + slack_ms
+        if timings and result['p50_ms'] > limit:
+            reasons.append(f'p50 {base["p50_ms"]:.2f}ms -> {result["p50_ms"]:.2f}ms (limit {limit:.2f}ms)')
+        if result['statements'] > base['statements']:
+            reasons.append(f'statements {base["statements"]} -> {result["statements"]}')
+        if reasons:
+            found[name] = reasons
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', help='Run only the scenarios whose path contains this.')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as a baseline.')
+    parser.add_argument('--compare', metavar='FILE', help='Fail on regressions against this baseline.')
+    parser.add_argument('--tolerance', type=float, default=25.0, help='Allowed p50 slowdown, percent.')
+    parser.add_argument('--slack-ms', type=float, default=2.0, help='Allowed p50 slowdown on top, ms.')
+    for name, default in datagen.DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=type(default), help=f'Dataset {name} (default {default}).')
+    args = parser.parse_args()
+
+    baseline = None
+    dataset = dict(datagen.DEFAULTS)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        dataset.update(baseline['dataset'])
+    dataset.update({name: getattr(args, name) for name in datagen.DEFAULTS if getattr(args, name) is not None})
+    if baseline and dataset != baseline['dataset']:
+        parser.error(f'dataset {dataset} differs from the baseline\'s {baseline["dataset"]}')
+
+    workdir = tempfile.mkdtemp(prefix='parking-suite-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "suite.db")}'
+    from app import create_app
+    from models.database import db
+
+    app = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+    with app.app_context():
+        stats = datagen.generate(db, **dataset)
+        engine = db.engine
+    print(f'dataset: {stats["lots"]:,} lots, {stats["spots"]:,} spots, {stats["users"]:,} users, '
+          f'{stats["reservations"]:,} reservations, generated in {stats["total_seconds"]:.1f}s')
+
+    problems = []
+    all_scenarios = scenarios()
+    for operation in documented_operations():
+        if not any(_covers(scenario, operation) for scenario in all_scenarios):
+            problems.append(f'no scenario for {operation[0].upper()} {operation[1]}')
+    selected = [scenario for scenario in all_scenarios if not args.only or args.only in scenario.path]
+
+    # Requests run outside any app context so each gets its own (and its own logged-in user)
+    runner = Runner(app, engine, fixture(app, stats))
+    results = {}
+    print(f'{"scenario":<48} {"p50":>9} {"p95":>9} {"p99":>9} {"SQL":>5}')
+    for scenario in selected:
+        result = results[scenario.name] = measure(runner, scenario, args.warmup, args.iterations)
+        print(f'{scenario.name:<48} {result["p50_ms"]:7.2f}ms {result["p95_ms"]:7.2f}ms '
+              f'{result["p99_ms"]:7.2f}ms {result["statements"]:>5}')
+        if result['unexpected_status']:
+            problems.append(f'{scenario.name} answered {result["unexpected_status"]}, expected {scenario.status}')
+
+    if baseline:
+        timings = args.iterations >= MIN_COMPARE_ITERATIONS
+        if not timings:
+            print(f'timings not compared: fewer than {MIN_COMPARE_ITERATIONS} iterations')
+        for name, reasons in regressions(results, baseline, args.tolerance, args.slack_ms, timings).items():
+            problems.append(f'{name} regressed: {"; ".join(reasons)}')
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'dataset': dataset,
+                'iterations': args.iterations,
+                'recorded_at': datetime.utcnow().replace(microsecond=0).isoformat(),
+                'python': platform.python_version(),
+                'scenarios': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'baseline written to {args.save}')
+
+    for problem in problems:
+        print(f'FAILED: {problem}')
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+import csv
+import json
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from models.database import db
+from models.parking import ParkingLot
+from models.tariff import LotTariff
+from services import billing, rollups
+from services.allocation import STRATEGIES, set_placements, set_strategy
+from services.jobs import job_runner
+from services.provisioning import import_lots, LotImportError
+from services.query_audit import audit_query_plans
+from services.search import search_index
+
+rollups_cli = AppGroup('rollups', help='Maintain the revenue rollup tables.')
+
+
+@rollups_cli.command('backfill')
+def backfill_rollups():
+    """Rebuild the revenue rollups from the reservations table"""
+    counts = rollups.backfill()
+    for table, rows in counts.items():
+        click.echo(f'{table}: {rows} row(s)')
+
+
+@rollups_cli.command('verify')
+@click.option('--limit', default=20, show_default=True, help='Maximum mismatches to print.')
+def verify_rollups(limit):
+    """Diff the revenue rollups against a full recompute"""
+    mismatches = rollups.verify()
+    if not mismatches:
+        click.echo('Revenue rollups match the reservations table.')
+        return
+    for mismatch in mismatches[:limit]:
+        click.echo(f"{mismatch['table']} {mismatch['key']}: expected {mismatch['expected']}, got {mismatch['actual']}")
+    raise click.ClickException(f'{len(mismatches)} rollup row(s) differ; run "flask rollups backfill".')
+
+
+lots_cli = AppGroup('lots', help='Bulk parking lot administration.')
+
+
+@lots_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_lots_command(path):
+    """Create lots (and their spots) from a CSV or JSON file in one transaction.
+
+    Each row or object needs name, price, address, pin_code and max_spots.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.lower().endswith('.json'):
+            rows = json.load(handle)
+        else:
+            rows = list(csv.DictReader(handle))
+    try:
+        lots = import_lots(rows)
+    except LotImportError as error:
+        raise click.ClickException(str(error))
+    spots = sum(lot.max_spots for lot in lots)
+    click.echo(f'Imported {len(lots)} lot(s) with {spots} spot(s).')
+    click.echo('Running workers pick the new lots up on restart or via /api/occupancy-check?fix=1.')
+
+
+@lots_cli.command('set-allocation')
+@click.argument('lot_id', type=int)
+@click.argument('strategy', type=click.Choice(list(STRATEGIES)))
+def set_allocation(lot_id, strategy):
+    """Choose which free spot a lot hands out next"""
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None:
+        raise click.ClickException(f'No parking lot with id {lot_id}.')
+    set_strategy(lot_id, strategy)
+    db.session.commit()
+    click.echo(f'{lot.name} allocates by {strategy}. Running workers switch on restart.')
+
+
+@lots_cli.command('layout')
+@click.argument('lot_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_layout(lot_id, path):
+    """Replace a lot's spot layout from a CSV with spot_number, level and distance columns.
+
+    Used by the nearest_entrance strategy; distance may be left empty.
+    """
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None:
+        raise click.ClickException(f'No parking lot with id {lot_id}.')
+    placements = []
+    with open(path, newline='', encoding='utf-8') as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=1):
+            try:
+                distance = (row.get('distance') or '').strip()
+                placements.append((int(row['spot_number']), int(row.get('level') or 0),
+                                   int(distance) if distance else None))
+            except (KeyError, TypeError, ValueError):
+                raise click.ClickException(f'Line {line}: spot_number, level and distance must be whole numbers')
+    if len({number for number, _, _ in placements}) < len(placements):
+        raise click.ClickException('A spot number appears more than once.')
+    set_placements(lot_id, placements)
+    db.session.commit()
+    click.echo(f'Placed {len(placements)} spot(s) of {lot.name}. Running workers use the layout on restart.')
+
+
+search_cli = AppGroup('search', help='Maintain the lot and user search index.')
+
+
+@search_cli.command('rebuild')
+def rebuild_search():
+    """Re-index every lot and user, e.g. after writing to the tables by hand"""
+    search_index.rebuild()
+    click.echo(f'Search index rebuilt ({search_index.backend}).')
+
+
+billing_cli = AppGroup('billing', help='Tariffs and re-billing of past reservations.')
+
+
+def _parse_peak(value):
+    try:
+        start, end = value.split('-')
+        return datetime.strptime(start.strip(), '%H:%M').time(), datetime.strptime(end.strip(), '%H:%M').time()
+    except ValueError:
+        raise click.BadParameter('use HH:MM-HH:MM, e.g. 08:00-20:00', param_hint='--peak')
+
+
+@billing_cli.command('set-tariff')
+@click.argument('lot_id', type=int)
+@click.option('--increment', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Bill whole blocks of this many minutes, rounding up (0 = exact).')
+@click.option('--minimum', type=click.FloatRange(min=0), default=0, show_default=True, help='Minimum charge per stay.')
+@click.option('--daily-cap', type=click.FloatRange(min=0), help='Most a stay can cost per started 24 hours.')
+@click.option('--peak', help='Local peak hours as HH:MM-HH:MM.')
+@click.option('--peak-price', type=click.FloatRange(min=0), help='Hourly price during peak hours.')
+@click.option('--clear', is_flag=True, help='Remove the tariff; the lot bills hours * price again.')
+def set_tariff(lot_id, increment, minimum, daily_cap, peak, peak_price, clear):
+    """Set the pricing rules of a lot (applies to stays released from now on)"""
+    lot = db.session.get(ParkingLot, lot_id)
+    if lot is None:
+        raise click.ClickException(f'No parking lot with id {lot_id}.')
+    plan = db.session.get(LotTariff, lot_id)
+    if clear:
+        if plan is not None:
+            db.session.delete(plan)
+        db.session.commit()
+        click.echo(f'{lot.name} bills ₹{lot.price}/hr exactly.')
+        return
+    if bool(peak) != (peak_price is not None):
+        raise click.ClickException('--peak and --peak-price go together.')
+    peak_start, peak_end = _parse_peak(peak) if peak else (None, None)
+    if plan is None:
+        plan = LotTariff(lot_id=lot_id)
+        db.session.add(plan)
+    plan.increment_minutes = increment
+    plan.minimum_charge = minimum
+    plan.daily_cap = daily_cap
+    plan.peak_start, plan.peak_end, plan.peak_price = peak_start, peak_end, peak_price
+    db.session.commit()
+    click.echo(f'Tariff for {lot.name} saved. Run "flask billing rebill --lot {lot_id}" to re-price past stays.')
+
+
+@billing_cli.command('rebill')
+@click.option('--lot', 'lot_id', type=int, help='Only reservations in this lot.')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only stays that ended on or after this date (UTC).')
+@click.option('--dry-run', is_flag=True, help='Report how many costs would change without writing them.')
+def rebill_command(lot_id, since, dry_run):
+    """Recompute parking_cost of completed reservations under the current tariffs"""
+    priced, changed = billing.rebill(lot_id=lot_id, since=since, dry_run=dry_run)
+    verb = 'would change' if dry_run else 'changed'
+    click.echo(f'Priced {priced} reservation(s); {changed} cost(s) {verb}.')
+    if changed and not dry_run:
+        click.echo('Revenue rollups rebuilt.')
+
+
+jobs_cli = AppGroup('jobs', help='Background jobs such as the overstay sweep.')
+
+
+def _job_name(name):
+    if name not in job_runner.jobs:
+        raise click.BadParameter(f'choose from {", ".join(job_runner.jobs)}', param_hint='NAME')
+    return name
+
+
+@jobs_cli.command('list')
+def list_jobs():
+    """Show every job's schedule and latest run"""
+    for name, state in job_runner.states().items():
+        if state is None:
+            click.echo(f'{name}: never run')
+            continue
+        click.echo(f'{name}: {state.runs} run(s), next at {state.next_run_at:%Y-%m-%d %H:%M:%S} UTC')
+        if state.last_started_at:
+            click.echo(f'    last at {state.last_started_at:%Y-%m-%d %H:%M:%S} UTC, '
+                       f'{state.last_duration_ms:.0f} ms, {state.last_processed} item(s)')
+        if state.lease_owner:
+            click.echo(f'    running in {state.lease_owner} (lease until {state.lease_until:%H:%M:%S})')
+        if state.last_error:
+            click.echo(f'    failed: {state.last_error}')
+
+
+@jobs_cli.command('run')
+@click.argument('name')
+def run_job(name):
+    """Run a job now, whether or not it is due"""
+    result = job_runner.run(_job_name(name), force=True)
+    if result is None:
+        raise click.ClickException(f'{name} is running in another worker.')
+    if result['error']:
+        raise click.ClickException(f"{name} failed after {result['processed']} item(s): {result['error']}")
+    more = ' (stopped at JOBS_RUN_SECONDS; the rest runs next time)' if result['more'] else ''
+    click.echo(f"{name}: {result['processed']} item(s) in {result['duration_ms']:.0f} ms{more}.")
+
+
+@jobs_cli.command('reset')
+@click.argument('name')
+def reset_job(name):
+    """Forget where a job got to, so its next run starts from the beginning"""
+    job_runner.reset(_job_name(name))
+    db.session.commit()
+    click.echo(f'{name} starts over on its next run.')
+
+
+@jobs_cli.command('worker')
+def jobs_worker():
+    """Run the job scheduler in the foreground, instead of (or alongside) JOBS_ENABLED workers"""
+    click.echo(f"Polling every {current_app.config['JOBS_POLL_SECONDS']}s for {', '.join(job_runner.jobs)}; Ctrl+C stops.")
+    try:
+        job_runner.run_forever(current_app._get_current_object())
+    except KeyboardInterrupt:
+        pass
+
+
+@click.command('explain-queries')
+@click.option('--verbose', '-v', is_flag=True, help='Print the full plan of every query.')
+def explain_queries(verbose):
+    """Run EXPLAIN on the controllers' queries and flag full table scans and sorts"""
+    results = audit_query_plans()
+    for result in results:
+        if result['flagged']:
+            label = 'SORT' if result['sorts'] and not result['full_scans'] else 'SCAN'
+        elif result['full_scans'] or result['sorts']:
+            label = 'scan' if result['full_scans'] else 'sort'
+        else:
+            label = 'ok'
+        click.echo(f"{label:<5} {result['name']}")
+        if verbose or result['flagged']:
+            for line in result['plan']:
+                click.echo(f'        {line}')
+    flagged = [result for result in results if result['flagged']]
+    if flagged:
+        raise click.ClickException(f'{len(flagged)} query(ies) do an unexpected full table scan or sort.')
+    click.echo(f'{len(results)} queries checked, no unexpected full table scans or sorts.')
+
+
+@click.command('init-db')
+def init_db():
+    """Create the tables, the admin user and the search index (once per deployment)"""
+    from app import initialize_app
+    initialize_app(current_app._get_current_object())
+    click.echo('Database initialized.')
+
+
+class MigrateGroup(click.Group):
+    """``flask db``, importing Flask-Migrate and Alembic only when it is used"""
+
+    def _commands(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli
+        app = current_app._get_current_object()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db)
+        return db_cli
+
+    def list_commands(self, ctx):
+        return self._commands().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._commands().get_command(ctx, name)
+
+
+def register_commands(app):
+    app.cli.add_command(MigrateGroup('db', help='Perform database migrations.'))
+    app.cli.add_command(init_db)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(lots_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(billing_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(explain_queries)
@@ -1,14 +1,37 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, current_app
 from flask_login import login_required, current_user
 from models.database import db
 from models.user import User
 from models.parking import ParkingLot, ParkingSpot, Reservation
-from forms.parking_forms import ParkingLotForm
-from sqlalchemy import func
+from services.occupancy import occupancy_index, occupancy_summary, indexed_occupancy
+from services.reservations import user_reservation_stats, recent_reservations_by_user
+from services.rollups import daily_revenue
+from services.provisioning import add_spots, resize_lot, delete_lot, LotInUseError
+from services.search import search_index
+from services.bookings import booking_index
+from services.pagination import InvalidCursor, estimated_rows, keyset_page
+from services.jobs import job_runner
+from services.metrics import request_metrics
 from datetime import datetime, timedelta
+import hmac
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Reservations shown per user in the users page detail modal
+RECENT_RESERVATIONS_PER_USER = 5
+# Rows per page of the keyset-paginated listings
+LOTS_PER_PAGE = 20
+SPOTS_PER_PAGE = 120
+USERS_PER_PAGE = 50
+
+def _keyset_page(query, columns, per_page, estimate=None):
+    """keyset_page() driven by this request's ?after= / ?before= cursors"""
+    try:
+        return keyset_page(query, columns, per_page, after_cursor=request.args.get('after'),
+                           before_cursor=request.args.get('before'), estimate=estimate)
+    except InvalidCursor:
+        abort(400)
+
 # Admin authentication decorator
 def admin_required(f):
     def decorated_function(*args, **kwargs):
@@ -25,16 +48,20 @@ def dashboard():
     # Get parking lots data
     parking_lots = ParkingLot.query.all()
     
+    # Get per-lot and overall spot counts in one query
+    occupancy = occupancy_summary()
+    
     # Get overall stats
-    total_lots = ParkingLot.query.count()
-    total_spots = ParkingSpot.query.count()
-    available_spots = ParkingSpot.query.filter_by(status='A').count()
-    occupied_spots = ParkingSpot.query.filter_by(status='O').count()
+    total_lots = len(parking_lots)
+    total_spots = occupancy.overall['total']
+    available_spots = occupancy.overall['available']
+    occupied_spots = occupancy.overall['occupied']
     total_users = User.query.filter_by(is_admin=False).count()
     active_reservations = Reservation.query.filter_by(is_active=True).count()
     
     return render_template('admin/dashboard.html', 
                            parking_lots=parking_lots,
+                           occupancy=occupancy,
                            total_lots=total_lots,
                            total_spots=total_spots,
                            available_spots=available_spots,
@@ -45,12 +72,15 @@ def dashboard():
 @admin_bp.route('/parking-lots')
 @admin_required
 def parking_lots():
-    lots = ParkingLot.query.all()
-    return render_template('admin/parking_lots.html', lots=lots)
+    lots = _keyset_page(ParkingLot.query, (ParkingLot.id,), LOTS_PER_PAGE, estimate=lambda: estimated_rows(ParkingLot))
+    # Spot counts for this page's lots only, from the occupancy index
+    occupancy = indexed_occupancy(lot.id for lot in lots.items)
+    return render_template('admin/parking_lots.html', lots=lots.items, pagination=lots, occupancy=occupancy)
 
 @admin_bp.route('/parking-lot/new', methods=['GET', 'POST'])
 @admin_required
 def new_parking_lot():
+    from forms.parking_forms import ParkingLotForm
     form = ParkingLotForm()
     if form.validate_on_submit():
         lot = ParkingLot(
@@ -63,12 +93,11 @@ def new_parking_lot():
         db.session.add(lot)
         db.session.flush()  # To get the lot id
         
-        # Create parking spots
-        for i in range(1, form.max_spots.data + 1):
-            spot = ParkingSpot(lot_id=lot.id, spot_number=i)
-            db.session.add(spot)
+        # Create parking spots in bulk
+        add_spots(lot.id, form.max_spots.data)
         
         db.session.commit()
+        occupancy_index.refresh_lot(lot.id)
         flash('Parking lot created successfully!', 'success')
         return redirect(url_for('admin.parking_lots'))
     
@@ -78,6 +107,7 @@ def new_parking_lot():
 @admin_required
 def edit_parking_lot(lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
+    from forms.parking_forms import ParkingLotForm
     form = ParkingLotForm(obj=lot)
     
     if form.validate_on_submit():
@@ -87,30 +117,15 @@ def edit_parking_lot(lot_id):
         lot.address = form.address.data
         lot.pin_code = form.pin_code.data
         
-        # Handle spot count changes
-        current_spots = ParkingSpot.query.filter_by(lot_id=lot_id).count()
-        new_spots = form.max_spots.data
-        
-        if new_spots > current_spots:
-            # Add new spots
-            for i in range(current_spots + 1, new_spots + 1):
-                spot = ParkingSpot(lot_id=lot_id, spot_number=i)
-                db.session.add(spot)
-        elif new_spots < current_spots:
-            # Remove excess spots if they're not occupied
-            spots_to_remove = ParkingSpot.query.filter_by(
-                lot_id=lot_id, status='A'
-            ).order_by(ParkingSpot.spot_number.desc()).limit(current_spots - new_spots).all()
-            
-            if len(spots_to_remove) < (current_spots - new_spots):
-                flash('Cannot reduce spots as some are currently occupied.', 'danger')
-                return render_template('admin/parking_lot_form.html', form=form, title='Edit Parking Lot')
-            
-            for spot in spots_to_remove:
-                db.session.delete(spot)
+        # Handle spot count changes with set-based inserts/deletes
+        if not resize_lot(lot, form.max_spots.data):
+            db.session.rollback()
+            flash('Cannot reduce spots as some are currently occupied or have reservation history.', 'danger')
+            return render_template('admin/parking_lot_form.html', form=form, title='Edit Parking Lot')
         
-        lot.max_spots = new_spots
         db.session.commit()
+        occupancy_index.refresh_lot(lot_id)
+        booking_index.drop_lot(lot_id)
         flash('Parking lot updated successfully!', 'success')
         return redirect(url_for('admin.parking_lots'))
     
@@ -127,8 +142,15 @@ def delete_parking_lot(lot_id):
         flash('Cannot delete parking lot as it has occupied spots.', 'danger')
         return redirect(url_for('admin.parking_lots'))
     
-    db.session.delete(lot)  # This will also delete associated spots due to cascade
+    # Spots are removed with a single DELETE
+    try:
+        delete_lot(lot)
+    except LotInUseError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('admin.parking_lots'))
     db.session.commit()
+    occupancy_index.drop_lot(lot_id)
+    booking_index.drop_lot(lot_id)
     flash('Parking lot deleted successfully!', 'success')
     return redirect(url_for('admin.parking_lots'))
 
@@ -136,23 +158,70 @@ def delete_parking_lot(lot_id):
 @admin_required
 def parking_spots(lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
-    spots = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.spot_number).all()
+    spots = _keyset_page(ParkingSpot.query.filter_by(lot_id=lot_id), (ParkingSpot.spot_number, ParkingSpot.id),
+                         SPOTS_PER_PAGE, estimate=lambda: lot.max_spots)
     
-    # Get active reservations for occupied spots
+    # Active reservations for the page's occupied spots in one query
+    occupied_ids = [spot.id for spot in spots.items if spot.status == 'O']
     active_reservations = {}
-    for spot in spots:
-        if spot.status == 'O':
-            reservation = Reservation.query.filter_by(spot_id=spot.id, is_active=True).first()
-            if reservation:
-                active_reservations[spot.id] = reservation
+    if occupied_ids:
+        active_reservations = {
+            reservation.spot_id: reservation
+            for reservation in Reservation.query.filter(
+                Reservation.spot_id.in_(occupied_ids), Reservation.is_active == True
+            )
+        }
     
-    return render_template('admin/parking_spots.html', lot=lot, spots=spots, reservations=active_reservations)
+    return render_template('admin/parking_spots.html', lot=lot, spots=spots.items, pagination=spots,
+                           counts=indexed_occupancy([lot_id]).for_lot(lot_id), reservations=active_reservations)
 
 @admin_bp.route('/users')
 @admin_required
 def users():
-    users = User.query.filter_by(is_admin=False).all()
-    return render_template('admin/users.html', users=users)
+    page = _keyset_page(User.query.filter_by(is_admin=False), (User.id,), USERS_PER_PAGE,
+                        estimate=lambda: estimated_rows(User))
+    users = page.items
+    user_ids = [user.id for user in users]
+    
+    # Per-user aggregates and latest reservations, computed in SQL
+    user_stats = user_reservation_stats(user_ids)
+    recent_reservations = recent_reservations_by_user(user_ids, limit=RECENT_RESERVATIONS_PER_USER)
+    
+    return render_template('admin/users.html',
+                           users=users,
+                           pagination=page,
+                           user_stats=user_stats,
+                           recent_reservations=recent_reservations)
+
+@admin_bp.route('/metrics')
+@admin_required
+def metrics():
+    """Per-endpoint timings, SQL counts and the latest slow-request profiles of this worker"""
+    return render_template('admin/metrics.html',
+                           enabled=request_metrics.enabled,
+                           since=datetime.utcfromtimestamp(request_metrics.started_at),
+                           endpoints=request_metrics.endpoints(),
+                           outliers=request_metrics.outliers(),
+                           slow_ms=current_app.config['METRICS_SLOW_MS'])
+
+@admin_bp.route('/metrics/reset', methods=['POST'])
+@admin_required
+def reset_metrics():
+    request_metrics.reset()
+    flash('Metrics reset.', 'success')
+    return redirect(url_for('admin.metrics'))
+
+@admin_bp.route('/metrics/prometheus')
+def prometheus_metrics():
+    """Prometheus text format; scrapers send Authorization: Bearer METRICS_TOKEN, admins may browse it"""
+    token = current_app.config.get('METRICS_TOKEN')
+    scraper = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not scraper and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    if not request_metrics.enabled:
+        abort(404)
+    return current_app.response_class(request_metrics.prometheus() + job_runner.prometheus(),
+                                      mimetype='text/plain; version=0.0.4')
 
 @admin_bp.route('/summary')
 @admin_required
@@ -161,26 +230,19 @@ def summary():
     parking_lots = ParkingLot.query.all()
     
     # Overall stats
-    total_spots = ParkingSpot.query.count()
-    available_spots = ParkingSpot.query.filter_by(status='A').count()
-    occupied_spots = ParkingSpot.query.filter_by(status='O').count()
+    occupancy = occupancy_summary()
+    total_spots = occupancy.overall['total']
+    available_spots = occupancy.overall['available']
+    occupied_spots = occupancy.overall['occupied']
     
     # Revenue stats for last 30 days
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     
-    daily_revenue = db.session.query(
-        func.date(Reservation.leaving_time).label('date'),
-        func.sum(Reservation.parking_cost).label('revenue')
-    ).filter(
-        Reservation.leaving_time >= thirty_days_ago,
-        Reservation.leaving_time.isnot(None)
-    ).group_by(
-        func.date(Reservation.leaving_time)
-    ).all()
+    revenue_by_day = daily_revenue(thirty_days_ago.date())
     
     # Convert to format for charts
-    dates = [str(r.date) for r in daily_revenue]
-    revenues = [float(r.revenue) for r in daily_revenue]
+    dates = [str(day) for day, _ in revenue_by_day]
+    revenues = [float(revenue) for _, revenue in revenue_by_day]
     
     # Lot-wise occupancy
     lot_names = [lot.name for lot in parking_lots]
@@ -188,10 +250,9 @@ def summary():
     lot_availability = []
     
     for lot in parking_lots:
-        occupied = ParkingSpot.query.filter_by(lot_id=lot.id, status='O').count()
-        available = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-        lot_occupancy.append(occupied)
-        lot_availability.append(available)
+        counts = occupancy.for_lot(lot.id)
+        lot_occupancy.append(counts['occupied'])
+        lot_availability.append(counts['available'])
     
     return render_template('admin/summary.html',
                            total_spots=total_spots,
@@ -209,24 +270,18 @@ def search():
     query = request.args.get('query', '')
     
     if query:
-        # Search for parking lots
-        lots = ParkingLot.query.filter(
-            (ParkingLot.name.contains(query)) |
-            (ParkingLot.address.contains(query)) |
-            (ParkingLot.pin_code.contains(query))
-        ).all()
-        
-        # Search for users
-        users = User.query.filter(
-            (User.name.contains(query)) |
-            (User.email.contains(query)) |
-            (User.address.contains(query)) |
-            (User.pin_code.contains(query))
-        ).filter_by(is_admin=False).all()
+        # Ranked full-text search over lots and users, paginated separately
+        lot_results = search_index.search_lots(query, page=request.args.get('lot_page', 1, type=int))
+        user_results = search_index.search_users(query, page=request.args.get('user_page', 1, type=int))
+        lots = [lot for lot, _ in lot_results.items]
+        users = user_results.items
         
         return render_template('admin/search_results.html', 
                                query=query, 
                                lots=lots, 
-                               users=users)
+                               users=users,
+                               lot_pagination=lot_results,
+                               user_pagination=user_results,
+                               user_stats=user_reservation_stats(user.id for user in users))
     
     return render_template('admin/search.html')
\ No newline at end of file
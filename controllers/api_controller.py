@@ -1,10 +1,21 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from flask_login import login_required, current_user
 from models.database import db
-from models.parking import ParkingLot, ParkingSpot, Reservation
-from models.user import User
-from sqlalchemy import func
+from models.parking import ParkingLot
+from models.booking import Booking
+from services.occupancy import occupancy_index, occupancy_summary
+from services.reservations import user_reservation_stats, forget_active_reservation
+from services.rollups import daily_revenue, monthly_revenue
+from services.availability_cache import availability_cache, FORMATS
+from services.occupancy_stream import occupancy_publisher, event_stream
+from services.identity import user_cache
+from services import bookings, exports, occupancy_series
+from services.bookings import booking_index, BookingError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
+import re
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -17,23 +28,18 @@ def admin_api_required(f):
     decorated_function.__name__ = f.__name__
     return login_required(decorated_function)
 
-@api_bp.route('/parking-stats')
-@admin_api_required
-def parking_stats():
-    """Get parking statistics for admin dashboard"""
-    # Overall stats
-    total_spots = ParkingSpot.query.count()
-    available_spots = ParkingSpot.query.filter_by(status='A').count()
-    occupied_spots = ParkingSpot.query.filter_by(status='O').count()
+def parking_stats_payload(occupancy, lots):
+    """Body of /api/parking-stats from an OccupancySummary and (id, name) per lot"""
+    total_spots = occupancy.overall['total']
+    available_spots = occupancy.overall['available']
+    occupied_spots = occupancy.overall['occupied']
     
-    # Lot-wise stats
-    lots = ParkingLot.query.all()
     lot_stats = []
-    
     for lot in lots:
-        total = ParkingSpot.query.filter_by(lot_id=lot.id).count()
-        available = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-        occupied = ParkingSpot.query.filter_by(lot_id=lot.id, status='O').count()
+        counts = occupancy.for_lot(lot.id)
+        total = counts['total']
+        available = counts['available']
+        occupied = counts['occupied']
         
         lot_stats.append({
             'id': lot.id,
@@ -44,7 +50,7 @@ def parking_stats():
             'occupancy_rate': (occupied / total * 100) if total > 0 else 0
         })
     
-    return jsonify({
+    return {
         'overall': {
             'total': total_spots,
             'available': available_spots,
@@ -52,46 +58,113 @@ def parking_stats():
             'occupancy_rate': (occupied_spots / total_spots * 100) if total_spots > 0 else 0
         },
         'lots': lot_stats
+    }
+
+@api_bp.route('/parking-stats')
+@admin_api_required
+def parking_stats():
+    """Get parking statistics for admin dashboard"""
+    # Overall and lot-wise stats
+    occupancy = occupancy_summary()
+    lots = db.session.execute(select(ParkingLot.id, ParkingLot.name)).all()
+    return jsonify(parking_stats_payload(occupancy, lots))
+
+@api_bp.route('/occupancy-check')
+@admin_api_required
+def occupancy_check():
+    """Reconcile this worker's occupancy index against the database"""
+    fix = request.args.get('fix', 0, type=int) == 1
+    drift = occupancy_index.check_consistency(fix=fix)
+    
+    return jsonify({
+        'consistent': not drift,
+        'fixed': fix and bool(drift),
+        'drift': drift
     })
 
+@api_bp.route('/cache-stats')
+@admin_api_required
+def cache_stats():
+    """Hit rates of this worker's identity cache"""
+    return jsonify({'user_cache': user_cache.stats()})
+
+@api_bp.route('/occupancy/stream')
+@login_required
+def occupancy_stream():
+    """Server-sent events: a snapshot of every lot, then per-lot occupancy deltas"""
+    # Subscribe before taking the snapshot so no change falls in between
+    subscriber = occupancy_publisher.subscribe()
+    snapshot = [
+        {'lot_id': lot_id, 'available': available, 'occupied': occupied}
+        for lot_id, (available, occupied) in occupancy_index.snapshot().items()
+    ]
+    
+    heartbeat = current_app.config.get('OCCUPANCY_STREAM_HEARTBEAT', 15)
+    response = current_app.response_class(
+        event_stream(subscriber, snapshot, heartbeat), mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def revenue_since():
+    """First day of the daily series in /api/revenue-stats (the last 30 days)"""
+    return (datetime.utcnow() - timedelta(days=30)).date()
+
+def revenue_stats_payload(daily, monthly):
+    """Body of /api/revenue-stats from (day, revenue) and (month, revenue) pairs"""
+    return {
+        'daily': [{'date': str(day), 'revenue': float(revenue)} for day, revenue in daily],
+        'monthly': [{'month': month, 'revenue': float(revenue)} for month, revenue in monthly]
+    }
+
 @api_bp.route('/revenue-stats')
 @admin_api_required
 def revenue_stats():
     """Get revenue statistics for admin dashboard"""
-    # Daily revenue for last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    daily_revenue = db.session.query(
-        func.date(Reservation.leaving_time).label('date'),
-        func.sum(Reservation.parking_cost).label('revenue')
-    ).filter(
-        Reservation.leaving_time >= thirty_days_ago,
-        Reservation.leaving_time.isnot(None)
-    ).group_by(
-        func.date(Reservation.leaving_time)
-    ).all()
-    
-    # Convert to dictionary format
-    revenue_data = [{'date': str(day.date), 'revenue': float(day.revenue)} for day in daily_revenue]
-    
-    # Monthly revenue summary
-    monthly_revenue = db.session.query(
-        func.strftime('%Y-%m', Reservation.leaving_time).label('month'),
-        func.sum(Reservation.parking_cost).label('revenue')
-    ).filter(
-        Reservation.leaving_time.isnot(None)
-    ).group_by(
-        func.strftime('%Y-%m', Reservation.leaving_time)
-    ).order_by(
-        func.strftime('%Y-%m', Reservation.leaving_time).desc()
-    ).limit(12).all()
+    # Daily revenue for the last 30 days and the monthly summary, from the incrementally maintained rollups
+    return jsonify(revenue_stats_payload(daily_revenue(revenue_since()), monthly_revenue(12)))
+
+def _analytics_range():
+    """(first, last) local days from ?since=&until=; raises AnalyticsError"""
+    return occupancy_series.parse_range(request.args.get('since'), request.args.get('until'))
+
+def _analytics_meta(first, last):
+    computed_at = occupancy_series.computed_at()
+    return {
+        'since': occupancy_series.day_iso(first),
+        'until': occupancy_series.day_iso(last),
+        'timezone': current_app.config['DISPLAY_TIMEZONE'],
+        'computed_at': computed_at.isoformat() + 'Z' if computed_at else None
+    }
+
+@api_bp.route('/analytics/utilization')
+@admin_api_required
+def utilization():
+    """Hourly utilization heatmap by weekday, peak occupancy and average dwell per lot (?since=&until=&lot_id=)"""
+    try:
+        first, last = _analytics_range()
+    except occupancy_series.AnalyticsError as e:
+        return jsonify({'error': str(e)}), 400
+    lot_id = request.args.get('lot_id', type=int)
     
-    monthly_data = [{'month': month.month, 'revenue': float(month.revenue)} for month in monthly_revenue]
+    # Read from the occupancy series the occupancy-series job keeps up to date
+    lots = occupancy_series.utilization(first, last, [lot_id] if lot_id is not None else None)
+    return jsonify(dict(_analytics_meta(first, last), lots=lots))
+
+@api_bp.route('/lots/<int:lot_id>/occupancy')
+@admin_api_required
+def lot_occupancy(lot_id):
+    """A lot's hourly utilization, peak occupancy and arrivals, one entry per local day (?since=&until=)"""
+    if db.session.get(ParkingLot, lot_id) is None:
+        return jsonify({'error': 'Parking lot not found'}), 404
+    try:
+        first, last = _analytics_range()
+    except occupancy_series.AnalyticsError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify({
-        'daily': revenue_data,
-        'monthly': monthly_data
-    })
+    spots, days = occupancy_series.lot_series(lot_id, first, last)
+    return jsonify(dict(_analytics_meta(first, last), lot_id=lot_id, spots=spots, days=days))
 
 @api_bp.route('/user-stats/<int:user_id>')
 @login_required
@@ -101,52 +174,193 @@ def user_stats(user_id):
     if not current_user.is_admin and current_user.id != user_id:
         return jsonify({'error': 'Unauthorized access'}), 403
     
-    # Get user's reservation history
-    reservations = Reservation.query.filter_by(user_id=user_id).all()
+    # Aggregate the user's reservation history in SQL
+    return jsonify(user_reservation_stats([user_id])[user_id])
+
+@api_bp.route('/available-spots/<int:lot_id>')
+def available_spots(lot_id):
+    """Get available spots for a specific parking lot"""
+    # ?format=counts returns only the count, ?format=rle spot number ranges
+    fmt = request.args.get('format', 'full')
+    if fmt not in FORMATS:
+        return jsonify({'error': f'Unknown format, expected one of: {", ".join(FORMATS)}'}), 400
     
-    # Calculate stats
-    total_reservations = len(reservations)
-    completed_reservations = len([r for r in reservations if not r.is_active])
-    active_reservations = len([r for r in reservations if r.is_active])
+    # Served from the per-lot response cache; unchanged lots answer 304 to If-None-Match
+    body, etag = availability_cache.get(lot_id, fmt)
+    return availability_response(body, etag, request)
+
+def availability_response(body, etag, request_or_environ):
+    """Cacheable JSON response for a cached availability body"""
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('AVAILABILITY_CACHE_TTL', 5)
+    return response.make_conditional(request_or_environ)
+
+
+def _reservation_filters():
+    """lot/user/date filters from the query string, or None if a non-admin asks for someone else's"""
+    user_id = request.args.get('user_id', type=int)
+    if not current_user.is_admin:
+        if user_id is not None and user_id != current_user.id:
+            return None
+        user_id = current_user.id
+    return {
+        'lot_id': request.args.get('lot_id', type=int),
+        'user_id': user_id,
+        'since': request.args.get('since'),
+        'until': request.args.get('until')
+    }
+
+@api_bp.route('/reservations')
+@login_required
+def reservations():
+    """A page of reservations ordered by parking time; pass next_cursor back as ?cursor= for the next"""
+    filters = _reservation_filters()
+    if filters is None:
+        return jsonify({'error': 'Unauthorized access'}), 403
     
-    total_spent = sum([r.parking_cost or 0 for r in reservations if r.parking_cost])
-    avg_duration = 0
+    limit = min(max(request.args.get('limit', exports.PAGE_SIZE, type=int), 1), exports.MAX_PAGE_SIZE)
+    try:
+        query = exports.reservation_query(**filters)
+        rows, next_cursor = exports.page(db.session, query, limit, request.args.get('cursor'))
+    except exports.ExportError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if completed_reservations > 0:
-        total_duration = sum([
-            (r.leaving_time - r.parking_time).total_seconds() / 3600 
-            for r in reservations 
-            if r.leaving_time
-        ])
-        avg_duration = total_duration / completed_reservations
+    return jsonify({'reservations': rows, 'next_cursor': next_cursor})
+
+@api_bp.route('/reservations/export')
+@login_required
+def export_reservations():
+    """Stream every matching reservation as NDJSON or CSV"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exports.EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown format, expected one of: {", ".join(exports.EXPORT_FORMATS)}'}), 400
+    filters = _reservation_filters()
+    if filters is None:
+        return jsonify({'error': 'Unauthorized access'}), 403
+    try:
+        query = exports.reservation_query(**filters)
+    except exports.ExportError as e:
+        return jsonify({'error': str(e)}), 400
     
+    # The generator reads on its own connection, so it outlives the request's session
+    response = current_app.response_class(
+        exports.stream_export(db.engine, query, fmt, current_app.config['EXPORT_CHUNK_SIZE']),
+        mimetype='application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=reservations.{fmt}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _booking_window(args):
+    """(start, end) of a bookable window from ISO strings; raises BookingError"""
+    starts_at = bookings.parse_time(args.get('start'), 'start')
+    ends_at = bookings.parse_time(args.get('end'), 'end')
+    bookings.check_window(starts_at, ends_at)
+    return starts_at, ends_at
+
+@api_bp.route('/lots/<int:lot_id>/availability')
+def lot_availability(lot_id):
+    """How many spots of a lot are free for a whole future window (?start=&end=, ISO, UTC)"""
+    if db.session.get(ParkingLot, lot_id) is None:
+        return jsonify({'error': 'Parking lot not found'}), 404
+    try:
+        starts_at, ends_at = _booking_window(request.args)
+    except BookingError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Answered from this worker's booking index; booking re-checks the database
+    available, total = booking_index.count_free(lot_id, starts_at, ends_at)
     return jsonify({
-        'user_id': user_id,
-        'total_reservations': total_reservations,
-        'completed_reservations': completed_reservations,
-        'active_reservations': active_reservations,
-        'total_spent': total_spent,
-        'avg_duration_hours': avg_duration
+        'lot_id': lot_id,
+        'start': starts_at.isoformat() + 'Z',
+        'end': ends_at.isoformat() + 'Z',
+        'available': available,
+        'total_spots': total
     })
 
-@api_bp.route('/available-spots/<int:lot_id>')
-def available_spots(lot_id):
-    """Get available spots for a specific parking lot"""
-    # Get the parking lot
-    lot = ParkingLot.query.get_or_404(lot_id)
+@api_bp.route('/bookings')
+@login_required
+def list_bookings():
+    """The current user's open bookings, soonest first"""
+    rows = Booking.query.options(joinedload(Booking.spot)).filter(
+        Booking.user_id == current_user.id, Booking.status == 'B', Booking.ends_at > datetime.utcnow()
+    ).order_by(Booking.starts_at).all()
+    return jsonify({'bookings': [bookings.serialize(booking) for booking in rows]})
+
+@api_bp.route('/bookings', methods=['POST'])
+@login_required
+def create_booking():
+    """Book a spot of a lot for a future window (JSON or form fields); the lowest numbered free spot is held"""
+    data = request.get_json(silent=True) or request.form
+    try:
+        lot_id = int(data.get('lot_id'))
+    except (TypeError, ValueError):
+        lot_id = None
+    vehicle_number = str(data.get('vehicle_number') or '').strip().upper()
+    if lot_id is None or db.session.get(ParkingLot, lot_id) is None:
+        return jsonify({'error': 'Parking lot not found'}), 404
+    if not re.fullmatch(r'[A-Z0-9 -]{5,20}', vehicle_number):
+        return jsonify({'error': 'vehicle_number must be 5 to 20 letters, digits, spaces or hyphens'}), 400
+    try:
+        starts_at, ends_at = _booking_window(data)
+        booking = bookings.book(current_user.id, lot_id, starts_at, ends_at, vehicle_number)
+    except BookingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    if booking is None:
+        db.session.rollback()
+        return jsonify({'error': 'No spot is free for that whole window'}), 409
     
-    # Get available spots
-    spots = ParkingSpot.query.filter_by(lot_id=lot_id, status='A').all()
+    db.session.commit()
+    booking_index.add(lot_id, booking)
+    return jsonify(bookings.serialize(booking)), 201
+
+def _own_booking(booking_id):
+    booking = Booking.query.options(joinedload(Booking.spot)).filter_by(id=booking_id).first()
+    if booking is None or booking.user_id != current_user.id:
+        return None
+    return booking
+
+@api_bp.route('/bookings/<int:booking_id>/cancel', methods=['POST'])
+@login_required
+def cancel_booking(booking_id):
+    """Cancel one of the current user's open bookings"""
+    booking = _own_booking(booking_id)
+    if booking is None:
+        return jsonify({'error': 'Booking not found'}), 404
+    if not bookings.cancel(booking):
+        db.session.rollback()
+        return jsonify({'error': 'This booking is no longer open'}), 409
     
-    spot_data = [{
-        'id': spot.id,
-        'spot_number': spot.spot_number
-    } for spot in spots]
+    db.session.commit()
+    booking_index.remove(booking.spot.lot_id, booking)
+    return jsonify(bookings.serialize(booking))
+
+@api_bp.route('/bookings/<int:booking_id>/check-in', methods=['POST'])
+@login_required
+def check_in_booking(booking_id):
+    """Start parking on a booking: its spot, or another free one if a walk-in still holds it"""
+    booking = _own_booking(booking_id)
+    if booking is None:
+        return jsonify({'error': 'Booking not found'}), 404
+    lot_id = booking.spot.lot_id
+    try:
+        reservation = bookings.check_in(booking)
+    except BookingError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     
-    return jsonify({
-        'lot_id': lot.id,
-        'lot_name': lot.name,
-        'available_spots': spot_data,
-        'total_available': len(spot_data),
-        'price_per_hour': lot.price
-    })
\ No newline at end of file
+    spot_id = reservation.spot_id
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The user is already parked somewhere
+        db.session.rollback()
+        occupancy_index.release_spot(lot_id, spot_id)
+        return jsonify({'error': 'You already have an active reservation'}), 409
+    occupancy_index.mark_occupied(lot_id, spot_id)
+    booking_index.remove(lot_id, booking)
+    forget_active_reservation(current_user.id)
+    return jsonify(bookings.serialize(booking))
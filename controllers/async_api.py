@@ -0,0 +1,108 @@
+import asyncio
+import re
+from urllib.parse import parse_qs
+from flask import jsonify
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from werkzeug.http import parse_cookie
+from models.parking import ParkingLot
+from controllers.api_controller import (
+    availability_response, parking_stats_payload, revenue_since, revenue_stats_payload
+)
+from services.availability_cache import FORMATS, availability_cache, availability_payload, availability_query
+from services.identity import user_cache
+from services.occupancy import occupancy_counts_query, summary_from_rows
+from services.rollups import daily_revenue_query, monthly_revenue_query, months_from_rows
+
+
+class AsyncApi:
+    """Async versions of the read-only API views, on an async database engine.
+
+    Each view runs its independent queries concurrently, one pooled
+    connection apiece, so a request waits for the slowest query instead of
+    their sum and holds no thread while it waits. Only requests these views
+    can answer exactly like the Flask app are taken: the admin views need a
+    session cookie whose user is in this worker's identity cache, and
+    unknown lots, bad formats and anything else return None so the caller
+    passes the request on to the Flask app. As every view holds up to two
+    connections, at most half the pool's worth run at once; the rest wait
+    their turn in order rather than time out on the pool.
+    """
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.engine = engine
+        self.slots = asyncio.Semaphore(max(1, (app.config['DB_POOL_SIZE'] + app.config['DB_MAX_OVERFLOW']) // 2))
+        self.routes = (
+            (re.compile(r'/api/parking-stats'), self.parking_stats, True),
+            (re.compile(r'/api/revenue-stats'), self.revenue_stats, True),
+            (re.compile(r'/api/available-spots/(\d+)'), self.available_spots, False),
+        )
+
+    async def handle(self, environ):
+        """A Flask response for the request, or None if the Flask app should serve it"""
+        if environ['REQUEST_METHOD'] != 'GET':
+            return None
+        for pattern, view, admin_only in self.routes:
+            match = pattern.fullmatch(environ['PATH_INFO'])
+            if match:
+                break
+        else:
+            return None
+        if admin_only and not self._is_admin(environ):
+            return None
+        async with self.slots:
+            with self.app.app_context():
+                return await view(environ, *match.groups())
+
+    def _is_admin(self, environ):
+        """True if the session's user is a cached admin; misses go to the Flask app, which caches them"""
+        interface = self.app.session_interface
+        if type(interface) is not SecureCookieSessionInterface:
+            return False
+        serializer = interface.get_signing_serializer(self.app)
+        cookie = parse_cookie(environ).get(self.app.config['SESSION_COOKIE_NAME'])
+        if serializer is None or not cookie:
+            return False
+        try:
+            session = serializer.loads(cookie, max_age=int(self.app.permanent_session_lifetime.total_seconds()))
+            user = user_cache.peek(int(session['_user_id']))
+        except (BadSignature, KeyError, TypeError, ValueError):
+            return False
+        return bool(user and user['is_admin'])
+
+    async def _all(self, statement):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(statement)).all()
+
+    async def parking_stats(self, environ):
+        counts, lots = await asyncio.gather(
+            self._all(occupancy_counts_query()),
+            self._all(select(ParkingLot.id, ParkingLot.name)),
+        )
+        return jsonify(parking_stats_payload(summary_from_rows(counts), lots))
+
+    async def revenue_stats(self, environ):
+        daily, monthly = await asyncio.gather(
+            self._all(daily_revenue_query(revenue_since())),
+            self._all(monthly_revenue_query()),
+        )
+        return jsonify(revenue_stats_payload(daily, months_from_rows(monthly, 12)))
+
+    async def available_spots(self, environ, lot_id):
+        lot_id = int(lot_id)
+        fmt = parse_qs(environ.get('QUERY_STRING', '')).get('format', ['full'])[0]
+        if fmt not in FORMATS:
+            return None
+        cached = availability_cache.cached(lot_id, fmt)
+        if cached is None:
+            generation = availability_cache.generation
+            lots, rows = await asyncio.gather(
+                self._all(select(ParkingLot.id, ParkingLot.name, ParkingLot.price).where(ParkingLot.id == lot_id)),
+                self._all(availability_query(lot_id, fmt)),
+            )
+            if not lots:
+                return None
+            cached = availability_cache.store(lot_id, fmt, availability_payload(lots[0], fmt, rows), generation)
+        return availability_response(*cached, environ)
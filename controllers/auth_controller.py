@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, get_flas
 from flask_login import login_user, logout_user, current_user, login_required
 from models.database import db
 from models.user import User
-from forms.auth_forms import LoginForm, RegistrationForm
+from services.passwords import PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -13,10 +13,23 @@ def login():
             return redirect(url_for('admin.dashboard'))
         return redirect(url_for('user.dashboard'))
     
+    from forms.auth_forms import LoginForm
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        # Hand the pooled connection back while the password is hashed (user stays loaded)
+        db.session.close()
+        try:
+            authenticated = user is not None and user.check_password(form.password.data)
+            # Upgrade hashes made with older cost settings while we know the password
+            if authenticated and user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.add(user)
+                db.session.commit()
+        except PasswordHasherBusy:
+            flash('Too many sign-ins right now. Please try again in a moment.', 'warning')
+            return render_template('auth/login.html', form=form), 503
+        if authenticated:
             login_user(user, remember=form.remember.data)
             next_page = request.args.get('next')
             if user.is_admin:
@@ -31,15 +44,22 @@ def register():
     if current_user.is_authenticated:
         return redirect(url_for('user.dashboard'))
     
+    from forms.auth_forms import RegistrationForm
     form = RegistrationForm()
     if form.validate_on_submit():
+        # The email check used a connection; don't hold it while hashing
+        db.session.close()
         user = User(
             name=form.name.data,
             email=form.email.data,
             address=form.address.data,
             pin_code=form.pin_code.data
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('Too many sign-ups right now. Please try again in a moment.', 'warning')
+            return render_template('auth/register.html', form=form), 503
         db.session.add(user)
         db.session.commit()
         flash('Registration successful! Please log in.', 'success')
@@ -1,10 +1,19 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_required, current_user
 from models.database import db
 from models.parking import ParkingLot, ParkingSpot, Reservation
-from forms.parking_forms import ReservationForm, ReleaseForm
+from services.billing import price_stay
+from services.bookings import held_spot_ids
+from services.occupancy import occupancy_index, allocate_spot
+from services.reservations import history_page, active_reservation_for, forget_active_reservation, close_reservation
+from services.pagination import InvalidCursor
+from services.rollups import user_monthly_activity
+from services.search import search_index
+from services.timezones import to_local_many
 from datetime import datetime
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
@@ -24,77 +33,81 @@ def regular_user_required(f):
 @regular_user_required
 def dashboard():
     # Get user's active reservation if any
-    active_reservation = Reservation.query.filter_by(
-        user_id=current_user.id, is_active=True
-    ).first()
+    active_reservation = active_reservation_for(current_user.id)
     
     # Get parking lots with available spots
     available_lots = ParkingLot.query.filter(
-        ParkingLot.id.in_(
-            db.session.query(ParkingSpot.lot_id)
-            .filter_by(status='A')
-            .group_by(ParkingSpot.lot_id)
-        )
+        ParkingLot.id.in_(occupancy_index.available_lot_ids())
     ).all()
+    lot_availability = {lot.id: occupancy_index.counts(lot.id)[0] for lot in available_lots}
     
     # Get user's recent reservations
-    recent_reservations = Reservation.query.filter_by(
+    recent_reservations = Reservation.query.options(
+        joinedload(Reservation.parking_spot).joinedload(ParkingSpot.parking_lot)
+    ).filter_by(
         user_id=current_user.id, is_active=False
     ).order_by(Reservation.parking_time.desc()).limit(5).all()
     
     return render_template('user/dashboard.html',
                            active_reservation=active_reservation,
                            available_lots=available_lots,
+                           lot_availability=lot_availability,
                            recent_reservations=recent_reservations)
 
 @user_bp.route('/reserve', methods=['GET', 'POST'])
 @regular_user_required
 def reserve():
     # Check if user already has an active reservation
-    active_reservation = Reservation.query.filter_by(
-        user_id=current_user.id, is_active=True
-    ).first()
+    active_reservation = active_reservation_for(current_user.id)
     
     if active_reservation:
         flash('You already have an active reservation.', 'warning')
         return redirect(url_for('user.dashboard'))
     
+    from forms.parking_forms import ReservationForm
     form = ReservationForm()
     
     # Populate lot choices dynamically
     lots_with_spots = ParkingLot.query.filter(
-        ParkingLot.id.in_(
-            db.session.query(ParkingSpot.lot_id)
-            .filter_by(status='A')
-            .group_by(ParkingSpot.lot_id)
-        )
+        ParkingLot.id.in_(occupancy_index.available_lot_ids())
     ).all()
     
     form.lot_id.choices = [(lot.id, f"{lot.name} - ₹{lot.price}/hr") for lot in lots_with_spots]
     
     if form.validate_on_submit():
-        # Find first available spot in the selected lot
-        available_spot = ParkingSpot.query.filter_by(
-            lot_id=form.lot_id.data, status='A'
-        ).first()
+        # Claim the next free spot in the selected lot (conditional update, no double booking),
+        # leaving alone spots whose booker may check in now
+        spot_id = allocate_spot(form.lot_id.data, exclude=held_spot_ids(form.lot_id.data))
         
-        if not available_spot:
+        if spot_id is None:
+            db.session.rollback()
             flash('No spots available in this lot.', 'danger')
             return redirect(url_for('user.reserve'))
         
-        # Mark spot as occupied
-        available_spot.status = 'O'
-        
         # Create reservation
         reservation = Reservation(
-            spot_id=available_spot.id,
+            spot_id=spot_id,
             user_id=current_user.id,
+            lot_id=form.lot_id.data,
             vehicle_number=form.vehicle_number.data,
             parking_time=datetime.utcnow()
         )
         
         db.session.add(reservation)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request already gave this user an active reservation
+            db.session.rollback()
+            occupancy_index.release_spot(form.lot_id.data, spot_id)
+            flash('You already have an active reservation.', 'warning')
+            return redirect(url_for('user.dashboard'))
+        except Exception:
+            db.session.rollback()
+            occupancy_index.release_spot(form.lot_id.data, spot_id)
+            raise
+        occupancy_index.mark_occupied(form.lot_id.data, spot_id)
+        forget_active_reservation(current_user.id)
         
         flash('Parking spot reserved successfully!', 'success')
         return redirect(url_for('user.dashboard'))
@@ -104,43 +117,45 @@ def reserve():
 @user_bp.route('/release', methods=['GET', 'POST'])
 @regular_user_required
 def release():
-    # Get user's active reservation
-    active_reservation = Reservation.query.filter_by(
-        user_id=current_user.id, is_active=True
-    ).first()
+    # Get user's active reservation (its spot and lot come eager-loaded)
+    active_reservation = active_reservation_for(current_user.id)
     
     if not active_reservation:
         flash('You do not have an active reservation to release.', 'warning')
         return redirect(url_for('user.dashboard'))
     
+    from forms.parking_forms import ReleaseForm
     form = ReleaseForm()
     
     if form.validate_on_submit():
-        # Mark reservation as inactive
-        active_reservation.is_active = False
-        active_reservation.leaving_time = datetime.utcnow()
+        leaving_time = datetime.utcnow()
         
         # Calculate parking cost
-        lot = ParkingLot.query.join(ParkingSpot).filter(
-            ParkingSpot.id == active_reservation.spot_id
-        ).first()
+        spot_id = active_reservation.spot_id
+        lot = active_reservation.parking_spot.parking_lot
+        lot_id = lot.id
         
-        time_diff = active_reservation.leaving_time - active_reservation.parking_time
-        hours = time_diff.total_seconds() / 3600
-        active_reservation.parking_cost = round(hours * lot.price, 2)
+        parking_cost = price_stay(lot, active_reservation.parking_time, leaving_time)
         
-        # Mark spot as available
-        spot = ParkingSpot.query.get(active_reservation.spot_id)
-        spot.status = 'A'
+        # Close the reservation and free its spot, only if nobody released it in the meantime
+        # (the overstay sweep may have); the visit goes into the revenue rollups in the same transaction
+        released = close_reservation(active_reservation.id, current_user.id, spot_id, lot_id,
+                                     active_reservation.parking_time, leaving_time, parking_cost)
+        if not released:
+            db.session.rollback()
+            flash('This reservation has already been released.', 'warning')
+            return redirect(url_for('user.dashboard'))
         
         db.session.commit()
+        occupancy_index.release_spot(lot_id, spot_id)
+        forget_active_reservation(current_user.id)
         
-        flash(f'Parking spot released successfully! Cost: ₹{active_reservation.parking_cost:.2f}', 'success')
+        flash(f'Parking spot released successfully! Cost: ₹{parking_cost:.2f}', 'success')
         return redirect(url_for('user.dashboard'))
     
     # Get spot and lot info for display
-    spot = ParkingSpot.query.get(active_reservation.spot_id)
-    lot = ParkingLot.query.get(spot.lot_id)
+    spot = active_reservation.parking_spot
+    lot = spot.parking_lot
     
     return render_template('user/release.html', 
                            form=form, 
@@ -151,24 +166,30 @@ def release():
 @user_bp.route('/history')
 @regular_user_required
 def history():
-    page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    # Get user's reservation history
-    reservations = Reservation.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Reservation.parking_time.desc()).paginate(page=page, per_page=per_page)
+    # Get user's reservation history, spot and lot loaded in the same query, one keyset page at a time
+    try:
+        reservations = history_page(current_user.id, per_page,
+                                    after=request.args.get('after'), before=request.args.get('before'))
+    except InvalidCursor:
+        abort(400)
+    
+    # Convert the page's timestamps to the display zone in one pass per column
+    parked_at = to_local_many([res.parking_time for res in reservations.items])
+    left_at = to_local_many([res.leaving_time for res in reservations.items])
     
-    # Get spot and lot info for each reservation
     reservation_details = []
-    for res in reservations.items:
-        spot = ParkingSpot.query.get(res.spot_id)
-        lot = ParkingLot.query.get(spot.lot_id)
+    for res, parked, left in zip(reservations.items, parked_at, left_at):
+        spot = res.parking_spot
+        lot = spot.parking_lot
         
         reservation_details.append({
             'reservation': res,
             'spot': spot,
-            'lot': lot
+            'lot': lot,
+            'parked_at': parked,
+            'left_at': left
         })
     
     return render_template('user/history.html', 
@@ -181,29 +202,13 @@ def summary():
     # Get user's total reservations
     total_reservations = Reservation.query.filter_by(user_id=current_user.id).count()
     
-    # Get user's total spending
-    total_spending = db.session.query(func.sum(Reservation.parking_cost)).filter(
-        Reservation.user_id == current_user.id,
-        Reservation.is_active == False
-    ).scalar() or 0
+    # Get user's spending by month parked from the revenue rollups
+    monthly_data = user_monthly_activity(current_user.id)
+    total_spending = sum(cost for _, _, cost in monthly_data)
     
-    # Get user's recent reservations by month
-    monthly_data = db.session.query(
-        func.strftime('%Y-%m', Reservation.parking_time).label('month'),
-        func.count().label('count'),
-        func.sum(Reservation.parking_cost).label('cost')
-    ).filter(
-        Reservation.user_id == current_user.id,
-        Reservation.is_active == False
-    ).group_by(
-        func.strftime('%Y-%m', Reservation.parking_time)
-    ).order_by(
-        func.strftime('%Y-%m', Reservation.parking_time)
-    ).limit(6).all()
-    
-    months = [data.month for data in monthly_data]
-    counts = [data.count for data in monthly_data]
-    costs = [float(data.cost or 0) for data in monthly_data]
+    months = [month for month, _, _ in monthly_data[:6]]
+    counts = [count for _, count, _ in monthly_data[:6]]
+    costs = [float(cost or 0) for _, _, cost in monthly_data[:6]]
     
     # Get favorite parking lots
     favorite_lots = db.session.query(
@@ -239,23 +244,16 @@ def search():
     query = request.args.get('query', '')
     
     if query:
-        # Search for parking lots
-        lots = ParkingLot.query.filter(
-            (ParkingLot.name.contains(query)) |
-            (ParkingLot.address.contains(query)) |
-            (ParkingLot.pin_code.contains(query))
-        ).all()
-        
-        # Get available spots count for each lot
-        lot_availability = {}
-        for lot in lots:
-            lot_availability[lot.id] = ParkingSpot.query.filter_by(
-                lot_id=lot.id, status='A'
-            ).count()
+        # Ranked full-text search; free spots come back in the same query
+        page = request.args.get('page', 1, type=int)
+        results = search_index.search_lots(query, page=page)
+        lots = [lot for lot, _ in results.items]
+        lot_availability = {lot.id: available for lot, available in results.items}
         
         return render_template('user/search_results.html', 
                                query=query, 
                                lots=lots,
-                               lot_availability=lot_availability)
+                               lot_availability=lot_availability,
+                               pagination=results)
     
     return render_template('user/search.html')
\ No newline at end of file
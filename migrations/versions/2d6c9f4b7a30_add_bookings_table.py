@@ -0,0 +1,41 @@
+"""add the advance bookings table
+
+Revision ID: 2d6c9f4b7a30
+Revises: e9b3a6c1d482
+Create Date: 2026-10-17 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d6c9f4b7a30'
+down_revision = 'e9b3a6c1d482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() already have it
+    if sa.inspect(op.get_bind()).has_table('bookings'):
+        return
+    op.create_table(
+        'bookings',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('spot_id', sa.Integer(), sa.ForeignKey('parking_spots.id'), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('vehicle_number', sa.String(length=20), nullable=False),
+        sa.Column('starts_at', sa.DateTime(), nullable=False),
+        sa.Column('ends_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=1), nullable=False),
+        sa.Column('reservation_id', sa.Integer(), sa.ForeignKey('reservations.id'), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_bookings_spot_start', 'bookings', ['spot_id', 'starts_at'])
+    op.create_index('ix_bookings_user_start', 'bookings', ['user_id', 'starts_at'])
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('bookings'):
+        op.drop_table('bookings')
@@ -0,0 +1,66 @@
+"""add composite and partial indexes for hot parking queries
+
+Revision ID: 3f9c2a7d1b64
+Revises: 
+Create Date: 2026-10-16 22:55:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d1b64'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (table, index name, columns, unique, partial predicate)
+INDEXES = [
+    ('parking_spots', 'ix_parking_spots_lot_status', ['lot_id', 'status'], False, None),
+    ('parking_spots', 'ix_parking_spots_lot_number', ['lot_id', 'spot_number'], False, None),
+    ('reservations', 'ix_reservations_user_active', ['user_id', 'is_active'], False, None),
+    ('reservations', 'ix_reservations_spot_active', ['spot_id', 'is_active'], False, None),
+    ('reservations', 'ix_reservations_user_parking_time', ['user_id', 'parking_time'], False, None),
+    ('reservations', 'ix_reservations_parking_time', ['parking_time'], False, None),
+    ('reservations', 'ix_reservations_leaving_time', ['leaving_time'], False, None),
+    ('reservations', 'uq_reservations_active_spot', ['spot_id'], True, 'active'),
+    ('reservations', 'uq_reservations_active_user', ['user_id'], True, 'active'),
+]
+
+# Partial index predicates per backend; backends without partial indexes skip them
+ACTIVE_PREDICATES = {
+    'sqlite': {'sqlite_where': sa.text('is_active = 1')},
+    'postgresql': {'postgresql_where': sa.text('is_active')},
+}
+
+
+def _existing_indexes(inspector, table):
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Databases created by db.create_all() already have these; only add what is missing
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, name, columns, unique, predicate in INDEXES:
+        existing = _existing_indexes(inspector, table)
+        if existing is None or name in existing:
+            continue
+        kwargs = {}
+        if predicate:
+            if bind.dialect.name not in ACTIVE_PREDICATES:
+                continue
+            kwargs = ACTIVE_PREDICATES[bind.dialect.name]
+        op.create_index(name, table, columns, unique=unique, **kwargs)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, name, _, _, _ in reversed(INDEXES):
+        existing = _existing_indexes(inspector, table)
+        if existing and name in existing:
+            op.drop_index(name, table_name=table)
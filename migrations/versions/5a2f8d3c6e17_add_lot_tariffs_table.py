@@ -0,0 +1,37 @@
+"""add the per-lot tariff table
+
+Revision ID: 5a2f8d3c6e17
+Revises: c4d7e2a9f015
+Create Date: 2026-10-17 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a2f8d3c6e17'
+down_revision = 'c4d7e2a9f015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() already have it
+    if sa.inspect(op.get_bind()).has_table('lot_tariffs'):
+        return
+    op.create_table(
+        'lot_tariffs',
+        sa.Column('lot_id', sa.Integer(), sa.ForeignKey('parking_lots.id'), primary_key=True),
+        sa.Column('increment_minutes', sa.Integer(), nullable=False),
+        sa.Column('minimum_charge', sa.Float(), nullable=False),
+        sa.Column('daily_cap', sa.Float(), nullable=True),
+        sa.Column('peak_start', sa.Time(), nullable=True),
+        sa.Column('peak_end', sa.Time(), nullable=True),
+        sa.Column('peak_price', sa.Float(), nullable=True),
+    )
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('lot_tariffs'):
+        op.drop_table('lot_tariffs')
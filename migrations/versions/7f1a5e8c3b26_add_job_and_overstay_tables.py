@@ -0,0 +1,49 @@
+"""add the background job state and overstay tables
+
+Revision ID: 7f1a5e8c3b26
+Revises: 2d6c9f4b7a30
+Create Date: 2026-10-17 14:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f1a5e8c3b26'
+down_revision = '2d6c9f4b7a30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() already have them
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('job_states'):
+        op.create_table(
+            'job_states',
+            sa.Column('name', sa.String(length=50), primary_key=True),
+            sa.Column('next_run_at', sa.DateTime(), nullable=False),
+            sa.Column('lease_owner', sa.String(length=100), nullable=True),
+            sa.Column('lease_until', sa.DateTime(), nullable=True),
+            sa.Column('cursor', sa.String(length=200), nullable=True),
+            sa.Column('runs', sa.Integer(), nullable=False),
+            sa.Column('last_started_at', sa.DateTime(), nullable=True),
+            sa.Column('last_duration_ms', sa.Float(), nullable=True),
+            sa.Column('last_processed', sa.Integer(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+        )
+    if not inspector.has_table('overstays'):
+        op.create_table(
+            'overstays',
+            sa.Column('reservation_id', sa.Integer(), sa.ForeignKey('reservations.id'), primary_key=True),
+            sa.Column('flagged_at', sa.DateTime(), nullable=False),
+            sa.Column('released_at', sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in ('overstays', 'job_states'):
+        if inspector.has_table(table):
+            op.drop_table(table)
@@ -0,0 +1,44 @@
+"""add a partial index of active reservations by parking time for the overstay sweep
+
+Revision ID: 8b1e4c6f2a93
+Revises: 3f9c2a7d1b64
+Create Date: 2026-10-17 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4c6f2a93'
+down_revision = '3f9c2a7d1b64'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'ix_reservations_active_parking_time'
+
+# Partial index predicates per backend; elsewhere a plain index on parking_time already exists
+ACTIVE_PREDICATES = {
+    'sqlite': {'sqlite_where': sa.text('is_active = 1')},
+    'postgresql': {'postgresql_where': sa.text('is_active')},
+}
+
+
+def _has_index(inspector):
+    return inspector.has_table('reservations') and any(
+        index['name'] == NAME for index in inspector.get_indexes('reservations')
+    )
+
+
+def upgrade():
+    # Databases created by db.create_all() already have it
+    bind = op.get_bind()
+    if bind.dialect.name not in ACTIVE_PREDICATES or _has_index(sa.inspect(bind)):
+        return
+    op.create_index(NAME, 'reservations', ['parking_time'], **ACTIVE_PREDICATES[bind.dialect.name])
+
+
+def downgrade():
+    if _has_index(sa.inspect(op.get_bind())):
+        op.drop_index(NAME, table_name='reservations')
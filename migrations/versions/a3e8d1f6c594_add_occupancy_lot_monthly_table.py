@@ -0,0 +1,38 @@
+"""add the hourly occupancy series table
+
+Revision ID: a3e8d1f6c594
+Revises: 7f1a5e8c3b26
+Create Date: 2026-10-17 14:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e8d1f6c594'
+down_revision = '7f1a5e8c3b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() already have it
+    if sa.inspect(op.get_bind()).has_table('occupancy_lot_monthly'):
+        return
+    op.create_table(
+        'occupancy_lot_monthly',
+        sa.Column('lot_id', sa.Integer(), primary_key=True),
+        sa.Column('month', sa.Integer(), primary_key=True),
+        sa.Column('occupied', sa.LargeBinary(), nullable=False),
+        sa.Column('peak', sa.LargeBinary(), nullable=False),
+        sa.Column('arrivals', sa.LargeBinary(), nullable=False),
+        sa.Column('stays', sa.LargeBinary(), nullable=False),
+        sa.Column('dwell', sa.LargeBinary(), nullable=False),
+    )
+    op.create_index('ix_occupancy_lot_monthly_month', 'occupancy_lot_monthly', ['month'])
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('occupancy_lot_monthly'):
+        op.drop_table('occupancy_lot_monthly')
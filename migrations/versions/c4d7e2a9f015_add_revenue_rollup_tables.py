@@ -0,0 +1,59 @@
+"""add the daily revenue rollup tables
+
+Revision ID: c4d7e2a9f015
+Revises: 8b1e4c6f2a93
+Create Date: 2026-10-17 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7e2a9f015'
+down_revision = '8b1e4c6f2a93'
+branch_labels = None
+depends_on = None
+
+
+# The rollups are rebuilt from the reservations, so they carry no foreign keys
+TABLES = ['revenue_daily', 'revenue_lot_daily', 'revenue_user_daily']
+
+
+def _totals():
+    return [
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('visits', sa.Integer(), nullable=False),
+    ]
+
+
+def upgrade():
+    # Databases created by db.create_all() already have them
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('revenue_daily'):
+        op.create_table(
+            'revenue_daily',
+            sa.Column('day', sa.Date(), primary_key=True),
+            *_totals(),
+        )
+    if not inspector.has_table('revenue_lot_daily'):
+        op.create_table(
+            'revenue_lot_daily',
+            sa.Column('lot_id', sa.Integer(), primary_key=True),
+            sa.Column('day', sa.Date(), primary_key=True),
+            *_totals(),
+        )
+    if not inspector.has_table('revenue_user_daily'):
+        op.create_table(
+            'revenue_user_daily',
+            sa.Column('user_id', sa.Integer(), primary_key=True),
+            sa.Column('day', sa.Date(), primary_key=True),
+            *_totals(),
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in reversed(TABLES):
+        if inspector.has_table(table):
+            op.drop_table(table)
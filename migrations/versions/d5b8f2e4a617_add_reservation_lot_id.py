@@ -0,0 +1,43 @@
+"""copy each reservation's lot onto it and index the lot's reservations in keyset order
+
+Revision ID: d5b8f2e4a617
+Revises: a3e8d1f6c594
+Create Date: 2026-10-17 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b8f2e4a617'
+down_revision = 'a3e8d1f6c594'
+branch_labels = None
+depends_on = None
+
+
+NAME = 'ix_reservations_lot_parking_time'
+
+
+def upgrade():
+    # Databases created by db.create_all() already have the column and index
+    inspector = sa.inspect(op.get_bind())
+    if 'lot_id' not in {column['name'] for column in inspector.get_columns('reservations')}:
+        op.add_column('reservations', sa.Column('lot_id', sa.Integer(), nullable=True))
+    # A spot never changes lot, so one set-based copy fills every reservation
+    op.execute(
+        'UPDATE reservations SET lot_id = '
+        '(SELECT parking_spots.lot_id FROM parking_spots WHERE parking_spots.id = reservations.spot_id) '
+        'WHERE lot_id IS NULL'
+    )
+    if NAME not in {index['name'] for index in inspector.get_indexes('reservations')}:
+        op.create_index(NAME, 'reservations', ['lot_id', 'parking_time', 'id'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if NAME in {index['name'] for index in inspector.get_indexes('reservations')}:
+        op.drop_index(NAME, table_name='reservations')
+    if 'lot_id' in {column['name'] for column in inspector.get_columns('reservations')}:
+        with op.batch_alter_table('reservations') as batch:
+            batch.drop_column('lot_id')
@@ -0,0 +1,42 @@
+"""add the per-lot allocation strategy and spot placement tables
+
+Revision ID: e9b3a6c1d482
+Revises: 5a2f8d3c6e17
+Create Date: 2026-10-17 14:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b3a6c1d482'
+down_revision = '5a2f8d3c6e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() already have them
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('lot_allocations'):
+        op.create_table(
+            'lot_allocations',
+            sa.Column('lot_id', sa.Integer(), sa.ForeignKey('parking_lots.id'), primary_key=True),
+            sa.Column('strategy', sa.String(length=30), nullable=False),
+        )
+    if not inspector.has_table('spot_placements'):
+        op.create_table(
+            'spot_placements',
+            sa.Column('lot_id', sa.Integer(), sa.ForeignKey('parking_lots.id'), primary_key=True),
+            sa.Column('spot_number', sa.Integer(), primary_key=True),
+            sa.Column('level', sa.Integer(), nullable=False),
+            sa.Column('distance', sa.Integer(), nullable=True),
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in ('spot_placements', 'lot_allocations'):
+        if inspector.has_table(table):
+            op.drop_table(table)
@@ -0,0 +1,32 @@
+from models.database import db
+
+
+class LotAllocation(db.Model):
+    """How a lot hands out free spots; lots without a row use the lowest numbered free spot"""
+    __tablename__ = 'lot_allocations'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), primary_key=True)
+    # A name from services.allocation.STRATEGIES
+    strategy = db.Column(db.String(30), nullable=False)
+
+    def __repr__(self):
+        return f'<LotAllocation {self.lot_id} {self.strategy}>'
+
+
+class SpotPlacement(db.Model):
+    """Where a spot number of a lot is, for the nearest_entrance strategy.
+
+    Keyed on the spot number rather than the spot id, so the layout outlives
+    resizing the lot.
+    """
+    __tablename__ = 'spot_placements'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), primary_key=True)
+    spot_number = db.Column(db.Integer, primary_key=True)
+    # Level or zone, lower ones filled first
+    level = db.Column(db.Integer, nullable=False, default=0)
+    # Walking distance to the entrance within the level, in any unit
+    distance = db.Column(db.Integer, nullable=True)
+
+    def __repr__(self):
+        return f'<SpotPlacement {self.lot_id}/{self.spot_number}>'
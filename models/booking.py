@@ -0,0 +1,28 @@
+from datetime import datetime
+from models.database import db
+
+
+class Booking(db.Model):
+    """A spot held for a future time window; checking in turns it into a Reservation"""
+    __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_spot_start', 'spot_id', 'starts_at'),
+        db.Index('ix_bookings_user_start', 'user_id', 'starts_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    vehicle_number = db.Column(db.String(20), nullable=False)
+    # Half-open window [starts_at, ends_at), UTC
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(1), nullable=False, default='B')  # 'B' booked, 'C' cancelled, 'I' checked in
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    spot = db.relationship('ParkingSpot')
+
+    def __repr__(self):
+        return f'<Booking {self.id} - Spot {self.spot_id}>'
+
@@ -1,3 +1,85 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+
+def database_uri(uri):
+    """Normalize a DATABASE_URL; SQLAlchemy no longer accepts the ``postgres://`` scheme"""
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Server databases get a sized connection pool that pings connections
+    before use and recycles them before the server's idle timeout. SQLite
+    only gets its busy timeout here; its PRAGMAs are set per connection by
+    configure_sqlite.
+    """
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+# Async drivers for the async API engine, by backend
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+
+def async_database_uri(uri):
+    """The DATABASE_URL with the backend's async driver, e.g. sqlite+aiosqlite://"""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver known for {backend}; set ASYNC_DATABASE_URL')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}').render_as_string(hide_password=False)
+
+
+def async_engine_options(config):
+    """Engine options for the async API engine.
+
+    Like engine_options, except that SQLite gets a sized pool too: each
+    aiosqlite connection runs its statements on a thread of its own, so the
+    pool size is how many queries can be in flight at once.
+    """
+    pool = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+    }
+    if make_url(config['ASYNC_DATABASE_URL']).get_backend_name() == 'sqlite':
+        return dict(pool, connect_args={'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000})
+    return dict(pool, pool_recycle=config['DB_POOL_RECYCLE'], pool_pre_ping=config['DB_POOL_PRE_PING'])
+
+
+def configure_sqlite(engine, config):
+    """Apply the SQLITE_* PRAGMAs to every new connection of a SQLite engine.
+
+    WAL lets readers run alongside the single writer instead of waiting on
+    the whole-file lock, and ``synchronous=NORMAL`` is durable under WAL
+    except for the last commits before a power loss.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
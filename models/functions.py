@@ -0,0 +1,69 @@
+from sqlalchemy import Date, Float
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+class hours_between(FunctionElement):
+    """Hours elapsed between two datetime columns, compiled per database dialect"""
+    type = Float()
+    inherit_cache = True
+    name = 'hours_between'
+
+
+@compiles(hours_between)
+def _hours_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f'((julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)})) * 24.0)'
+
+
+@compiles(hours_between, 'postgresql')
+def _hours_between_postgresql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f'(EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - {compiler.process(start, **kw)})) / 3600.0)'
+
+
+@compiles(hours_between, 'mysql')
+def _hours_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f'(TIMESTAMPDIFF(SECOND, {compiler.process(start, **kw)}, {compiler.process(end, **kw)}) / 3600.0)'
+
+
+class day_of(FunctionElement):
+    """Calendar date of a datetime column, for GROUP BY day on any database dialect"""
+    type = Date()
+    inherit_cache = True
+    name = 'day_of'
+
+
+@compiles(day_of)
+def _day_of_default(element, compiler, **kw):
+    return f'CAST({compiler.process(element.clauses, **kw)} AS DATE)'
+
+
+@compiles(day_of, 'sqlite')
+def _day_of_sqlite(element, compiler, **kw):
+    # SQLite has no DATE type; CAST would keep only the leading year digits
+    return f'date({compiler.process(element.clauses, **kw)})'
+
+
+class epoch_seconds(FunctionElement):
+    """Seconds since 1970-01-01 of a naive UTC datetime column, as a float"""
+    type = Float()
+    inherit_cache = True
+    name = 'epoch_seconds'
+
+
+@compiles(epoch_seconds)
+def _epoch_seconds_sqlite(element, compiler, **kw):
+    return f'((julianday({compiler.process(element.clauses, **kw)}) - 2440587.5) * 86400.0)'
+
+
+@compiles(epoch_seconds, 'postgresql')
+def _epoch_seconds_postgresql(element, compiler, **kw):
+    return f'EXTRACT(EPOCH FROM {compiler.process(element.clauses, **kw)})'
+
+
+@compiles(epoch_seconds, 'mysql')
+def _epoch_seconds_mysql(element, compiler, **kw):
+    # UNIX_TIMESTAMP() would apply the session time zone to the naive value
+    return f"(TIMESTAMPDIFF(MICROSECOND, '1970-01-01', {compiler.process(element.clauses, **kw)}) / 1000000.0)"
@@ -0,0 +1,38 @@
+from datetime import datetime
+from models.database import db
+
+
+class JobState(db.Model):
+    """Schedule, lease and progress of one periodic background job (see services.jobs)"""
+    __tablename__ = 'job_states'
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # The worker running the job holds it until lease_until; an expired lease can be taken over
+    lease_owner = db.Column(db.String(100), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    # Where an incremental job resumes, as an encoded keyset cursor
+    cursor = db.Column(db.String(200), nullable=True)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    last_started_at = db.Column(db.DateTime, nullable=True)
+    last_duration_ms = db.Column(db.Float, nullable=True)
+    last_processed = db.Column(db.Integer, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<JobState {self.name}>'
+
+
+class Overstay(db.Model):
+    """An active reservation the overstay sweep found parked longer than OVERSTAY_HOURS"""
+    __tablename__ = 'overstays'
+
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'), primary_key=True)
+    flagged_at = db.Column(db.DateTime, nullable=False)
+    # Set when the sweep released the reservation itself (OVERSTAY_RELEASE_HOURS)
+    released_at = db.Column(db.DateTime, nullable=True)
+
+    reservation = db.relationship('Reservation')
+
+    def __repr__(self):
+        return f'<Overstay {self.reservation_id}>'
@@ -1,13 +1,6 @@
-from datetime import datetime, timedelta
-from pytz import timezone, utc
+from datetime import datetime
 from models.database import db
-
-# Utility function to convert UTC datetime to IST
-def to_ist(utc_dt):
-    if utc_dt is None:
-        return None
-    ist = timezone('Asia/Kolkata')
-    return utc_dt.replace(tzinfo=utc).astimezone(ist)
+from services.timezones import to_local
 
 
 class ParkingLot(db.Model):
@@ -36,12 +29,16 @@ class ParkingLot(db.Model):
         return ParkingSpot.query.filter_by(lot_id=self.id, status='O').count()
 
     @property
-    def created_at_ist(self):
-        return to_ist(self.created_at)
+    def created_at_local(self):
+        return to_local(self.created_at)
 
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spots'
+    __table_args__ = (
+        db.Index('ix_parking_spots_lot_status', 'lot_id', 'status'),
+        db.Index('ix_parking_spots_lot_number', 'lot_id', 'spot_number'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=False)
@@ -56,16 +53,35 @@ class ParkingSpot(db.Model):
         return f'<ParkingSpot {self.id} - Lot {self.lot_id}>'
 
     @property
-    def created_at_ist(self):
-        return to_ist(self.created_at)
+    def created_at_local(self):
+        return to_local(self.created_at)
 
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        db.Index('ix_reservations_user_active', 'user_id', 'is_active'),
+        db.Index('ix_reservations_spot_active', 'spot_id', 'is_active'),
+        db.Index('ix_reservations_user_parking_time', 'user_id', 'parking_time'),
+        db.Index('ix_reservations_parking_time', 'parking_time'),
+        db.Index('ix_reservations_leaving_time', 'leaving_time'),
+        # A lot's reservations in keyset order, for the lot-filtered reservation pages and exports
+        db.Index('ix_reservations_lot_parking_time', 'lot_id', 'parking_time', 'id'),
+        # Only the cars still parked, oldest first, for the overstay sweep
+        db.Index('ix_reservations_active_parking_time', 'parking_time',
+                 sqlite_where=db.text('is_active = 1'), postgresql_where=db.text('is_active')),
+        # At most one active reservation per spot and per user
+        db.Index('uq_reservations_active_spot', 'spot_id', unique=True,
+                 sqlite_where=db.text('is_active = 1'), postgresql_where=db.text('is_active')),
+        db.Index('uq_reservations_active_user', 'user_id', unique=True,
+                 sqlite_where=db.text('is_active = 1'), postgresql_where=db.text('is_active')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Copied from the spot, which never changes lot, so filtering by lot needs no join
+    lot_id = db.Column(db.Integer, nullable=True)
     vehicle_number = db.Column(db.String(20), nullable=False)
     parking_time = db.Column(db.DateTime, default=datetime.utcnow)
     leaving_time = db.Column(db.DateTime, nullable=True)
@@ -76,26 +92,16 @@ class Reservation(db.Model):
         return f'<Reservation {self.id} - Spot {self.spot_id}>'
 
     def calculate_cost(self):
-        """Calculate parking cost based on time spent"""
+        """Calculate parking cost under the lot's current tariff"""
         if self.leaving_time and self.parking_time:
-            from models.parking import ParkingLot, ParkingSpot
-
-            # Get hours spent
-            time_diff = self.leaving_time - self.parking_time
-            hours_spent = time_diff.total_seconds() / 3600
-
-            # Get hourly rate from parking lot
-            spot = ParkingSpot.query.get(self.spot_id)
-            lot = ParkingLot.query.get(spot.lot_id)
-
-            # Calculate and return cost
-            return round(hours_spent * lot.price, 2)
+            from services.billing import price_stay
+            return price_stay(self.parking_spot.parking_lot, self.parking_time, self.leaving_time)
         return 0
 
     @property
-    def parking_time_ist(self):
-        return to_ist(self.parking_time)
+    def parking_time_local(self):
+        return to_local(self.parking_time)
 
     @property
-    def leaving_time_ist(self):
-        return to_ist(self.leaving_time)
\ No newline at end of file
+    def leaving_time_local(self):
+        return to_local(self.leaving_time)
\ No newline at end of file
@@ -0,0 +1,65 @@
+from models.database import db
+
+
+class DailyRevenue(db.Model):
+    """Revenue and completed visits per day of leaving (UTC)"""
+    __tablename__ = 'revenue_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    visits = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyRevenue {self.day}>'
+
+
+class LotDailyRevenue(db.Model):
+    """Revenue and completed visits per parking lot and day of leaving (UTC)"""
+    __tablename__ = 'revenue_lot_daily'
+
+    lot_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    visits = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LotDailyRevenue {self.lot_id} {self.day}>'
+
+
+class UserDailyRevenue(db.Model):
+    """Spending and completed visits per user and day of parking (UTC)"""
+    __tablename__ = 'revenue_user_daily'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    visits = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserDailyRevenue {self.user_id} {self.day}>'
+
+
+class LotOccupancyMonth(db.Model):
+    """One lot's occupancy over one local month (DISPLAY_TIMEZONE), in hourly buckets.
+
+    Each column packs its values for every day of the month, little-endian
+    (see services.occupancy_series); months in which no car was parked have
+    no row.
+    """
+    __tablename__ = 'occupancy_lot_monthly'
+    __table_args__ = (
+        db.Index('ix_occupancy_lot_monthly_month', 'month'),
+    )
+
+    lot_id = db.Column(db.Integer, primary_key=True)
+    # Local date of the month's first day as days since 1970-01-01
+    month = db.Column(db.Integer, primary_key=True)
+    occupied = db.Column(db.LargeBinary, nullable=False)  # float32 spot-seconds occupied per hour
+    peak = db.Column(db.LargeBinary, nullable=False)  # int32 most cars parked at once per hour
+    arrivals = db.Column(db.LargeBinary, nullable=False)  # int32 cars arriving per hour
+    # Stays that ended each day and their total length
+    stays = db.Column(db.LargeBinary, nullable=False)  # int32 per day
+    dwell = db.Column(db.LargeBinary, nullable=False)  # float64 seconds per day
+
+    def __repr__(self):
+        return f'<LotOccupancyMonth {self.lot_id} {self.month}>'
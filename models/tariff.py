@@ -0,0 +1,20 @@
+from models.database import db
+
+
+class LotTariff(db.Model):
+    """Pricing rules on top of a lot's hourly price; lots without a row are billed per exact minute"""
+    __tablename__ = 'lot_tariffs'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), primary_key=True)
+    # Bill in whole increments of this many minutes, rounding up (0 = exact)
+    increment_minutes = db.Column(db.Integer, nullable=False, default=0)
+    minimum_charge = db.Column(db.Float, nullable=False, default=0)
+    # Most a stay can cost per started 24 hours
+    daily_cap = db.Column(db.Float, nullable=True)
+    # Hourly price between peak_start and peak_end (local time; may wrap midnight)
+    peak_start = db.Column(db.Time, nullable=True)
+    peak_end = db.Column(db.Time, nullable=True)
+    peak_price = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<LotTariff {self.lot_id}>'
@@ -1,15 +1,8 @@
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
-from pytz import timezone, utc
 from models.database import db
-
-# Utility function to convert UTC to IST
-def to_ist(utc_dt):
-    if utc_dt is None:
-        return None
-    ist = timezone('Asia/Kolkata')
-    return utc_dt.replace(tzinfo=utc).astimezone(ist)
+from services.timezones import to_local
+from services.passwords import passwords
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
@@ -27,17 +20,21 @@ class User(db.Model, UserMixin):
     reservations = db.relationship('Reservation', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True when the stored hash uses other parameters than PASSWORD_HASH_METHOD"""
+        return passwords.needs_rehash(self.password_hash)
         
     def __repr__(self):
         return f'<User {self.email}>'
 
     @property
-    def created_at_ist(self):
-        return to_ist(self.created_at)
+    def created_at_local(self):
+        return to_local(self.created_at)
 
 # Admin creation utility
 def create_admin_user():
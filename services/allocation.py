@@ -0,0 +1,194 @@
+import heapq
+import itertools
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import delete, func, select
+from models.allocation import LotAllocation, SpotPlacement
+from models.database import db
+from models.parking import ParkingSpot, Reservation
+
+# What a strategy may rank a free spot by; level and distance come from
+# spot_placements, last_used (the latest leaving time) only for least_recently_used
+Spot = namedtuple('Spot', 'number level distance last_used', defaults=(0, None, None))
+
+
+class HeapAllocator:
+    """Hands out a lot's free spots in the order of ``rank``, from a lazily pruned heap.
+
+    A spot can be pushed again before its old entry is popped (taken outside
+    ``claim`` and released again), so every entry carries a push number and
+    only a spot's latest one counts. Claims and releases are O(log n).
+    """
+    name = None
+
+    def __init__(self):
+        self._heap = []  # (rank, push, spot_id)
+        self._latest = {}  # spot_id -> push of its current entry
+        self._pushes = itertools.count()
+
+    def rank(self, spot):
+        raise NotImplementedError
+
+    def release_rank(self, spot):
+        return self.rank(spot)
+
+    def add(self, spot_id, spot):
+        """A spot that was free when the lot was loaded"""
+        self._push(self.rank(spot), spot_id)
+
+    def release(self, spot_id, spot):
+        self._push(self.release_rank(spot), spot_id)
+
+    def _push(self, rank, spot_id, heap=None):
+        push = next(self._pushes)
+        self._latest[spot_id] = push
+        heapq.heappush(self._heap if heap is None else heap, (rank, push, spot_id))
+
+    def _pop(self, heap, free, exclude=()):
+        skipped = []
+        try:
+            while heap:
+                entry = heapq.heappop(heap)
+                rank, push, spot_id = entry
+                if spot_id in free and self._latest[spot_id] == push:
+                    if spot_id in exclude:
+                        skipped.append(entry)
+                        continue
+                    return rank, spot_id
+            return None
+        finally:
+            # Excluded spots keep their place for later claims
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+
+    def claim(self, free, exclude=()):
+        """The next spot id out of ``free`` and not in ``exclude`` to hand out, or None"""
+        entry = self._pop(self._heap, free, exclude)
+        return entry[1] if entry else None
+
+
+class LowestNumber(HeapAllocator):
+    """The lowest numbered free spot"""
+    name = 'lowest_number'
+
+    def rank(self, spot):
+        return spot.number
+
+
+class NearestEntrance(HeapAllocator):
+    """The free spot on the lowest level (or zone) nearest the entrance; unplaced spots go by number"""
+    name = 'nearest_entrance'
+
+    def rank(self, spot):
+        return spot.level, spot.number if spot.distance is None else spot.distance, spot.number
+
+
+class LeastRecentlyUsed(HeapAllocator):
+    """The free spot that has been free longest, to spread wear over the whole lot.
+
+    Spots loaded from the database go by their last leaving time (never used
+    first); every later release queues behind all of them, in release order.
+    """
+    name = 'least_recently_used'
+
+    def rank(self, spot):
+        return 0, spot.last_used or datetime.min, spot.number
+
+    def release_rank(self, spot):
+        return (1,)
+
+
+class RoundRobin(HeapAllocator):
+    """The next free spot numbered above the last one handed out, wrapping after the highest.
+
+    Free spots numbered above that cursor wait in one heap and the rest in
+    another; when the first runs dry the second takes its place.
+    """
+    name = 'round_robin'
+
+    def __init__(self):
+        super().__init__()
+        self._behind = []
+        self._cursor = None
+
+    def rank(self, spot):
+        return spot.number
+
+    def _push(self, rank, spot_id, heap=None):
+        behind = self._cursor is not None and rank <= self._cursor
+        super()._push(rank, spot_id, self._behind if behind else self._heap)
+
+    def claim(self, free, exclude=()):
+        entry = self._pop(self._heap, free, exclude)
+        if entry is None and self._behind:
+            # Excluded spots left in the heap are numbered above the cursor, so still ahead after wrapping
+            self._heap, self._behind = self._behind + self._heap, []
+            heapq.heapify(self._heap)
+            entry = self._pop(self._heap, free, exclude)
+        if entry is None:
+            return None
+        self._cursor, spot_id = entry
+        return spot_id
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (LowestNumber, NearestEntrance, LeastRecentlyUsed, RoundRobin)}
+
+DEFAULT_STRATEGY = LowestNumber.name
+
+
+def new_allocator(name=None):
+    return STRATEGIES[name or DEFAULT_STRATEGY]()
+
+
+def load_spots(lot_id=None):
+    """(spot_id, lot_id, status, strategy name or None, Spot) of every spot, or a lot's.
+
+    Last leaving times are only looked up for lots that allocate by least_recently_used.
+    """
+    query = select(
+        ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.status, LotAllocation.strategy, ParkingSpot.spot_number,
+        func.coalesce(SpotPlacement.level, 0), SpotPlacement.distance
+    ).outerjoin(
+        LotAllocation, LotAllocation.lot_id == ParkingSpot.lot_id
+    ).outerjoin(
+        SpotPlacement,
+        (SpotPlacement.lot_id == ParkingSpot.lot_id) & (SpotPlacement.spot_number == ParkingSpot.spot_number)
+    )
+    if lot_id is not None:
+        query = query.where(ParkingSpot.lot_id == lot_id)
+    rows = db.session.execute(query).all()
+
+    last_used_lots = {lot for _, lot, _, strategy, _, _, _ in rows if strategy == LeastRecentlyUsed.name}
+    last_used = {}
+    if last_used_lots:
+        last_used = dict(db.session.execute(
+            select(Reservation.spot_id, func.max(Reservation.leaving_time))
+            .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+            .where(ParkingSpot.lot_id.in_(last_used_lots))
+            .group_by(Reservation.spot_id)
+        ).all())
+    return [
+        (spot_id, lot, status, strategy if strategy in STRATEGIES else None,
+         Spot(number, level, distance, last_used.get(spot_id)))
+        for spot_id, lot, status, strategy, number, level, distance in rows
+    ]
+
+
+def set_strategy(lot_id, name):
+    """Store a lot's strategy (None for the default); the caller commits and refreshes the lot"""
+    if name is not None and name not in STRATEGIES:
+        raise ValueError(f'Unknown allocation strategy {name!r}; choose from {", ".join(STRATEGIES)}')
+    db.session.execute(delete(LotAllocation).where(LotAllocation.lot_id == lot_id))
+    if name and name != DEFAULT_STRATEGY:
+        db.session.add(LotAllocation(lot_id=lot_id, strategy=name))
+
+
+def set_placements(lot_id, placements):
+    """Replace a lot's layout with ``placements``, (spot_number, level, distance) tuples"""
+    db.session.execute(delete(SpotPlacement).where(SpotPlacement.lot_id == lot_id))
+    rows = [
+        {'lot_id': lot_id, 'spot_number': number, 'level': level, 'distance': distance}
+        for number, level, distance in placements
+    ]
+    if rows:
+        db.session.execute(SpotPlacement.__table__.insert(), rows)
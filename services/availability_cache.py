@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot
+from services.occupancy import occupancy_index
+
+# Response formats of /api/available-spots/<lot_id>
+FORMATS = ('full', 'counts', 'rle')
+
+
+def _run_lengths(numbers):
+    """Collapse sorted spot numbers into [first, length] runs"""
+    runs = []
+    for number in numbers:
+        if runs and runs[-1][0] + runs[-1][1] == number:
+            runs[-1][1] += 1
+        else:
+            runs.append([number, 1])
+    return runs
+
+
+def availability_query(lot_id, fmt='full'):
+    """The free spots of a lot: their count for 'counts', else (id, spot_number) in order"""
+    if fmt == 'counts':
+        return select(func.count()).select_from(ParkingSpot).where(
+            ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A'
+        )
+    return select(ParkingSpot.id, ParkingSpot.spot_number).where(
+        ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A'
+    ).order_by(ParkingSpot.spot_number)
+
+
+def availability_payload(lot, fmt, rows):
+    """Availability payload of a lot from the rows of availability_query()"""
+    payload = {
+        'lot_id': lot.id,
+        'lot_name': lot.name,
+        'price_per_hour': lot.price
+    }
+
+    if fmt == 'counts':
+        payload['total_available'] = rows[0][0]
+        return payload
+
+    payload['total_available'] = len(rows)
+    if fmt == 'rle':
+        payload['available_ranges'] = _run_lengths([spot.spot_number for spot in rows])
+    else:
+        payload['available_spots'] = [{'id': spot.id, 'spot_number': spot.spot_number} for spot in rows]
+    return payload
+
+
+def build_availability(lot_id, fmt='full'):
+    """Availability payload for a lot straight from the database (404 if missing)"""
+    lot = ParkingLot.query.get_or_404(lot_id)
+    return availability_payload(lot, fmt, db.session.execute(availability_query(lot_id, fmt)).all())
+
+
+class AvailabilityCache:
+    """Serialized availability responses per (lot, format) with a short TTL.
+
+    Entries are dropped as soon as this process changes the lot's occupancy;
+    the TTL bounds how long changes made by other workers can go unseen.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def invalidate(self, lot_id=None):
+        with self._lock:
+            self._generation += 1
+            if lot_id is None:
+                self._entries.clear()
+            else:
+                for fmt in FORMATS:
+                    self._entries.pop((lot_id, fmt), None)
+
+    @property
+    def generation(self):
+        """Pass to store() to drop payloads an invalidation overtook while they were built"""
+        return self._generation
+
+    def cached(self, lot_id, fmt='full'):
+        """(body, etag) if a fresh entry exists, else None"""
+        entry = self._entries.get((lot_id, fmt))
+        if entry and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+        return None
+
+    def store(self, lot_id, fmt, payload, generation):
+        """Serialize a payload, cache it unless ``generation`` is stale, and return (body, etag)"""
+        ttl = current_app.config.get('AVAILABILITY_CACHE_TTL', 5)
+        body = current_app.json.dumps(payload).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            # Don't cache a payload that an invalidation may have overtaken while it was built
+            if ttl > 0 and generation == self._generation:
+                self._entries[(lot_id, fmt)] = (time.monotonic() + ttl, body, etag)
+        return body, etag
+
+    def get(self, lot_id, fmt='full'):
+        """Return (body, etag) for a lot, rebuilding it when missing or expired"""
+        entry = self.cached(lot_id, fmt)
+        if entry:
+            return entry
+        generation = self._generation
+        return self.store(lot_id, fmt, build_availability(lot_id, fmt), generation)
+
+
+availability_cache = AvailabilityCache()
+occupancy_index.add_listener(availability_cache.invalidate)
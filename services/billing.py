@@ -0,0 +1,265 @@
+import math
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import bindparam, select, update
+from models.database import db
+from models.functions import epoch_seconds
+from models.parking import ParkingLot, ParkingSpot, Reservation
+from models.tariff import LotTariff
+from services import rollups
+from services.timezones import day_offset, display_zone, to_local
+
+try:
+    import numpy as np
+except ImportError:  # optional; batches are priced in pure Python without it
+    np = None
+
+DAY = 86400
+EPOCH = datetime(1970, 1, 1)
+# Slack for stored timestamps that land a hair past an increment boundary
+INCREMENT_TOLERANCE = 1e-6
+
+
+def to_epoch(value):
+    """Seconds since 1970-01-01 of a naive UTC datetime"""
+    return (value - EPOCH).total_seconds()
+
+
+def _seconds_of_day(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+class Tariff:
+    """How one lot prices a stay.
+
+    With only ``rate`` (the lot's hourly price) a stay costs hours * rate.
+    Optional rules, applied in this order: bill whole ``increment_minutes``
+    rounding up, charge ``peak_rate`` instead for the time spent between
+    ``peak_start`` and ``peak_end`` (local times, the window may wrap
+    midnight), cap at ``daily_cap`` per started 24 hours and never charge
+    less than ``minimum_charge``.
+    """
+
+    def __init__(self, rate, increment_minutes=0, minimum_charge=0, daily_cap=None,
+                 peak_start=None, peak_end=None, peak_rate=None):
+        self.rate = rate
+        self.increment = (increment_minutes or 0) * 60
+        self.minimum_charge = float(minimum_charge or 0)
+        self.daily_cap = daily_cap
+        self.peak = None
+        if peak_start is not None and peak_end is not None and peak_rate is not None and peak_start != peak_end:
+            self.peak = (_seconds_of_day(peak_start), _seconds_of_day(peak_end), peak_rate)
+
+    @classmethod
+    def for_lot(cls, lot, plan=None):
+        if plan is None:
+            return cls(lot.price)
+        return cls(lot.price, plan.increment_minutes, plan.minimum_charge, plan.daily_cap,
+                   plan.peak_start, plan.peak_end, plan.peak_price)
+
+    def price(self, parking_time, leaving_time, zone=None):
+        """Cost of one stay given its naive UTC parking and leaving times"""
+        offset = 0
+        if self.peak:
+            offset = to_local(parking_time, zone or display_zone()).utcoffset().total_seconds()
+        return _price(self, to_epoch(parking_time), to_epoch(leaving_time), offset)
+
+
+def _window_seconds(t, start, end):
+    """Seconds inside the daily window [start, end) between 0 and t (start < end)"""
+    days, rest = divmod(t, DAY)
+    return days * (end - start) + min(max(rest - start, 0), end - start)
+
+
+def _peak_seconds(start, end, peak_start, peak_end):
+    if peak_start < peak_end:
+        return _window_seconds(end, peak_start, peak_end) - _window_seconds(start, peak_start, peak_end)
+    # Wrapping window: everything outside [peak_end, peak_start)
+    return (end - start) - (_window_seconds(end, peak_end, peak_start) - _window_seconds(start, peak_end, peak_start))
+
+
+def _price(tariff, start, end, offset):
+    duration = max(end - start, 0.0)
+    billable = duration
+    if tariff.increment:
+        billable = math.ceil(duration / tariff.increment - INCREMENT_TOLERANCE) * tariff.increment
+    cost = billable / 3600 * tariff.rate
+    if tariff.peak:
+        peak_start, peak_end, peak_rate = tariff.peak
+        local_start = start + offset
+        peak = _peak_seconds(local_start, local_start + duration, peak_start, peak_end)
+        cost += peak / 3600 * (peak_rate - tariff.rate)
+    if tariff.daily_cap is not None:
+        cost = min(cost, tariff.daily_cap * max(1, math.ceil(billable / DAY)))
+    return round(max(cost, tariff.minimum_charge), 2)
+
+
+def _utc_offset_at(start, zone):
+    return datetime.fromtimestamp(start, timezone.utc).astimezone(zone).utcoffset().total_seconds()
+
+
+def _day_offset_seconds(zone, day):
+    """The zone's offset throughout epoch day ``day`` in seconds, or None on a DST change day"""
+    offset = day_offset(zone, (EPOCH + timedelta(days=day)).date())
+    return None if offset is None else offset.total_seconds()
+
+
+def utc_offsets(starts, zone=None):
+    """The display zone's UTC offset (seconds) at each epoch-second value.
+
+    Offsets are looked up once per distinct day; only stays that start on a
+    DST change day are converted one by one.
+    """
+    zone = zone or display_zone()
+    if np is not None:
+        starts = np.asarray(starts, dtype=float)
+        days, inverse = np.unique(np.floor_divide(starts, DAY), return_inverse=True)
+        per_day = [_day_offset_seconds(zone, int(day)) for day in days.tolist()]
+        offsets = np.array([np.nan if offset is None else offset for offset in per_day])[inverse]
+        for position in np.flatnonzero(np.isnan(offsets)).tolist():
+            offsets[position] = _utc_offset_at(float(starts[position]), zone)
+        return offsets.tolist()
+
+    by_day = {}
+    offsets = []
+    for start in starts:
+        day = int(start // DAY)
+        if day not in by_day:
+            by_day[day] = _day_offset_seconds(zone, day)
+        offset = by_day[day]
+        offsets.append(_utc_offset_at(start, zone) if offset is None else offset)
+    return offsets
+
+
+def _price_python(tariffs, lot_ids, starts, ends, offsets):
+    return [_price(tariffs[lot_id], start, end, offset)
+            for lot_id, start, end, offset in zip(lot_ids, starts, ends, offsets)]
+
+
+def _np_window_seconds(t, start, end):
+    days, rest = np.divmod(t, DAY)
+    return days * (end - start) + np.clip(rest - start, 0, end - start)
+
+
+def _price_numpy(tariffs, lot_ids, starts, ends, offsets):
+    keys = np.array(sorted(tariffs))
+    plans = [tariffs[key] for key in keys.tolist()]
+    rate = np.array([plan.rate for plan in plans], dtype=float)
+    increment = np.array([plan.increment for plan in plans], dtype=float)
+    minimum = np.array([plan.minimum_charge for plan in plans], dtype=float)
+    cap = np.array([np.inf if plan.daily_cap is None else plan.daily_cap for plan in plans], dtype=float)
+    peak_start = np.array([plan.peak[0] if plan.peak else 0 for plan in plans], dtype=float)
+    peak_end = np.array([plan.peak[1] if plan.peak else 0 for plan in plans], dtype=float)
+    peak_extra = np.array([plan.peak[2] - plan.rate if plan.peak else 0 for plan in plans], dtype=float)
+
+    # Gather each stay's tariff parameters
+    index = np.searchsorted(keys, np.asarray(lot_ids))
+    rate, increment, minimum, cap = rate[index], increment[index], minimum[index], cap[index]
+    peak_start, peak_end, peak_extra = peak_start[index], peak_end[index], peak_extra[index]
+
+    starts = np.asarray(starts, dtype=float)
+    duration = np.maximum(np.asarray(ends, dtype=float) - starts, 0.0)
+    stepped = increment > 0
+    billable = np.where(
+        stepped,
+        np.ceil(duration / np.where(stepped, increment, 1) - INCREMENT_TOLERANCE) * increment,
+        duration
+    )
+    cost = billable / 3600 * rate
+
+    if peak_extra.any():
+        local_start = starts + np.asarray(offsets, dtype=float)
+        local_end = local_start + duration
+        low, high = np.minimum(peak_start, peak_end), np.maximum(peak_start, peak_end)
+        inside = _np_window_seconds(local_end, low, high) - _np_window_seconds(local_start, low, high)
+        peak = np.where(peak_start < peak_end, inside, duration - inside)
+        cost += peak / 3600 * peak_extra
+
+    cost = np.minimum(cost, cap * np.maximum(1, np.ceil(billable / DAY)))
+    return np.round(np.maximum(cost, minimum), 2)
+
+
+def price_batch(tariffs, lot_ids, starts, ends, offsets=None):
+    """Costs of many stays in one pass, vectorized with NumPy when it is installed.
+
+    ``tariffs`` maps lot id -> Tariff; ``lot_ids``, ``starts`` and ``ends``
+    are parallel sequences (epoch seconds, UTC). ``offsets`` (local UTC
+    offsets in seconds) is only needed when a tariff has peak hours and
+    defaults to the display zone's.
+    """
+    if offsets is None:
+        if any(tariff.peak for tariff in tariffs.values()):
+            offsets = utc_offsets(starts)
+        else:
+            offsets = [0] * len(starts)
+    if np is not None:
+        return _price_numpy(tariffs, lot_ids, starts, ends, offsets).tolist()
+    return _price_python(tariffs, lot_ids, starts, ends, offsets)
+
+
+def tariffs_for_lots(lot_ids=None):
+    """{lot_id: Tariff} for the given lots (all lots by default), two queries"""
+    lots = ParkingLot.query
+    plans = LotTariff.query
+    if lot_ids is not None:
+        lots = lots.filter(ParkingLot.id.in_(lot_ids))
+        plans = plans.filter(LotTariff.lot_id.in_(lot_ids))
+    plans = {plan.lot_id: plan for plan in plans}
+    return {lot.id: Tariff.for_lot(lot, plans.get(lot.id)) for lot in lots}
+
+
+def price_stay(lot, parking_time, leaving_time):
+    """Cost of one stay in ``lot`` under its current tariff"""
+    return Tariff.for_lot(lot, db.session.get(LotTariff, lot.id)).price(parking_time, leaving_time)
+
+
+def rebill(lot_id=None, since=None, dry_run=False, chunk_size=100_000):
+    """Re-price completed reservations under the current tariffs.
+
+    Reads ids, lots and epoch times in keyset chunks, prices each chunk with
+    price_batch and writes back only the costs that changed, then rebuilds
+    the revenue rollups. Returns (priced, changed).
+    """
+    tariffs = tariffs_for_lots()
+    query = select(
+        Reservation.id, ParkingSpot.lot_id,
+        epoch_seconds(Reservation.parking_time), epoch_seconds(Reservation.leaving_time),
+        Reservation.parking_cost
+    ).join(
+        ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).where(
+        Reservation.leaving_time.isnot(None)
+    ).order_by(Reservation.id).limit(chunk_size)
+    if lot_id is not None:
+        query = query.where(ParkingSpot.lot_id == lot_id)
+    if since is not None:
+        query = query.where(Reservation.leaving_time >= since)
+
+    table = Reservation.__table__
+    write = update(table).where(table.c.id == bindparam('reservation_id')).values(parking_cost=bindparam('cost'))
+    priced = changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(query.where(Reservation.id > last_id)).all()
+        if not rows:
+            break
+        ids, lot_ids, starts, ends, old_costs = zip(*rows)
+        costs = price_batch(tariffs, lot_ids, starts, ends)
+        updates = [
+            {'reservation_id': reservation_id, 'cost': cost}
+            for reservation_id, old, cost in zip(ids, old_costs, costs)
+            if old is None or abs(old - cost) >= 0.005
+        ]
+        if updates and not dry_run:
+            db.session.execute(write, updates)
+        priced += len(rows)
+        changed += len(updates)
+        last_id = ids[-1]
+
+    if dry_run:
+        db.session.rollback()
+    elif changed:
+        # backfill() commits the new costs together with the rebuilt rollups
+        rollups.backfill()
+    else:
+        db.session.commit()
+    return priced, changed
@@ -0,0 +1,326 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import exists, select, update
+from models.booking import Booking
+from models.database import db
+from models.functions import epoch_seconds
+from models.parking import ParkingSpot, Reservation
+from services.occupancy import allocate_spot
+
+EPOCH = datetime(1970, 1, 1)
+
+MAX_BOOKING_ATTEMPTS = 8
+
+
+class BookingError(ValueError):
+    """Raised for a booking request that cannot be honoured; the message is safe to show to the client"""
+
+
+def upcoming_bookings_query(lot_id, now=None):
+    """(spot_id, start, end, booking id) of the lot's open bookings that have not ended, by spot and start"""
+    # Epoch seconds come from the database, which is much cheaper than parsing datetimes;
+    # in (spot, start) order every LotSchedule.add appends
+    return (
+        select(Booking.spot_id, epoch_seconds(Booking.starts_at), epoch_seconds(Booking.ends_at), Booking.id)
+        .join(ParkingSpot, ParkingSpot.id == Booking.spot_id)
+        .where(ParkingSpot.lot_id == lot_id, Booking.status == 'B', Booking.ends_at > (now or datetime.utcnow()))
+        .order_by(Booking.spot_id, Booking.starts_at)
+    )
+
+
+def _seconds(value):
+    """A naive UTC datetime as whole seconds since the epoch"""
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+class SpotSchedule:
+    """One spot's booked windows, sorted and non-overlapping, as parallel arrays of epoch seconds"""
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.booking_ids = []
+
+    def conflicts(self, start, end):
+        """True if [start, end) overlaps a booked window, in O(log n)"""
+        # Windows don't overlap, so ends are sorted too: the first window ending after start is the only candidate
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def add(self, start, end, booking_id):
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.booking_ids.insert(i, booking_id)
+
+    def remove(self, booking_id):
+        if booking_id in self.booking_ids:
+            i = self.booking_ids.index(booking_id)
+            del self.starts[i], self.ends[i], self.booking_ids[i]
+
+    def __len__(self):
+        return len(self.booking_ids)
+
+
+class LotSchedule:
+    """The booked windows of every spot of one lot"""
+
+    def __init__(self, spot_ids):
+        self.spot_ids = spot_ids  # in spot number order
+        self.spots = {}  # spot_id -> SpotSchedule, only spots with bookings
+
+    def add(self, spot_id, start, end, booking_id):
+        if spot_id not in self.spots:
+            self.spots[spot_id] = SpotSchedule()
+        self.spots[spot_id].add(start, end, booking_id)
+
+    def remove(self, spot_id, booking_id):
+        schedule = self.spots.get(spot_id)
+        if schedule is not None:
+            schedule.remove(booking_id)
+            if not schedule:
+                del self.spots[spot_id]
+
+    def free_spot_ids(self, start, end, exclude=()):
+        """Ids of the spots free for all of [start, end), in spot number order"""
+        spots = self.spots
+        for spot_id in self.spot_ids:
+            # SpotSchedule.conflicts, inlined: this runs for every spot of the lot
+            schedule = spots.get(spot_id)
+            if schedule is not None:
+                ends = schedule.ends
+                i = bisect_right(ends, start)
+                if i < len(ends) and schedule.starts[i] < end:
+                    continue
+            if spot_id not in exclude:
+                yield spot_id
+
+    def booked_spot_ids(self, start, end):
+        """Ids of the spots with a booked window overlapping [start, end), looking only at spots with bookings"""
+        return {spot_id for spot_id, schedule in self.spots.items() if schedule.conflicts(start, end)}
+
+
+class BookingIndex:
+    """Process-wide in-memory schedule of upcoming bookings per lot.
+
+    Like the occupancy index, it only proposes: ``book`` confirms the spot
+    against the bookings table while holding the spot's row lock, and a
+    conflict the index missed (another worker's booking) reloads the lot.
+    Lots are loaded on first use, with the bookings that have not ended yet.
+    """
+
+    def __init__(self):
+        self._lots = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _load(lot_id):
+        spot_ids = list(db.session.execute(
+            select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id).order_by(ParkingSpot.spot_number)
+        ).scalars())
+        lot = LotSchedule(spot_ids)
+        for spot_id, start, end, booking_id in db.session.execute(upcoming_bookings_query(lot_id)):
+            lot.add(spot_id, round(start), round(end), booking_id)
+        return lot
+
+    def _lot(self, lot_id):
+        with self._lock:
+            lot = self._lots.get(lot_id)
+        if lot is None:
+            lot = self._load(lot_id)
+            with self._lock:
+                lot = self._lots.setdefault(lot_id, lot)
+        return lot
+
+    def refresh_lot(self, lot_id):
+        """Reload a lot, e.g. after its spots changed or another worker booked it"""
+        lot = self._load(lot_id)
+        with self._lock:
+            self._lots[lot_id] = lot
+
+    def drop_lot(self, lot_id):
+        with self._lock:
+            self._lots.pop(lot_id, None)
+
+    def count_free(self, lot_id, starts_at, ends_at):
+        """(spots free for the whole window, spots in the lot)"""
+        lot = self._lot(lot_id)
+        with self._lock:
+            return sum(1 for _ in lot.free_spot_ids(_seconds(starts_at), _seconds(ends_at))), len(lot.spot_ids)
+
+    def first_free(self, lot_id, starts_at, ends_at, exclude=()):
+        """The lowest numbered spot id free for the whole window and not in ``exclude``, or None"""
+        lot = self._lot(lot_id)
+        with self._lock:
+            return next(lot.free_spot_ids(_seconds(starts_at), _seconds(ends_at), exclude), None)
+
+    def booked_spot_ids(self, lot_id, starts_at, ends_at):
+        """Ids of the lot's spots booked for any part of the window"""
+        lot = self._lot(lot_id)
+        with self._lock:
+            return lot.booked_spot_ids(_seconds(starts_at), _seconds(ends_at))
+
+    def add(self, lot_id, booking):
+        """Record a committed booking"""
+        lot = self._lot(lot_id)
+        with self._lock:
+            lot.add(booking.spot_id, _seconds(booking.starts_at), _seconds(booking.ends_at), booking.id)
+
+    def remove(self, lot_id, booking):
+        """Forget a cancelled or checked-in booking"""
+        lot = self._lot(lot_id)
+        with self._lock:
+            lot.remove(booking.spot_id, booking.id)
+
+
+booking_index = BookingIndex()
+
+
+def parse_time(value, name):
+    """An ISO datetime from the client as naive UTC to the minute; naive input is taken as UTC"""
+    try:
+        value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise BookingError(f'{name} must be an ISO datetime (UTC), e.g. 2025-01-31T09:00')
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(second=0, microsecond=0)
+
+
+def check_window(starts_at, ends_at, now=None):
+    """Raise BookingError unless [starts_at, ends_at) is a window that can be booked"""
+    now = now or datetime.utcnow()
+    config = current_app.config
+    if ends_at <= starts_at:
+        raise BookingError('end must be after start')
+    if starts_at < now:
+        raise BookingError('start must be in the future')
+    if starts_at > now + timedelta(days=config['BOOKING_HORIZON_DAYS']):
+        raise BookingError(f'Bookings open {config["BOOKING_HORIZON_DAYS"]} days ahead')
+    if ends_at - starts_at > timedelta(hours=config['BOOKING_MAX_HOURS']):
+        raise BookingError(f'A booking can last at most {config["BOOKING_MAX_HOURS"]} hours')
+
+
+def overlapping(starts_at, ends_at):
+    """Condition for open bookings overlapping [starts_at, ends_at)"""
+    return (Booking.status == 'B') & (Booking.starts_at < ends_at) & (Booking.ends_at > starts_at)
+
+
+def _confirm_spot(spot_id, starts_at, ends_at):
+    """Lock the spot's row and check the bookings table for an overlapping window"""
+    # A no-op UPDATE takes the row (on SQLite, the database) write lock, so
+    # concurrent bookings of the same spot are checked one after the other
+    db.session.execute(
+        update(ParkingSpot).where(ParkingSpot.id == spot_id).values(status=ParkingSpot.status)
+        .execution_options(synchronize_session=False)
+    )
+    return not db.session.query(
+        exists().where(Booking.spot_id == spot_id, overlapping(starts_at, ends_at))
+    ).scalar()
+
+
+def held_spot_ids(lot_id, now=None):
+    """Ids of the lot's spots whose booking is open for check-in or under way, which walk-ins must not take.
+
+    Answered from the booking index, so the cost grows with the lot's booked
+    spots rather than its size; like ``book``, it sees other workers'
+    bookings once the lot is reloaded.
+    """
+    now = now or datetime.utcnow()
+    early = timedelta(minutes=current_app.config['BOOKING_CHECK_IN_MINUTES'])
+    return booking_index.booked_spot_ids(lot_id, now, now + early)
+
+
+def book(user_id, lot_id, starts_at, ends_at, vehicle_number, max_attempts=MAX_BOOKING_ATTEMPTS):
+    """Book the lowest numbered spot of the lot that is free for the whole window.
+
+    Returns the new Booking (flushed, left uncommitted in the caller's
+    transaction; call ``booking_index.add`` after committing), or None if no
+    spot is free. Raises BookingError for an invalid window or one that
+    overlaps another of the user's bookings.
+    """
+    check_window(starts_at, ends_at)
+    if db.session.query(exists().where(Booking.user_id == user_id, overlapping(starts_at, ends_at))).scalar():
+        raise BookingError('You already have a booking during that time')
+
+    tried = set()
+    refreshed = False
+    for _ in range(max_attempts):
+        spot_id = booking_index.first_free(lot_id, starts_at, ends_at, tried)
+        if spot_id is None:
+            if refreshed:
+                return None
+            booking_index.refresh_lot(lot_id)
+            refreshed = True
+            continue
+        tried.add(spot_id)
+        if _confirm_spot(spot_id, starts_at, ends_at):
+            booking = Booking(spot_id=spot_id, user_id=user_id, vehicle_number=vehicle_number,
+                              starts_at=starts_at, ends_at=ends_at)
+            db.session.add(booking)
+            db.session.flush()
+            return booking
+        if not refreshed:
+            booking_index.refresh_lot(lot_id)
+            refreshed = True
+    return None
+
+
+def cancel(booking):
+    """Cancel a booking that has not started; returns False if it was no longer booked"""
+    return bool(Booking.query.filter_by(id=booking.id, status='B').update(
+        {'status': 'C'}, synchronize_session=False
+    ))
+
+
+def check_in(booking, now=None):
+    """Park on the booked spot, or any free spot of the lot if a walk-in still holds it.
+
+    Returns the new Reservation (uncommitted), whose spot the caller marks
+    occupied in the occupancy index after committing. Raises BookingError,
+    after which the caller rolls back, outside the booking's window or when
+    the lot is full.
+    """
+    now = now or datetime.utcnow()
+    early = current_app.config['BOOKING_CHECK_IN_MINUTES']
+    if booking.status != 'B':
+        raise BookingError('This booking is no longer open')
+    if now >= booking.ends_at:
+        raise BookingError('This booking has ended')
+    if now < booking.starts_at - timedelta(minutes=early):
+        raise BookingError(f'Check-in opens {early} minutes before the booking starts')
+    if not Booking.query.filter_by(id=booking.id, status='B').update({'status': 'I'}, synchronize_session=False):
+        raise BookingError('This booking is no longer open')
+
+    spot_id = booking.spot_id
+    claimed = ParkingSpot.query.filter_by(id=spot_id, status='A').update(
+        {'status': 'O'}, synchronize_session=False
+    )
+    if not claimed:
+        lot_id = booking.spot.lot_id
+        spot_id = allocate_spot(lot_id, exclude=held_spot_ids(lot_id, now))
+        if spot_id is None:
+            raise BookingError('The lot is full; your spot is still taken')
+    reservation = Reservation(spot_id=spot_id, user_id=booking.user_id, lot_id=booking.spot.lot_id,
+                              vehicle_number=booking.vehicle_number, parking_time=now)
+    db.session.add(reservation)
+    db.session.flush()
+    Booking.query.filter_by(id=booking.id).update({'reservation_id': reservation.id}, synchronize_session=False)
+    return reservation
+
+
+def serialize(booking):
+    return {
+        'id': booking.id,
+        'lot_id': booking.spot.lot_id,
+        'spot_id': booking.spot_id,
+        'spot_number': booking.spot.spot_number,
+        'vehicle_number': booking.vehicle_number,
+        'start': booking.starts_at.isoformat() + 'Z',
+        'end': booking.ends_at.isoformat() + 'Z',
+        'status': booking.status,
+        'reservation_id': booking.reservation_id,
+    }
@@ -0,0 +1,122 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from sqlalchemy import select
+from models.parking import ParkingSpot, Reservation
+from services.pagination import InvalidCursor, after, decode_cursor, encode_cursor
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_FORMATS = ('ndjson', 'csv')
+# Rows fetched from the cursor and encoded per chunk of the response
+EXPORT_CHUNK_SIZE = 5000
+
+_compact_json = json.JSONEncoder(separators=(',', ':'))
+
+# Keyset pagination order; id breaks ties between equal parking times
+KEY_COLUMNS = (Reservation.parking_time, Reservation.id)
+
+COLUMNS = ('id', 'user_id', 'lot_id', 'spot_id', 'spot_number', 'vehicle_number',
+           'parking_time', 'leaving_time', 'parking_cost', 'is_active')
+
+
+class ExportError(ValueError):
+    """Raised for an invalid filter or cursor; the message is safe to show to the client"""
+
+
+def _parse_date(value, name):
+    try:
+        value = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be an ISO date or datetime (UTC), e.g. 2025-01-31')
+    # Stored times are naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def reservation_query(lot_id=None, user_id=None, since=None, until=None):
+    """Reservation rows ordered by (parking_time, id), with optional filters.
+
+    ``since``/``until`` are ISO strings bounding parking_time (UTC,
+    ``until`` exclusive).
+    """
+    query = select(
+        Reservation.id, Reservation.user_id, ParkingSpot.lot_id, Reservation.spot_id, ParkingSpot.spot_number,
+        Reservation.vehicle_number, Reservation.parking_time, Reservation.leaving_time,
+        Reservation.parking_cost, Reservation.is_active
+    ).join(
+        ParkingSpot, ParkingSpot.id == Reservation.spot_id
+    ).order_by(*KEY_COLUMNS)
+    if lot_id is not None:
+        # Served by ix_reservations_lot_parking_time in key order, so a page reads only its own rows
+        query = query.where(Reservation.lot_id == lot_id)
+    if user_id is not None:
+        query = query.where(Reservation.user_id == user_id)
+    if since:
+        query = query.where(Reservation.parking_time >= _parse_date(since, 'since'))
+    if until:
+        query = query.where(Reservation.parking_time < _parse_date(until, 'until'))
+    return query
+
+
+def _iso(value):
+    return value.isoformat() + 'Z' if value is not None else None
+
+
+def _values(row):
+    """One result row as plain values in COLUMNS order (unpacked, not read by attribute)"""
+    (reservation_id, user_id, lot_id, spot_id, spot_number, vehicle_number,
+     parking_time, leaving_time, parking_cost, is_active) = row
+    return (reservation_id, user_id, lot_id, spot_id, spot_number, vehicle_number,
+            _iso(parking_time), _iso(leaving_time), parking_cost, bool(is_active))
+
+
+def serialize(row):
+    return dict(zip(COLUMNS, _values(row)))
+
+
+def page(connection, query, limit, cursor=None):
+    """(rows as dicts, next cursor or None) for one page of ``query``"""
+    if cursor:
+        try:
+            query = query.where(after(KEY_COLUMNS, decode_cursor(cursor, KEY_COLUMNS)))
+        except InvalidCursor:
+            raise ExportError('Invalid cursor')
+    rows = connection.execute(query.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].parking_time, rows[-1].id])
+    return [serialize(row) for row in rows], next_cursor
+
+
+def _encode_ndjson(rows):
+    encode = _compact_json.encode
+    return ''.join([encode(dict(zip(COLUMNS, _values(row)))) + '\n' for row in rows])
+
+
+def _encode_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        values = _values(row)
+        writer.writerow(values[:-1] + (int(values[-1]),))
+    return buffer.getvalue()
+
+
+def stream_export(engine, query, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the rows of ``query`` encoded as NDJSON or CSV, one chunk at a time.
+
+    Runs on its own connection with a server-side cursor (where the driver
+    has one), so memory stays flat however many rows are exported and no
+    request-scoped session is held while the client downloads.
+    """
+    encode = _encode_ndjson if fmt == 'ndjson' else _encode_csv
+    if fmt == 'csv':
+        yield ','.join(COLUMNS) + '\r\n'
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            yield encode(rows)
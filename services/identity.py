@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from models.database import db
+from models.user import User
+
+
+class UserCache:
+    """Bounded LRU of logged-in users' column values, for flask_login's user_loader.
+
+    A hit rebuilds the User and attaches it to the request's session without
+    a SELECT, so relationships still lazy-load normally. Entries expire after
+    ``USER_CACHE_TTL`` seconds and are dropped whenever this process updates
+    or deletes the user; the TTL bounds how long other workers' profile or
+    password changes can go unseen. ``USER_CACHE_SIZE = 0`` disables caching.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # user_id -> (expires, values)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _columns():
+        return [attr.key for attr in inspect(User).column_attrs]
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def load(self, user_id):
+        """The User with this id attached to the current session, or None"""
+        size = current_app.config.get('USER_CACHE_SIZE', 1024)
+        if size <= 0:
+            return db.session.get(User, user_id)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                values = entry[1]
+            else:
+                self.misses += 1
+                values = None
+            generation = self._generation
+
+        if values is not None:
+            existing = db.session.identity_map.get(db.session.identity_key(User, user_id))
+            if existing is not None:
+                return existing
+            user = User(**values)
+            make_transient_to_detached(user)
+            db.session.add(user)
+            return user
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        values = {key: getattr(user, key) for key in self._columns()}
+        ttl = current_app.config.get('USER_CACHE_TTL', 300)
+        with self._lock:
+            # Don't cache a row that an update may have overtaken while it was read
+            if generation == self._generation:
+                self._entries[user_id] = (now + ttl, values)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return user
+
+    def peek(self, user_id):
+        """A cached user's column values, or None; never touches the database"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry or entry[0] <= now:
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, user):
+    user_cache.invalidate(user.id)
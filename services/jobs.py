@@ -0,0 +1,239 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from models.database import db
+from models.jobs import JobState
+
+
+class Job:
+    """A periodic job: ``fn(run)`` does one pass and returns True if it stopped before catching up"""
+
+    def __init__(self, name, fn, interval_key):
+        self.name = name
+        self.fn = fn
+        self.interval_key = interval_key  # config key holding the seconds between runs
+
+
+class JobStats:
+    """Running totals of one job's runs in this worker"""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.processed = 0
+        self.duration = 0.0
+        self.last_duration = 0.0
+
+
+class JobRun:
+    """One run of a job: its clock, the cursor it resumes from and a way to save progress"""
+
+    def __init__(self, name, owner, now, cursor):
+        self.name = name
+        self.owner = owner
+        self.now = now
+        self.cursor = cursor
+        self.processed = 0
+        self._started = time.monotonic()
+        self._deadline = self._started + current_app.config['JOBS_RUN_SECONDS']
+
+    def checkpoint(self, cursor=None, processed=0):
+        """Commit the current batch together with the job's new cursor and a renewed lease.
+
+        Returns False once the run has used up JOBS_RUN_SECONDS; the job then
+        stops and the runner schedules the rest for its next poll.
+        """
+        self.processed += processed
+        if cursor is not None:
+            self.cursor = cursor
+        elapsed = time.monotonic() - self._started
+        db.session.execute(
+            update(JobState).where(JobState.name == self.name, JobState.lease_owner == self.owner)
+            .values(cursor=self.cursor, lease_until=self.now + timedelta(
+                seconds=elapsed + current_app.config['JOBS_LEASE_SECONDS']))
+        )
+        db.session.commit()
+        return time.monotonic() < self._deadline
+
+
+class JobRunner:
+    """In-process scheduler for the periodic background jobs (JOBS_ENABLED).
+
+    Each worker that enables it polls the job_states table every
+    JOBS_POLL_SECONDS from a daemon thread. A due job runs in whichever
+    worker first takes its lease with a conditional UPDATE, so every run
+    happens once across workers, and the job of a worker that died is taken
+    over when its lease (JOBS_LEASE_SECONDS) runs out. Jobs commit each
+    batch with their cursor, so an interrupted run resumes where it stopped.
+    Run counts and timings are kept per worker, like the request metrics.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self.app = None
+        self.enabled = False
+
+    def register(self, name, fn, interval_key):
+        self._jobs[name] = Job(name, fn, interval_key)
+
+    @property
+    def jobs(self):
+        return list(self._jobs)
+
+    def init_app(self, app):
+        if not app.config.get('JOBS_ENABLED'):
+            return
+        self.enabled = True
+        self.app = app
+        # Started on a worker's first request, so a forking server runs one per worker and none in its master
+        app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._thread_pid != os.getpid():
+            self.start()
+
+    def start(self):
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, args=(self.app,), name='job-runner', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self, app):
+        """Poll for due jobs until ``stop``; also the loop of ``flask jobs worker``"""
+        while not self._stop.wait(app.config['JOBS_POLL_SECONDS']):
+            with app.app_context():
+                try:
+                    self.run_due()
+                except Exception:
+                    app.logger.exception('Background job poll failed')
+                finally:
+                    db.session.remove()
+
+    def run_due(self, now=None):
+        """Run every job that is due and not leased elsewhere; returns the results of those that ran"""
+        results = []
+        for name in self._jobs:
+            result = self.run(name, now)
+            if result is not None:
+                results.append(result)
+        return results
+
+    @staticmethod
+    def _owner():
+        return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+    def _ensure_state(self, name, now):
+        if db.session.get(JobState, name) is None:
+            db.session.add(JobState(name=name, next_run_at=now))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another worker created it first
+                db.session.rollback()
+
+    def run(self, name, now=None, force=False):
+        """Run a job if it is due (any time with ``force``) and nobody holds its lease.
+
+        Returns a dict of what the run did, or None if it did not run.
+        ``now`` is the run's clock, also used for its schedule and lease.
+        """
+        job = self._jobs[name]
+        now = now or datetime.utcnow()
+        config = current_app.config
+        owner = self._owner()
+        self._ensure_state(name, now)
+
+        claim = update(JobState).where(
+            JobState.name == name,
+            or_(JobState.lease_until.is_(None), JobState.lease_until < now)
+        ).values(lease_owner=owner, lease_until=now + timedelta(seconds=config['JOBS_LEASE_SECONDS']))
+        if not force:
+            claim = claim.where(JobState.next_run_at <= now)
+        claimed = db.session.execute(claim).rowcount
+        db.session.commit()
+        if not claimed:
+            return None
+
+        cursor = db.session.scalar(select(JobState.cursor).where(JobState.name == name))
+        run = JobRun(name, owner, now, cursor)
+        started = time.perf_counter()
+        error = None
+        more = False
+        try:
+            more = bool(job.fn(run))
+            db.session.commit()
+        except Exception as exc:
+            # Batches checkpointed before the failure stay committed
+            db.session.rollback()
+            error = f'{type(exc).__name__}: {exc}'
+            current_app.logger.exception('Background job %s failed', name)
+        duration = time.perf_counter() - started
+
+        # Not caught up: run again on the next poll instead of waiting a whole interval
+        next_run_at = now if more else now + timedelta(seconds=config[job.interval_key])
+        db.session.execute(
+            update(JobState).where(JobState.name == name, JobState.lease_owner == owner).values(
+                lease_owner=None, lease_until=None, next_run_at=next_run_at, runs=JobState.runs + 1,
+                last_started_at=now, last_duration_ms=duration * 1000, last_processed=run.processed,
+                last_error=error
+            )
+        )
+        db.session.commit()
+
+        with self._lock:
+            stats = self._stats.setdefault(name, JobStats())
+            stats.runs += 1
+            stats.failures += error is not None
+            stats.processed += run.processed
+            stats.duration += duration
+            stats.last_duration = duration
+        return {'name': name, 'processed': run.processed, 'duration_ms': duration * 1000,
+                'more': more, 'error': error}
+
+    def reset(self, name):
+        """Forget a job's cursor, so its next run starts over; the caller commits"""
+        db.session.execute(update(JobState).where(JobState.name == name).values(cursor=None))
+
+    def states(self):
+        """Every registered job's JobState (None before its first run), by name"""
+        rows = {state.name: state for state in JobState.query.filter(JobState.name.in_(self._jobs))}
+        return {name: rows.get(name) for name in self._jobs}
+
+    def prometheus(self):
+        """This worker's job counters in the Prometheus text exposition format"""
+        with self._lock:
+            jobs = sorted(self._stats.items())
+            lines = []
+            for name, help_text, kind, attribute in (
+                ('parking_job_runs_total', 'Background job runs.', 'counter', 'runs'),
+                ('parking_job_failures_total', 'Background job runs that raised.', 'counter', 'failures'),
+                ('parking_job_processed_total', 'Items handled by background jobs.', 'counter', 'processed'),
+                ('parking_job_duration_seconds_total', 'Time spent running background jobs.', 'counter', 'duration'),
+                ('parking_job_last_duration_seconds', 'Duration of the latest run.', 'gauge', 'last_duration'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for job, stats in jobs:
+                    value = getattr(stats, attribute)
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{job="{job}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+job_runner = JobRunner()
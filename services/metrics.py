@@ -0,0 +1,290 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from flask import before_render_template, request, template_rendered
+from sqlalchemy import event
+
+# Request duration histogram buckets in seconds (Prometheus' defaults)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Deepest stack kept per profile sample
+MAX_STACK_DEPTH = 48
+
+
+class EndpointStats:
+    """Running totals for one endpoint"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.slow = 0
+        self.duration = 0.0
+        self.max_duration = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.sql_statements = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+    def add(self, state, duration, status, slow):
+        self.requests += 1
+        self.errors += status >= 500
+        self.slow += slow
+        self.duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        index = bisect.bisect_left(BUCKETS, duration)
+        if index < len(BUCKETS):
+            self.buckets[index] += 1
+        self.sql_statements += state.sql_statements
+        self.sql_time += state.sql_time
+        self.template_time += state.template_time
+
+    def as_dict(self, endpoint):
+        requests = self.requests or 1
+        return {
+            'endpoint': endpoint,
+            'requests': self.requests,
+            'errors': self.errors,
+            'slow': self.slow,
+            'avg_ms': self.duration / requests * 1000,
+            'max_ms': self.max_duration * 1000,
+            'total_s': self.duration,
+            'sql_per_request': self.sql_statements / requests,
+            'sql_ms_per_request': self.sql_time / requests * 1000,
+            'template_ms_per_request': self.template_time / requests * 1000,
+        }
+
+
+class RequestState:
+    """What one in-flight request has done so far"""
+
+    __slots__ = ('started', 'thread_id', 'sql_statements', 'sql_time', 'sql_started',
+                 'template_time', 'template_started', 'template_depth', 'samples')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.thread_id = threading.get_ident()
+        self.sql_statements = 0
+        self.sql_time = 0.0
+        self.sql_started = 0.0
+        self.template_time = 0.0
+        self.template_started = 0.0
+        self.template_depth = 0
+        self.samples = None
+
+
+class RequestMetrics:
+    """Opt-in per-request timing, SQL and template instrumentation (METRICS_ENABLED).
+
+    Records per-endpoint wall time, SQL statement count and time, template
+    render time and, for requests slower than METRICS_SLOW_MS, stack samples
+    taken every METRICS_SAMPLE_INTERVAL_MS by a background thread. Like the
+    other caches and indexes the numbers are per worker process. When
+    disabled no hooks are installed at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._endpoints = {}
+        self._in_flight = {}
+        self._outliers = deque(maxlen=20)
+        self._sampler = None
+        self._sampler_pid = None
+        self.enabled = False
+        self.slow_after = 0.5
+        self.sample_interval = 0.005
+        self.started_at = time.time()
+
+    def init_app(self, app, engine):
+        if not app.config.get('METRICS_ENABLED'):
+            return
+        self.enabled = True
+        self.slow_after = app.config.get('METRICS_SLOW_MS', 500) / 1000
+        self.sample_interval = app.config.get('METRICS_SAMPLE_INTERVAL_MS', 5) / 1000
+        self._outliers = deque(self._outliers, maxlen=app.config.get('METRICS_OUTLIERS', 20))
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._after_render, app, weak=False)
+
+    # Request hooks
+
+    def _before_request(self):
+        state = RequestState()
+        self._local.state = state
+        self._local.status = 500
+        if self._sampler_pid != os.getpid():
+            self._start_sampler()
+        with self._lock:
+            self._in_flight[state.thread_id] = state
+
+    def _after_request(self, response):
+        self._local.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            return
+        self._local.state = None
+        duration = time.perf_counter() - state.started
+        endpoint = request.endpoint or 'unmatched'
+        slow = duration >= self.slow_after
+        with self._lock:
+            self._in_flight.pop(state.thread_id, None)
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.add(state, duration, self._local.status, slow)
+            if slow:
+                self._outliers.append(self._outlier(state, endpoint, duration))
+
+    def _outlier(self, state, endpoint, duration):
+        samples = state.samples or Counter()
+        return {
+            'endpoint': endpoint,
+            'path': request.full_path.rstrip('?'),
+            'at': time.time(),
+            'duration_ms': duration * 1000,
+            'sql_statements': state.sql_statements,
+            'sql_ms': state.sql_time * 1000,
+            'template_ms': state.template_time * 1000,
+            'samples': sum(samples.values()),
+            'stacks': samples.most_common(10),
+        }
+
+    # SQLAlchemy engine events
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            state.sql_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            state.sql_statements += 1
+            state.sql_time += time.perf_counter() - state.sql_started
+
+    # Template signals; {% include %} and {% extends %} render inside the outer template
+
+    def _before_render(self, sender, template, context, **extra):
+        state = getattr(self._local, 'state', None)
+        if state is not None:
+            if not state.template_depth:
+                state.template_started = time.perf_counter()
+            state.template_depth += 1
+
+    def _after_render(self, sender, template, context, **extra):
+        state = getattr(self._local, 'state', None)
+        if state is not None and state.template_depth:
+            state.template_depth -= 1
+            if not state.template_depth:
+                state.template_time += time.perf_counter() - state.template_started
+
+    # Stack sampling of slow in-flight requests
+
+    def _start_sampler(self):
+        with self._lock:
+            if self._sampler_pid == os.getpid():
+                return
+            # A forked worker inherits the flag but not the thread
+            self._sampler_pid = os.getpid()
+            self._sampler = threading.Thread(target=self._sample_forever, name='metrics-sampler', daemon=True)
+            self._sampler.start()
+
+    def _sample_forever(self):
+        # Idle, look for slow requests a few times per threshold; sample only while there are some
+        idle_interval = max(self.sample_interval, min(self.slow_after / 4, 0.25))
+        interval = idle_interval
+        while True:
+            time.sleep(interval)
+            now = time.perf_counter()
+            with self._lock:
+                slow = [state for state in self._in_flight.values() if now - state.started >= self.slow_after]
+            interval = self.sample_interval if slow else idle_interval
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            stacks = [(state, _collapse(frames[state.thread_id])) for state in slow if state.thread_id in frames]
+            del frames
+            # Under the lock so a finishing request never reads its samples mid-update
+            with self._lock:
+                for state, stack in stacks:
+                    if state.samples is None:
+                        state.samples = Counter()
+                    state.samples[stack] += 1
+
+    # Reporting
+
+    def endpoints(self):
+        """Per-endpoint stats as dicts, slowest in total first"""
+        with self._lock:
+            rows = [stats.as_dict(endpoint) for endpoint, stats in self._endpoints.items()]
+        return sorted(rows, key=lambda row: row['total_s'], reverse=True)
+
+    def outliers(self):
+        """The most recent slow requests with their stack samples, newest first"""
+        with self._lock:
+            return list(reversed(self._outliers))
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self._outliers.clear()
+            self.started_at = time.time()
+
+    def prometheus(self):
+        """All counters in the Prometheus text exposition format"""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                '# HELP parking_request_duration_seconds Request wall time by endpoint.',
+                '# TYPE parking_request_duration_seconds histogram',
+            ]
+            for endpoint, stats in endpoints:
+                label = f'endpoint="{_escape(endpoint)}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'parking_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'parking_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats.requests}')
+                lines.append(f'parking_request_duration_seconds_sum{{{label}}} {stats.duration:.6f}')
+                lines.append(f'parking_request_duration_seconds_count{{{label}}} {stats.requests}')
+            for name, help_text, attribute in (
+                ('parking_request_errors_total', 'Requests answered with a 5xx status.', 'errors'),
+                ('parking_slow_requests_total', 'Requests slower than METRICS_SLOW_MS.', 'slow'),
+                ('parking_sql_statements_total', 'SQL statements executed.', 'sql_statements'),
+                ('parking_sql_duration_seconds_total', 'Time spent executing SQL.', 'sql_time'),
+                ('parking_template_render_seconds_total', 'Time spent rendering templates.', 'template_time'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for endpoint, stats in endpoints:
+                    value = getattr(stats, attribute)
+                    value = f'{value:.6f}' if isinstance(value, float) else value
+                    lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _collapse(frame):
+    """A stack as 'file:function;...' from the outermost frame, the flame graph convention"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+request_metrics = RequestMetrics()
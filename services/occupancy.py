@@ -0,0 +1,370 @@
+import os
+import threading
+from sqlalchemy import func, select
+from models.database import db
+from models.parking import ParkingSpot
+from services.allocation import load_spots, new_allocator
+
+
+class LotOccupancy:
+    """Free/occupied spot bookkeeping for a single parking lot"""
+
+    def __init__(self, lot_id, strategy=None):
+        self.lot_id = lot_id
+        self.spots = {}  # spot_id -> Spot
+        self.free = set()
+        self.occupied = set()
+        self.allocator = new_allocator(strategy)
+
+    def add(self, spot_id, spot, status):
+        self.spots[spot_id] = spot
+        if status == 'O':
+            self.occupied.add(spot_id)
+        else:
+            self.free.add(spot_id)
+            self.allocator.add(spot_id, spot)
+
+    def claim(self, exclude=()):
+        """Take the free spot the lot's allocation strategy picks, skipping ``exclude``, or None if there is none"""
+        spot_id = self.allocator.claim(self.free, exclude)
+        if spot_id is not None:
+            self.free.discard(spot_id)
+            self.occupied.add(spot_id)
+        return spot_id
+
+    def release(self, spot_id):
+        if spot_id not in self.spots or spot_id in self.free:
+            return
+        self.occupied.discard(spot_id)
+        self.free.add(spot_id)
+        self.allocator.release(spot_id, self.spots[spot_id])
+
+    def mark_occupied(self, spot_id):
+        if spot_id in self.spots:
+            self.free.discard(spot_id)
+            self.occupied.add(spot_id)
+
+    @property
+    def available(self):
+        return len(self.free)
+
+    @property
+    def total(self):
+        return len(self.spots)
+
+
+# Lots per query when checking the ones that look full against the database
+FULL_LOTS_BATCH_SIZE = 500
+
+
+def lots_with_free_spots(lot_ids):
+    """The ones of ``lot_ids`` with a free spot in the database, from ix_parking_spots_lot_status"""
+    return db.session.scalars(
+        select(ParkingSpot.lot_id).where(ParkingSpot.lot_id.in_(lot_ids), ParkingSpot.status == 'A').distinct()
+    ).all()
+
+
+class OccupancyIndex:
+    """Process-wide in-memory index of free parking spots per lot.
+
+    The database stays the source of truth; the index only decides which spot
+    to hand out and which lots have room, so callers must still confirm the
+    spot in the database and report back through ``release_spot``/``refresh_lot``.
+    """
+
+    def __init__(self):
+        self._lots = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._listeners = []
+        self._reconciler_pid = None
+        self._stop = threading.Event()
+        self.app = None
+
+    def init_app(self, app):
+        """Reconcile each worker's index with the database every OCCUPANCY_RECONCILE_SECONDS (0 disables)"""
+        if not app.config.get('OCCUPANCY_RECONCILE_SECONDS'):
+            return
+        self.app = app
+        # Started on a worker's first request, like the job runner, so a forking server runs one per worker
+        app.before_request(self._ensure_reconciler)
+
+    def _ensure_reconciler(self):
+        if self._reconciler_pid == os.getpid():
+            return
+        with self._lock:
+            if self._reconciler_pid == os.getpid():
+                return
+            self._reconciler_pid = os.getpid()
+            self._stop.clear()
+            threading.Thread(target=self._reconcile_forever, name='occupancy-reconciler', daemon=True).start()
+
+    def _reconcile_forever(self):
+        while not self._stop.wait(self.app.config['OCCUPANCY_RECONCILE_SECONDS']):
+            if not self._loaded:
+                continue
+            with self.app.app_context():
+                try:
+                    self.reconcile()
+                except Exception:
+                    self.app.logger.exception('Occupancy index reconcile failed')
+                finally:
+                    db.session.remove()
+
+    def stop(self):
+        self._stop.set()
+
+    def add_listener(self, callback):
+        """Call ``callback(lot_id)`` whenever a lot's occupancy may have changed.
+
+        ``lot_id`` is None when the whole index was rebuilt.
+        """
+        self._listeners.append(callback)
+
+    def _changed(self, lot_id):
+        for callback in self._listeners:
+            callback(lot_id)
+
+    @staticmethod
+    def _load_lots(lot_id=None):
+        """{lot_id: LotOccupancy} of every lot with spots, or just the one"""
+        lots = {}
+        for spot_id, lot, status, strategy, spot in load_spots(lot_id):
+            if lot not in lots:
+                lots[lot] = LotOccupancy(lot, strategy)
+            lots[lot].add(spot_id, spot, status)
+        return lots
+
+    def warm(self):
+        """(Re)build the whole index from the parking_spots table"""
+        lots = self._load_lots()
+        with self._lock:
+            self._lots = lots
+            self._loaded = True
+        self._changed(None)
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.warm()
+
+    def refresh_lot(self, lot_id):
+        """Reload a single lot, e.g. after it was created, resized, drifted or got a new strategy"""
+        lot = self._load_lots(lot_id).get(lot_id)
+        with self._lock:
+            if lot:
+                self._lots[lot_id] = lot
+            else:
+                self._lots.pop(lot_id, None)
+        self._changed(lot_id)
+
+    def drop_lot(self, lot_id):
+        with self._lock:
+            self._lots.pop(lot_id, None)
+        self._changed(lot_id)
+
+    def claim_spot(self, lot_id, exclude=()):
+        """Take a free spot id not in ``exclude`` out of the index for the given lot"""
+        self.ensure_loaded()
+        with self._lock:
+            lot = self._lots.get(lot_id)
+            spot_id = lot.claim(exclude) if lot else None
+        if spot_id is not None:
+            self._changed(lot_id)
+        return spot_id
+
+    def release_spot(self, lot_id, spot_id):
+        self.ensure_loaded()
+        with self._lock:
+            lot = self._lots.get(lot_id)
+            if lot:
+                lot.release(spot_id)
+        self._changed(lot_id)
+
+    def mark_occupied(self, lot_id, spot_id):
+        """Record a spot as taken; also call after committing a claim to notify listeners"""
+        self.ensure_loaded()
+        with self._lock:
+            lot = self._lots.get(lot_id)
+            if lot:
+                lot.mark_occupied(spot_id)
+        self._changed(lot_id)
+
+    def lot_ids(self):
+        self.ensure_loaded()
+        with self._lock:
+            return list(self._lots)
+
+    def available_lot_ids(self):
+        """Ids of lots that have at least one free spot.
+
+        Lots this worker sees as full are checked against the database first
+        and reloaded if they have a free spot, which happens when another
+        process freed or added one.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            full = [lot_id for lot_id, lot in self._lots.items() if not lot.available]
+        for start in range(0, len(full), FULL_LOTS_BATCH_SIZE):
+            for lot_id in lots_with_free_spots(full[start:start + FULL_LOTS_BATCH_SIZE]):
+                self.refresh_lot(lot_id)
+        with self._lock:
+            return [lot_id for lot_id, lot in self._lots.items() if lot.available]
+
+    def counts(self, lot_id):
+        """Return (available, occupied) for a lot"""
+        self.ensure_loaded()
+        with self._lock:
+            lot = self._lots.get(lot_id)
+            if not lot:
+                return 0, 0
+            return lot.available, len(lot.occupied)
+
+    def snapshot(self):
+        """{lot_id: (available, occupied)} for every lot, taken under one lock"""
+        self.ensure_loaded()
+        with self._lock:
+            return {lot_id: (lot.available, len(lot.occupied)) for lot_id, lot in self._lots.items()}
+
+    def reconcile(self):
+        """Reload the lots whose free and occupied counts differ from the database's; returns their ids.
+
+        One GROUP BY over the spots picks up what other processes changed:
+        spots the overstay sweep released from a job worker, reservations and
+        lot edits served by other workers. A lot whose counts match but whose
+        free spots are different ones is left to check_consistency.
+        """
+        counts = {}
+        for lot_id, status, count in db.session.execute(occupancy_counts_query()):
+            available, occupied = counts.get(lot_id, (0, 0))
+            counts[lot_id] = (available, occupied + count) if status == 'O' else (available + count, occupied)
+        with self._lock:
+            indexed = {lot_id: (lot.available, len(lot.occupied)) for lot_id, lot in self._lots.items()}
+        stale = sorted(lot_id for lot_id in set(counts) | set(indexed) if counts.get(lot_id) != indexed.get(lot_id))
+        for lot_id in stale:
+            self.refresh_lot(lot_id)
+        return stale
+
+    def check_consistency(self, fix=False):
+        """Compare the index against the database and report per-lot drift"""
+        self.ensure_loaded()
+        db_lots = {}
+        for spot_id, lot_id, status, _, _ in load_spots():
+            free, occupied = db_lots.setdefault(lot_id, (set(), set()))
+            (occupied if status == 'O' else free).add(spot_id)
+
+        drift = []
+        with self._lock:
+            for lot_id in sorted(set(db_lots) | set(self._lots)):
+                db_free, db_occupied = db_lots.get(lot_id, (set(), set()))
+                lot = self._lots.get(lot_id)
+                index_free = lot.free if lot else set()
+                index_occupied = lot.occupied if lot else set()
+                if db_free == index_free and db_occupied == index_occupied:
+                    continue
+                drift.append({
+                    'lot_id': lot_id,
+                    'db_available': len(db_free),
+                    'db_occupied': len(db_occupied),
+                    'index_available': len(index_free),
+                    'index_occupied': len(index_occupied),
+                    'missing_spots': sorted((db_free | db_occupied) - (index_free | index_occupied)),
+                    'stale_spots': sorted((index_free | index_occupied) - (db_free | db_occupied)),
+                    'status_mismatch': sorted((db_free & index_occupied) | (db_occupied & index_free)),
+                })
+
+        if fix:
+            for entry in drift:
+                self.refresh_lot(entry['lot_id'])
+        return drift
+
+
+MAX_CLAIM_ATTEMPTS = 8
+
+occupancy_index = OccupancyIndex()
+
+
+def allocate_spot(lot_id, exclude=(), max_attempts=MAX_CLAIM_ATTEMPTS):
+    """Claim a free spot in the lot, other than those in ``exclude``, and mark it occupied with a conditional UPDATE.
+
+    The index proposes a candidate and ``UPDATE ... WHERE status = 'A'`` decides
+    who gets it, so two concurrent requests can never both win the same spot.
+    A lost race or index drift reloads the lot once and retries, up to
+    ``max_attempts`` candidates. Returns the claimed spot id (left uncommitted
+    in the caller's transaction) or None.
+    """
+    refreshed = False
+    for _ in range(max_attempts):
+        spot_id = occupancy_index.claim_spot(lot_id, exclude)
+        if spot_id is None:
+            if refreshed:
+                return None
+            occupancy_index.refresh_lot(lot_id)
+            refreshed = True
+            continue
+        claimed = ParkingSpot.query.filter_by(id=spot_id, status='A').update(
+            {'status': 'O'}, synchronize_session=False
+        )
+        if claimed:
+            return spot_id
+        if not refreshed:
+            occupancy_index.refresh_lot(lot_id)
+            refreshed = True
+    return None
+
+
+class OccupancySummary:
+    """Spot counts per lot and overall, as produced by ``occupancy_summary``"""
+
+    def __init__(self):
+        self.lots = {}
+        self.overall = self._empty()
+
+    @staticmethod
+    def _empty():
+        return {'total': 0, 'available': 0, 'occupied': 0}
+
+    def add(self, lot_id, status, count):
+        lot = self.lots.setdefault(lot_id, self._empty())
+        for counts in (lot, self.overall):
+            counts['total'] += count
+            if status == 'A':
+                counts['available'] += count
+            elif status == 'O':
+                counts['occupied'] += count
+
+    def for_lot(self, lot_id):
+        return self.lots.get(lot_id, self._empty())
+
+
+def occupancy_counts_query():
+    """(lot_id, status, count) for every lot and status, a single GROUP BY"""
+    return select(
+        ParkingSpot.lot_id, ParkingSpot.status, func.count()
+    ).group_by(ParkingSpot.lot_id, ParkingSpot.status)
+
+
+def summary_from_rows(rows):
+    """An OccupancySummary of the rows of occupancy_counts_query()"""
+    summary = OccupancySummary()
+    for lot_id, status, count in rows:
+        summary.add(lot_id, status, count)
+    return summary
+
+
+def occupancy_summary():
+    """Count spots per lot and status with a single GROUP BY query"""
+    return summary_from_rows(db.session.execute(occupancy_counts_query()).all())
+
+
+def indexed_occupancy(lot_ids):
+    """An OccupancySummary of some lots read from this worker's occupancy index.
+
+    Costs the same for a lot of a million spots as for one of ten, where
+    occupancy_summary has to count them.
+    """
+    summary = OccupancySummary()
+    for lot_id in lot_ids:
+        available, occupied = occupancy_index.counts(lot_id)
+        summary.add(lot_id, 'A', available)
+        summary.add(lot_id, 'O', occupied)
+    return summary
@@ -0,0 +1,505 @@
+import calendar
+import sys
+from array import array
+from datetime import date, datetime, time, timedelta, timezone
+from sqlalchemy import delete, func, select
+from models.database import db
+from models.functions import epoch_seconds
+from models.jobs import JobState
+from models.parking import ParkingLot, ParkingSpot, Reservation
+from models.rollup import LotOccupancyMonth
+from services.billing import to_epoch, utc_offsets
+from services.occupancy import indexed_occupancy
+from services.timezones import display_zone
+
+try:
+    import numpy as np
+except ImportError:  # optional; the series are built and read in pure Python without it
+    np = None
+
+HOUR = 3600
+DAY = 86400
+EPOCH_DATE = date(1970, 1, 1)
+JOB_NAME = 'occupancy-series'
+MAX_RANGE_DAYS = 366
+DEFAULT_RANGE_DAYS = 30
+# LotOccupancyMonth's packed columns: (name, array typecode, values per day), in compute()'s order
+COLUMNS = (
+    ('occupied', 'f', 24),
+    ('peak', 'i', 24),
+    ('arrivals', 'i', 24),
+    ('stays', 'i', 1),
+    ('dwell', 'd', 1),
+)
+FORMATS = {name: (typecode, per_day) for name, typecode, per_day in COLUMNS}
+# What the utilization view reads
+UTILIZATION_COLUMNS = ('occupied', 'peak', 'stays', 'dwell')
+DTYPES = {'f': '<f4', 'i': '<i4', 'd': '<f8'}
+ITEM_SIZES = {'f': 4, 'i': 4, 'd': 8}
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+# Packing the buckets
+
+def _pack(values, typecode):
+    """Values as little-endian float32 ('f'), int32 ('i') or float64 ('d') bytes"""
+    if np is not None:
+        return np.asarray(values, dtype=DTYPES[typecode]).tobytes()
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(blob, typecode):
+    values = array(typecode)
+    values.frombytes(blob)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+# Local days: the series is bucketed by the display zone's wall clock
+
+def local_day(value, zone=None):
+    """The local date of a naive UTC datetime, as days since 1970-01-01"""
+    local = value.replace(tzinfo=timezone.utc).astimezone(zone or display_zone())
+    return (local.date() - EPOCH_DATE).days
+
+
+def month_of(day):
+    """The first day of ``day``'s month, and the month's length in days"""
+    first = (EPOCH_DATE + timedelta(days=day)).replace(day=1)
+    return (first - EPOCH_DATE).days, calendar.monthrange(first.year, first.month)[1]
+
+
+def day_start(day, zone=None):
+    """Naive UTC datetime of the local midnight that starts ``day``"""
+    local = datetime.combine(EPOCH_DATE + timedelta(days=day), time.min, zone or display_zone())
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _to_local(seconds):
+    """Epoch seconds (UTC) shifted onto the display zone's wall clock"""
+    offsets = utc_offsets(seconds)
+    if np is not None:
+        return np.asarray(seconds, dtype=float) + np.asarray(offsets, dtype=float)
+    return [value + offset for value, offset in zip(seconds, offsets)]
+
+
+# The sweep line
+
+def _series_numpy(lot_ids, starts, ends, completed, t0, days):
+    """{lot_id: (occupied, peak, arrivals, stays, dwell)} with one array per measure (see ``compute``)"""
+    keys, lot_index = np.unique(np.asarray(lot_ids, dtype=np.int64), return_inverse=True)
+    hours = days * 24
+    span = days * DAY
+    size = len(keys) * hours
+    starts = np.asarray(starts, dtype=float) - t0
+    ends = np.asarray(ends, dtype=float) - t0
+    base = lot_index * hours
+
+    # Stays clipped to the window; the rest only count as arrivals or finished stays
+    s = np.clip(starts, 0, span)
+    e = np.clip(ends, 0, span)
+    inside = e > s
+    b, s, e = base[inside], s[inside], e[inside]
+    first = (s // HOUR).astype(np.int64)
+    last = (e // HOUR).astype(np.int64)  # == hours for a stay running to the end of the window
+
+    # Occupied seconds: the partial first and last hour of each stay, and the
+    # whole hours between them from a difference array (size + 1 buckets: a
+    # stay reaching the window's end closes in the next lot's first bucket,
+    # where the running sum cancels it)
+    same = first == last
+    spans = ~same
+    occupied = np.bincount(b + first, weights=np.where(same, e, (first + 1) * HOUR) - s, minlength=size + 1)
+    occupied += np.bincount(b[spans] + last[spans], weights=e[spans] - last[spans] * HOUR, minlength=size + 1)
+    whole = np.cumsum(np.bincount(b[spans] + first[spans] + 1, minlength=size + 1)
+                      - np.bincount(b[spans] + last[spans], minlength=size + 1))
+    occupied = occupied[:size] + whole[:size] * HOUR
+
+    # Peak: cars parked as each hour starts (start <= hour < end), then the
+    # level after the arrivals and departures inside it, from a sweep over
+    # the events in (lot, time) order
+    from_hour = b + (-(-s // HOUR)).astype(np.int64)
+    to_hour = b + (-(-e // HOUR)).astype(np.int64)
+    peak = np.cumsum(np.bincount(from_hour, minlength=size + 1) - np.bincount(to_hour, minlength=size + 1))[:size]
+    times = np.concatenate([s, e])
+    deltas = np.concatenate([np.ones(len(s), dtype=np.int64), np.full(len(e), -1, dtype=np.int64)])
+    owners = np.concatenate([b, b])
+    order = np.lexsort((deltas, times, owners))
+    level = np.cumsum(deltas[order])
+    times, owners = times[order], owners[order]
+    bucket = owners + (times // HOUR).astype(np.int64)
+    # Only the level once every event at the same instant is in counts
+    settled = np.r_[(times[1:] != times[:-1]) | (owners[1:] != owners[:-1]), True]
+    within = settled & (times < span)
+    bucket, level = bucket[within], level[within]
+    if len(bucket):
+        heads = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        targets = bucket[heads]
+        peak[targets] = np.maximum(peak[targets], np.maximum.reduceat(level, heads))
+
+    arriving = (starts >= 0) & (starts < span)
+    arrivals = np.bincount(base[arriving] + (starts[arriving] // HOUR).astype(np.int64), minlength=size)
+    ended = np.asarray(completed, dtype=bool) & (ends >= 0) & (ends < span)
+    day_index = lot_index[ended] * days + (ends[ended] // DAY).astype(np.int64)
+    stays = np.bincount(day_index, minlength=len(keys) * days)
+    dwell = np.bincount(day_index, weights=ends[ended] - starts[ended], minlength=len(keys) * days)
+
+    shape = (len(keys), hours)
+    occupied, peak, arrivals = occupied.reshape(shape), peak.reshape(shape), arrivals.reshape(shape)
+    stays, dwell = stays.reshape(len(keys), days), dwell.reshape(len(keys), days)
+    return {
+        int(lot_id): (occupied[i], peak[i], arrivals[i], stays[i], dwell[i])
+        for i, lot_id in enumerate(keys.tolist())
+    }
+
+
+def _series_python(lot_ids, starts, ends, completed, t0, days):
+    hours = days * 24
+    span = days * DAY
+    series = {}
+    events = {}
+    for lot_id, start, end, done in zip(lot_ids, starts, ends, completed):
+        start, end = start - t0, end - t0
+        if lot_id not in series:
+            series[lot_id] = ([0.0] * hours, [0] * hours, [0] * hours, [0] * days, [0.0] * days)
+            events[lot_id] = []
+        occupied, _, arrivals, stays, dwell = series[lot_id]
+        if 0 <= start < span:
+            arrivals[int(start // HOUR)] += 1
+        if done and 0 <= end < span:
+            stays[int(end // DAY)] += 1
+            dwell[int(end // DAY)] += end - start
+        s, e = min(max(start, 0), span), min(max(end, 0), span)
+        if e <= s:
+            continue
+        hour = int(s // HOUR)
+        while hour * HOUR < e:
+            occupied[hour] += min(e, (hour + 1) * HOUR) - max(s, hour * HOUR)
+            hour += 1
+        events[lot_id] += [(s, 1), (e, -1)]
+
+    for lot_id, lot_events in events.items():
+        peak = series[lot_id][1]
+        level = hour = 0
+        lot_events.sort()
+        for n, (at, delta) in enumerate(lot_events):
+            # Hours that started before this event began with the current level
+            while hour < hours and hour * HOUR < at:
+                peak[hour] = max(peak[hour], level)
+                hour += 1
+            level += delta
+            # Once every event at the same instant is in
+            if at < span and (n + 1 == len(lot_events) or lot_events[n + 1][0] != at):
+                bucket = int(at // HOUR)
+                peak[bucket] = max(peak[bucket], level)
+    return series
+
+
+def compute(lot_ids, starts, ends, completed, t0, days):
+    """Per-lot hourly occupancy over ``days`` days from ``t0``, from the stays' start and end events.
+
+    ``starts`` and ``ends`` are local epoch seconds, ``t0`` a local midnight.
+    Returns {lot_id: (occupied, peak, arrivals, stays, dwell)}: spot-seconds
+    occupied, most cars parked at once and arrivals per hour (days * 24
+    each), and stays that ended and their total seconds per day. Vectorized
+    with NumPy when it is installed.
+    """
+    if np is not None:
+        return _series_numpy(lot_ids, starts, ends, completed, t0, days)
+    return _series_python(lot_ids, starts, ends, completed, t0, days)
+
+
+def _write_month(month, length, offset, days, series):
+    """Splice ``days`` days of ``series`` into the LotOccupancyMonth rows of ``month`` at day ``offset``.
+
+    Lots missing from ``series`` get zeros for those days; rows left with
+    nothing but zeros are dropped.
+    """
+    names = [name for name, _, _ in COLUMNS]
+    table = LotOccupancyMonth.__table__
+    existing = {row[0]: row[1:] for row in db.session.execute(
+        select(table.c.lot_id, *(table.c[name] for name in names)).where(table.c.month == month)
+    )}
+    rows = []
+    for lot_id in sorted(set(existing) | set(series)):
+        row = {'lot_id': lot_id, 'month': month}
+        for n, (name, typecode, per_day) in enumerate(COLUMNS):
+            width = ITEM_SIZES[typecode] * per_day
+            blob = existing[lot_id][n] if lot_id in existing else bytes(width * length)
+            values = series.get(lot_id)
+            new = _pack(values[n], typecode) if values is not None else bytes(width * days)
+            row[name] = blob[:offset * width] + new + blob[(offset + days) * width:]
+        if any(row[name].strip(b'\0') for name in names):
+            rows.append(row)
+    if existing:
+        db.session.execute(delete(LotOccupancyMonth).where(LotOccupancyMonth.month == month))
+    if rows:
+        db.session.execute(table.insert(), rows)
+
+
+# Building the series
+
+def stays_query(*conditions):
+    """(lot_id, parking epoch seconds, leaving epoch seconds or None) of matching reservations"""
+    return (
+        select(ParkingSpot.lot_id, epoch_seconds(Reservation.parking_time), epoch_seconds(Reservation.leaving_time))
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id).where(*conditions)
+    )
+
+
+def _stays(*conditions):
+    return db.session.execute(stays_query(*conditions)).all()
+
+
+def _commit(day, stays):
+    db.session.commit()
+    return True
+
+
+def update_series(now=None, start_day=None, checkpoint=_commit):
+    """Recompute the occupancy series from local day ``start_day`` through today.
+
+    Starts from the first reservation's day by default. Works through a
+    local month at a time, carrying the stays that run on into the next, and
+    calls ``checkpoint(day, stays)`` after each: ``day`` is where the next
+    update has to start (today is always redone, as cars are still parked),
+    and a False return stops early. Returns True if it stopped.
+    """
+    now = now or datetime.utcnow()
+    zone = display_zone()
+    now_seconds = to_epoch(now)
+    today = local_day(now, zone)
+
+    if start_day is None:
+        first = db.session.scalar(select(func.min(Reservation.parking_time)))
+        if first is None:
+            checkpoint(today, 0)
+            return False
+        start_day = local_day(first, zone)
+        carry = []
+    else:
+        since = day_start(start_day, zone)
+        # Cars parked before the first day and still there at its start, from both indexes
+        carry = (_stays(Reservation.parking_time < since, Reservation.leaving_time > since)
+                 + _stays(Reservation.is_active == True, Reservation.parking_time < since))
+
+    day = start_day
+    while True:
+        month, length = month_of(day)
+        end_day = min(month + length, today + 1)
+        since, until = day_start(day, zone), day_start(end_day, zone)
+        stays = carry + _stays(Reservation.parking_time >= since, Reservation.parking_time < until)
+
+        lot_ids = [lot_id for lot_id, _, _ in stays]
+        starts = _to_local([start for _, start, _ in stays])
+        # Cars still parked count as occupied until now
+        ends = _to_local([now_seconds if end is None else end for _, _, end in stays])
+        completed = [end is not None for _, _, end in stays]
+        series = compute(lot_ids, starts, ends, completed, day * DAY, end_day - day)
+
+        _write_month(month, length, day - month, end_day - day, series)
+
+        until_seconds = to_epoch(until)
+        carry = [stay for stay in stays if stay[2] is None or stay[2] > until_seconds]
+        going_on = checkpoint(min(end_day, today), len(stays))
+        if end_day > today:
+            return False
+        if not going_on:
+            return True
+        day = end_day
+
+
+def update_series_job(run):
+    """The occupancy-series job: fold in what changed since its last run"""
+    start_day = int(run.cursor) if run.cursor else None
+    return update_series(run.now, start_day, lambda day, stays: run.checkpoint(str(day), stays))
+
+
+# Reading it back
+
+def parse_range(since=None, until=None, zone=None):
+    """(first, last) local days from YYYY-MM-DD strings; the last DEFAULT_RANGE_DAYS by default"""
+    try:
+        last = (date.fromisoformat(until) - EPOCH_DATE).days if until else local_day(datetime.utcnow(), zone)
+        first = (date.fromisoformat(since) - EPOCH_DATE).days if since else last - DEFAULT_RANGE_DAYS + 1
+    except ValueError:
+        raise AnalyticsError('since and until must be dates (YYYY-MM-DD)')
+    if first > last:
+        raise AnalyticsError('since must not be after until')
+    if last - first + 1 > MAX_RANGE_DAYS:
+        raise AnalyticsError(f'At most {MAX_RANGE_DAYS} days at a time')
+    return first, last
+
+
+def day_iso(day):
+    """A local day number as YYYY-MM-DD"""
+    return (EPOCH_DATE + timedelta(days=day)).isoformat()
+
+
+def computed_at():
+    """When the series was last brought up to date (naive UTC), or None if it never was"""
+    state = db.session.get(JobState, JOB_NAME)
+    return state.last_started_at if state is not None and state.cursor is not None else None
+
+
+def series_query(first, last, lot_ids, names):
+    """(lot_id, month, blob of each of ``names``) of the months overlapping local days [first, last], by lot"""
+    table = LotOccupancyMonth.__table__
+    query = select(table.c.lot_id, table.c.month, *(table.c[name] for name in names)).where(
+        table.c.month >= month_of(first)[0], table.c.month <= last
+    )
+    if lot_ids is not None:
+        query = query.where(table.c.lot_id.in_(lot_ids))
+    return query.order_by(table.c.lot_id, table.c.month)
+
+
+def _load(first, last, lot_ids, names):
+    return db.session.execute(series_query(first, last, lot_ids, names)).all()
+
+
+def _days(rows, names, first, last):
+    """(lot_id, day, values of each of ``names``) of every stored day in [first, last]"""
+    formats = [FORMATS[name] for name in names]
+    for lot_id, month, *blobs in rows:
+        columns = [(_unpack(blob, typecode), per_day) for blob, (typecode, per_day) in zip(blobs, formats)]
+        length = len(columns[0][0]) // columns[0][1]
+        for offset in range(max(first - month, 0), min(last - month + 1, length)):
+            yield lot_id, month + offset, [values[offset * per_day:(offset + 1) * per_day] for values, per_day in columns]
+
+
+def _aggregate_numpy(rows, first, last):
+    """{lot_id: (weekday x hour occupied seconds, total occupied seconds, peak, (day, hour) of peak, stays, dwell)}"""
+    row_lots = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    months = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    lengths = np.fromiter((len(row[4]) // 4 for row in rows), dtype=np.int64, count=len(rows))
+    # One entry per stored day
+    day_lots = np.repeat(row_lots, lengths)
+    days = np.repeat(months - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    keep = (days >= first) & (days <= last)
+    occupied = np.frombuffer(b''.join(row[2] for row in rows), dtype='<f4').reshape(-1, 24)[keep]
+    peak = np.frombuffer(b''.join(row[3] for row in rows), dtype='<i4').reshape(-1, 24)[keep]
+    stays = np.frombuffer(b''.join(row[4] for row in rows), dtype='<i4')[keep]
+    dwell = np.frombuffer(b''.join(row[5] for row in rows), dtype='<f8')[keep]
+    days = days[keep]
+    if not len(days):
+        return {}
+
+    keys, index = np.unique(day_lots[keep], return_inverse=True)
+    # (1970-01-01 was a Thursday) Monday = 0
+    weekday = (days + 3) % 7
+    cells = ((index * 7 + weekday) * 24)[:, None] + np.arange(24)
+    heatmap = np.bincount(cells.ravel(), weights=occupied.ravel(), minlength=len(keys) * 168).reshape(-1, 7, 24)
+    totals = np.bincount(index, weights=occupied.sum(axis=1), minlength=len(keys))
+
+    # Days come ordered by lot, so each lot is one run of them
+    heads = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    day_peak = peak.max(axis=1)
+    lot_peak = np.maximum.reduceat(day_peak, heads)
+    at_peak = np.flatnonzero(day_peak == lot_peak[index])
+    _, first_days = np.unique(index[at_peak], return_index=True)
+    peak_days = at_peak[first_days]
+    peak_hours = peak[peak_days].argmax(axis=1)
+
+    stays = np.bincount(index, weights=stays, minlength=len(keys))
+    dwell = np.bincount(index, weights=dwell, minlength=len(keys))
+    return {
+        lot_id: (heatmap[i], float(totals[i]), int(lot_peak[i]),
+                 (int(days[peak_days[i]]), int(peak_hours[i])) if lot_peak[i] else None,
+                 int(stays[i]), float(dwell[i]))
+        for i, lot_id in enumerate(keys.tolist())
+    }
+
+
+def _aggregate_python(rows, first, last):
+    aggregates = {}
+    for lot_id, day, (occupied, peak, stays, dwell) in _days(rows, UTILIZATION_COLUMNS, first, last):
+        if lot_id not in aggregates:
+            aggregates[lot_id] = [[[0.0] * 24 for _ in range(7)], 0.0, 0, None, 0, 0.0]
+        lot = aggregates[lot_id]
+        hours = lot[0][(day + 3) % 7]
+        for hour, seconds in enumerate(occupied):
+            hours[hour] += seconds
+            lot[1] += seconds
+        for hour, cars in enumerate(peak):
+            if cars > lot[2]:
+                lot[2], lot[3] = cars, (day, hour)
+        lot[4] += stays[0]
+        lot[5] += dwell[0]
+    return {lot_id: tuple(values) for lot_id, values in aggregates.items()}
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0.0
+
+
+def _heatmap(occupied, spots, weekdays):
+    """Percent occupied per weekday and local hour, from the occupied seconds summed into each"""
+    if occupied is None:
+        return [[0.0] * 24 for _ in range(7)]
+    if np is not None:
+        whole = np.asarray(weekdays, dtype=float)[:, None] * (spots * HOUR)
+        return np.round(np.divide(occupied * 100, whole, out=np.zeros((7, 24)), where=whole > 0), 1).tolist()
+    return [[_percent(occupied[weekday][hour], spots * HOUR * weekdays[weekday]) for hour in range(24)]
+            for weekday in range(7)]
+
+
+def utilization(first, last, lot_ids=None):
+    """Per lot over local days [first, last]: hourly utilization by weekday, peak and average dwell.
+
+    Utilization is occupied spot-hours over the lot's current spot count;
+    the heatmap has a row per weekday (Monday first) of 24 local hours.
+    """
+    rows = _load(first, last, lot_ids, UTILIZATION_COLUMNS)
+    lots = select(ParkingLot.id, ParkingLot.name).order_by(ParkingLot.id)
+    if lot_ids is not None:
+        lots = lots.where(ParkingLot.id.in_(lot_ids))
+    lots = db.session.execute(lots).all()
+    capacity = indexed_occupancy([lot_id for lot_id, _ in lots])
+    aggregates = (_aggregate_numpy if np is not None else _aggregate_python)(rows, first, last) if rows else {}
+
+    days = last - first + 1
+    weekdays = [0] * 7
+    for day in range(first, min(last, first + 6) + 1):
+        weekdays[(day + 3) % 7] = len(range(day, last + 1, 7))
+    result = []
+    for lot_id, name in lots:
+        spots = capacity.for_lot(lot_id)['total']
+        heatmap, occupied, peak, peak_at, stays, dwell = aggregates.get(lot_id, (None, 0.0, 0, None, 0, 0.0))
+        result.append({
+            'lot_id': lot_id,
+            'name': name,
+            'spots': spots,
+            'utilization': _percent(occupied, spots * days * DAY),
+            'peak_occupied': peak,
+            'peak_at': f'{day_iso(peak_at[0])}T{peak_at[1]:02d}:00' if peak_at else None,
+            'stays': stays,
+            'average_dwell_minutes': round(dwell / stays / 60, 1) if stays else None,
+            'heatmap': _heatmap(heatmap, spots, weekdays),
+        })
+    return result
+
+
+def lot_series(lot_id, first, last):
+    """A lot's spot count, and an entry per local day in [first, last] with its hourly utilization, peaks and arrivals"""
+    names = [name for name, _, _ in COLUMNS]
+    stored = {day: values for _, day, values in _days(_load(first, last, [lot_id], names), names, first, last)}
+    spots = indexed_occupancy([lot_id]).for_lot(lot_id)['total']
+    series = []
+    for day in range(first, last + 1):
+        occupied, peak, arrivals, stays, dwell = stored.get(day, ([0.0] * 24, [0] * 24, [0] * 24, [0], [0.0]))
+        series.append({
+            'date': day_iso(day),
+            'utilization': [_percent(seconds, spots * HOUR) for seconds in occupied],
+            'peak': list(peak),
+            'arrivals': list(arrivals),
+            'stays': stays[0],
+            'average_dwell_minutes': round(dwell[0] / stays[0] / 60, 1) if stays[0] else None,
+        })
+    return spots, series
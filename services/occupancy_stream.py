@@ -0,0 +1,101 @@
+import itertools
+import json
+import queue
+import threading
+from services.occupancy import occupancy_index
+
+
+class Subscriber:
+    """One connected stream client with its own bounded event queue"""
+
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = False
+
+    def offer(self, frame):
+        """Queue an encoded event without blocking; a full queue means the client is too slow"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.dropped = True
+            return False
+
+
+class OccupancyPublisher:
+    """Fans occupancy changes out from the occupancy index to stream subscribers.
+
+    Each change is read from the index, so publishing never touches the
+    database, and is encoded into an SSE frame once, however many clients are
+    listening. Subscribers whose queue fills up are dropped rather than slowing
+    down reservations.
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+        self.last_event_id = 0
+
+    def subscribe(self):
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, payload):
+        event_id = next(self._ids)
+        frame = format_event(event_id, payload)
+        self.last_event_id = event_id
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.offer(frame):
+                self.unsubscribe(subscriber)
+                self.dropped += 1
+        self.published += 1
+
+    def on_occupancy_change(self, lot_id):
+        # Skip the work entirely when nobody is listening
+        if not self._subscribers:
+            return
+        lot_ids = occupancy_index.lot_ids() if lot_id is None else [lot_id]
+        for changed_lot_id in lot_ids:
+            available, occupied = occupancy_index.counts(changed_lot_id)
+            self.publish({'lot_id': changed_lot_id, 'available': available, 'occupied': occupied})
+
+
+def format_event(event_id, payload, event='occupancy'):
+    """Encode one server-sent event"""
+    data = json.dumps(payload, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+def event_stream(subscriber, snapshot, heartbeat=15):
+    """Yield SSE frames: a snapshot of every lot, then deltas until the client drops"""
+    try:
+        yield format_event(0, snapshot, event='snapshot')
+        while not subscriber.dropped:
+            try:
+                frame = subscriber.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield frame
+    finally:
+        occupancy_publisher.unsubscribe(subscriber)
+
+
+occupancy_publisher = OccupancyPublisher()
+occupancy_index.add_listener(occupancy_publisher.on_occupancy_change)
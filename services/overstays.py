@@ -0,0 +1,110 @@
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from models.database import db
+from models.jobs import Overstay
+from models.parking import ParkingSpot, Reservation
+from services.billing import tariffs_for_lots
+from services.occupancy import occupancy_index
+from services.pagination import after, decode_cursor, encode_cursor
+from services.reservations import close_reservation
+from services.rollups import record_releases
+
+# Active reservations in the order of ix_reservations_active_parking_time
+SWEEP_ORDER = (Reservation.parking_time, Reservation.id)
+
+
+def _parked_before(cutoff):
+    """Conditions for active reservations parked before ``cutoff``, which the partial index serves"""
+    return (
+        Reservation.is_active == True,
+        Reservation.parking_time < cutoff,
+    )
+
+
+def flag_batch(cutoff, now, position, batch_size):
+    """Flag up to ``batch_size`` active reservations parked before ``cutoff`` that come after ``position``.
+
+    Returns (reservations read, the last one's position or None).
+    """
+    query = select(*SWEEP_ORDER).where(*_parked_before(cutoff))
+    if position is not None:
+        query = query.where(after(SWEEP_ORDER, position))
+    rows = db.session.execute(query.order_by(*SWEEP_ORDER).limit(batch_size)).all()
+    if not rows:
+        return 0, None
+    ids = [reservation_id for _, reservation_id in rows]
+    # Only rows flagged before a reset of the cursor can exist already
+    flagged = set(db.session.scalars(select(Overstay.reservation_id).where(Overstay.reservation_id.in_(ids))))
+    new = [{'reservation_id': reservation_id, 'flagged_at': now} for reservation_id in ids if reservation_id not in flagged]
+    if new:
+        db.session.execute(Overstay.__table__.insert(), new)
+    return len(rows), tuple(rows[-1])
+
+
+def release_batch(cutoff, now, batch_size):
+    """Release up to ``batch_size`` active reservations parked before ``cutoff``, billed up to ``now``.
+
+    Released reservations leave the partial index, so every batch reads its
+    head. Returns (reservations read, (lot_id, spot_id) of the spots freed).
+    """
+    rows = db.session.execute(
+        select(Reservation.id, Reservation.user_id, Reservation.spot_id, ParkingSpot.lot_id, Reservation.parking_time)
+        .join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)
+        .where(*_parked_before(cutoff)).order_by(*SWEEP_ORDER).limit(batch_size)
+    ).all()
+    tariffs = tariffs_for_lots({lot_id for _, _, _, lot_id, _ in rows}) if rows else {}
+    freed, visits, released = [], [], []
+    for reservation_id, user_id, spot_id, lot_id, parking_time in rows:
+        cost = tariffs[lot_id].price(parking_time, now)
+        if close_reservation(reservation_id, user_id, spot_id, lot_id, parking_time, now, cost, rollups=False):
+            freed.append((lot_id, spot_id))
+            visits.append((user_id, lot_id, parking_time, now, cost))
+            released.append(reservation_id)
+    if released:
+        record_releases(visits)
+        db.session.execute(
+            update(Overstay).where(Overstay.reservation_id.in_(released)).values(released_at=now)
+        )
+    return len(rows), freed
+
+
+def sweep_overstays(run):
+    """The overstay-sweep job: flag reservations parked past OVERSTAY_HOURS, then release those past OVERSTAY_RELEASE_HOURS.
+
+    Flagging resumes after the (parking_time, id) of the last reservation it
+    flagged, kept as the job's cursor, and releasing only ever reads the head
+    of the active reservations, so a sweep reads the reservations that became
+    overdue since the previous one rather than every parked car. Each batch of
+    OVERSTAY_BATCH_SIZE commits on its own. Returns True if the run's time
+    budget ran out first.
+    """
+    config = current_app.config
+    batch_size = config['OVERSTAY_BATCH_SIZE']
+    position = decode_cursor(run.cursor, SWEEP_ORDER) if run.cursor else None
+
+    cutoff = run.now - timedelta(hours=config['OVERSTAY_HOURS'])
+    while True:
+        read, last = flag_batch(cutoff, run.now, position, batch_size)
+        if last is not None:
+            position = last
+        in_time = run.checkpoint(encode_cursor(position) if last is not None else None, read)
+        if read < batch_size:
+            break
+        if not in_time:
+            return True
+
+    release_hours = config['OVERSTAY_RELEASE_HOURS']
+    if not release_hours:
+        return False
+    # Never release a reservation before it could have been flagged
+    cutoff = run.now - timedelta(hours=max(release_hours, config['OVERSTAY_HOURS']))
+    while True:
+        read, freed = release_batch(cutoff, run.now, batch_size)
+        in_time = run.checkpoint(processed=len(freed))
+        for lot_id, spot_id in freed:
+            occupancy_index.release_spot(lot_id, spot_id)
+        if read < batch_size:
+            return False
+        if not in_time:
+            return True
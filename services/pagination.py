@@ -0,0 +1,142 @@
+import base64
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import DateTime, and_, func, literal_column, or_, select, text
+from models.database import db
+
+TOTAL_MODES = ('approximate', 'exact', 'none')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """An opaque, URL-safe cursor for a row's sort key values"""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """The sort key values encoded in ``cursor``, typed like ``columns``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor('Invalid cursor')
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def after(columns, values, descending=False):
+    """Rows strictly after ``values`` in ``columns`` order (a row-value comparison spelled out with AND/OR)"""
+    clauses = []
+    for i, column in enumerate(columns):
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], beyond))
+    if len(columns) == 1:
+        return clauses[0]
+    # The redundant bound on the leading column lets the planner seek the index instead of filtering the OR
+    leading = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    return and_(leading, or_(*clauses))
+
+
+def estimated_rows(model):
+    """A cheap estimate of a table's row count from the database's own statistics.
+
+    PostgreSQL and MySQL keep one per table; on SQLite the largest rowid is
+    used, which is exact until rows are deleted. Falls back to COUNT(*).
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    estimate = None
+    if dialect == 'postgresql':
+        estimate = db.session.scalar(text('SELECT reltuples FROM pg_class WHERE oid = CAST(:name AS regclass)'),
+                                     {'name': table.name})
+        # -1 until the table is first vacuumed or analyzed
+        if estimate is not None and estimate < 0:
+            estimate = None
+    elif dialect == 'mysql':
+        estimate = db.session.scalar(text(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name'
+        ), {'name': table.name})
+    elif dialect == 'sqlite':
+        estimate = db.session.scalar(select(func.max(literal_column('rowid'))).select_from(table)) or 0
+    if estimate is None:
+        estimate = db.session.scalar(select(func.count()).select_from(table))
+    return int(estimate)
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing.
+
+    Links carry ``after``/``before`` cursors instead of page numbers, so
+    every page costs one indexed range scan however deep it is. ``total``
+    is None when totals are switched off; ``approximate`` says whether it
+    came from an estimate rather than COUNT.
+    """
+
+    def __init__(self, items, per_page, next_cursor, prev_cursor, total=None, approximate=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.approximate = approximate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_page(query, columns, per_page, after_cursor=None, before_cursor=None, descending=False,
+                estimate=None):
+    """A KeysetPage of ``query`` (a Model.query; its own ordering is replaced) in ``columns`` order.
+
+    ``columns`` must end in a unique column. Pass the previous page's
+    next_cursor as ``after_cursor`` or prev_cursor as ``before_cursor``.
+    ``estimate`` is a callable giving an approximate total; which total is
+    shown (if any) follows the LISTING_TOTALS setting.
+    """
+    total, approximate = _total(query, estimate)
+    backwards = before_cursor is not None
+    cursor = before_cursor if backwards else after_cursor
+    # Walking back means reading the reversed order and flipping the result
+    reverse = descending != backwards
+    if cursor:
+        query = query.filter(after(columns, decode_cursor(cursor, columns), reverse))
+    query = query.order_by(None).order_by(*[column.desc() if reverse else column.asc() for column in columns])
+    items = query.limit(per_page + 1).all()
+    more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    def key(item):
+        return encode_cursor([getattr(item, column.key) for column in columns])
+
+    next_cursor = prev_cursor = None
+    if items:
+        if more or backwards:
+            next_cursor = key(items[-1])
+        if (more and backwards) or (cursor and not backwards):
+            prev_cursor = key(items[0])
+    return KeysetPage(items, per_page, next_cursor, prev_cursor, total, approximate)
+
+
+def _total(query, estimate):
+    mode = current_app.config.get('LISTING_TOTALS', 'approximate')
+    if mode == 'none':
+        return None, False
+    if mode == 'approximate' and estimate is not None:
+        return estimate(), True
+    return query.order_by(None).count(), False
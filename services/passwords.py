@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+def _exit_with_parent(parent_pid):
+    """Pool worker initializer: exit once the web worker that forked us is gone.
+
+    Forked workers inherit the server's listening socket, so an orphan left by
+    a killed parent would keep the port open.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, daemon=True).start()
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hashes are already queued for the process pool"""
+
+
+class WerkzeugHasher:
+    """Werkzeug password hashes with a configurable method and cost.
+
+    ``method`` is a full Werkzeug method string such as
+    ``pbkdf2:sha256:600000`` or ``scrypt:32768:8:1``; hashes stored with any
+    other method still verify but report ``needs_rehash``.
+    """
+
+    def __init__(self, method=DEFAULT_METHOD):
+        self.method = method
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return check_password_hash(password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+
+class PasswordService:
+    """Runs the configured hasher in a bounded process pool.
+
+    Hashing is CPU-bound by design, so doing it in request threads lets a
+    burst of logins starve every other request. With ``PASSWORD_HASH_WORKERS``
+    > 0 the work goes to that many worker processes and the request thread
+    just waits; at most ``PASSWORD_HASH_MAX_PENDING`` hashes may be queued,
+    beyond that callers get PasswordHasherBusy. ``0`` workers hashes inline.
+    """
+
+    def __init__(self, hasher_class=WerkzeugHasher):
+        self.hasher_class = hasher_class
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._slots = None
+        self._workers = None
+
+    def _config(self, key, default):
+        return current_app.config.get(key, default) if has_app_context() else default
+
+    @property
+    def hasher(self):
+        return self.hasher_class(self._config('PASSWORD_HASH_METHOD', DEFAULT_METHOD))
+
+    def _executor(self):
+        """The process pool for this process, or None to hash inline"""
+        workers = self._config('PASSWORD_HASH_WORKERS', 0)
+        if workers <= 0:
+            return None
+        with self._lock:
+            # A forked worker must not reuse its parent's pool
+            if self._pool is None or self._pool_pid != os.getpid() or self._workers != workers:
+                if self._pool is not None and self._pool_pid == os.getpid():
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_exit_with_parent, initargs=(os.getpid(),)
+                )
+                self._pool_pid = os.getpid()
+                self._workers = workers
+                self._slots = threading.BoundedSemaphore(self._config('PASSWORD_HASH_MAX_PENDING', 64))
+            return self._pool
+
+    def _run(self, fn, *args):
+        pool = self._executor()
+        if pool is None:
+            return fn(*args)
+        slots = self._slots
+        if not slots.acquire(timeout=self._config('PASSWORD_HASH_QUEUE_TIMEOUT', 5)):
+            raise PasswordHasherBusy('Too many password hashes in progress')
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OOM killer); start a fresh pool next time
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            return fn(*args)
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self._run(self.hasher.hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(self.hasher.verify, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return self.hasher.needs_rehash(password_hash)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+
+
+passwords = PasswordService()
@@ -0,0 +1,134 @@
+from datetime import datetime
+from sqlalchemy import delete, exists, func, select
+from models.allocation import LotAllocation, SpotPlacement
+from models.booking import Booking
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot, Reservation
+from models.tariff import LotTariff
+
+# Rows per executemany batch when inserting spots
+INSERT_BATCH_SIZE = 10000
+
+LOT_FIELDS = ('name', 'price', 'address', 'pin_code', 'max_spots')
+
+
+class LotImportError(ValueError):
+    """Raised when a row of a lot import file is invalid"""
+
+
+class LotInUseError(ValueError):
+    """Raised when a lot cannot be deleted; the message is safe to show to the admin"""
+
+
+def add_spots(lot_id, count, first_number=1):
+    """Insert ``count`` available spots numbered from ``first_number`` with batched executemany"""
+    table = ParkingSpot.__table__
+    created_at = datetime.utcnow()
+    last_number = first_number + count
+    for start in range(first_number, last_number, INSERT_BATCH_SIZE):
+        db.session.execute(table.insert(), [
+            {'lot_id': lot_id, 'spot_number': number, 'status': 'A', 'created_at': created_at}
+            for number in range(start, min(start + INSERT_BATCH_SIZE, last_number))
+        ])
+
+
+def remove_free_spots(lot_id, count):
+    """Delete the ``count`` highest numbered free spots of a lot in one statement.
+
+    Spots that are occupied or referenced by reservations or bookings are kept. Returns
+    the number of spots deleted, which is less than ``count`` when not enough
+    spots qualify; the caller should roll back in that case.
+    """
+    removable = select(ParkingSpot.id).where(
+        ParkingSpot.lot_id == lot_id,
+        ParkingSpot.status == 'A',
+        ~exists().where(Reservation.spot_id == ParkingSpot.id),
+        ~exists().where(Booking.spot_id == ParkingSpot.id)
+    ).order_by(ParkingSpot.spot_number.desc()).limit(count)
+
+    # Re-check the status so a spot claimed after the subquery ran is never deleted
+    result = db.session.execute(
+        delete(ParkingSpot).where(
+            ParkingSpot.id.in_(removable.scalar_subquery()),
+            ParkingSpot.status == 'A'
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def resize_lot(lot, new_spots):
+    """Grow or shrink a lot to ``new_spots`` spots; returns False if it cannot shrink"""
+    current_spots, highest_number = db.session.query(
+        func.count(ParkingSpot.id), func.max(ParkingSpot.spot_number)
+    ).filter(ParkingSpot.lot_id == lot.id).one()
+
+    if new_spots > current_spots:
+        # Number new spots after the highest existing one so numbers never repeat
+        add_spots(lot.id, new_spots - current_spots, (highest_number or 0) + 1)
+    elif new_spots < current_spots:
+        if remove_free_spots(lot.id, current_spots - new_spots) < current_spots - new_spots:
+            return False
+    lot.max_spots = new_spots
+    return True
+
+
+def delete_lot(lot):
+    """Delete a lot and all of its spots with one set-based DELETE for the spots and their cancelled bookings.
+
+    Raises LotInUseError, deleting nothing, if any reservation or open
+    booking references one of its spots: like the spots remove_free_spots
+    keeps, reservations are the history the revenue rollups are built from,
+    and open bookings are still held by their users.
+    """
+    lot_spots = select(ParkingSpot.id).where(ParkingSpot.lot_id == lot.id)
+    if db.session.scalar(select(exists().where(Reservation.spot_id.in_(lot_spots)))):
+        raise LotInUseError('Cannot delete parking lot as its spots have reservation history.')
+    if db.session.scalar(select(exists().where(Booking.spot_id.in_(lot_spots), Booking.status == 'B'))):
+        raise LotInUseError('Cannot delete parking lot as it has open bookings.')
+    db.session.execute(
+        delete(Booking).where(Booking.spot_id.in_(lot_spots)).execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(ParkingSpot).where(ParkingSpot.lot_id == lot.id).execution_options(synchronize_session=False)
+    )
+    for model in (LotTariff, LotAllocation, SpotPlacement):
+        db.session.execute(delete(model).where(model.lot_id == lot.id))
+    db.session.delete(lot)
+
+
+def _parse_lot(row, line):
+    missing = [field for field in LOT_FIELDS if not str(row.get(field) or '').strip()]
+    if missing:
+        raise LotImportError(f'Line {line}: missing {", ".join(missing)}')
+    try:
+        price = float(row['price'])
+        max_spots = int(row['max_spots'])
+    except (TypeError, ValueError):
+        raise LotImportError(f'Line {line}: price and max_spots must be numbers')
+    if price < 1 or max_spots < 1:
+        raise LotImportError(f'Line {line}: price and max_spots must be at least 1')
+    return {
+        'name': str(row['name']).strip(),
+        'price': price,
+        'address': str(row['address']).strip(),
+        'pin_code': str(row['pin_code']).strip(),
+        'max_spots': max_spots,
+    }
+
+
+def import_lots(rows):
+    """Create many lots with their spots in a single transaction.
+
+    ``rows`` is an iterable of dicts with the ParkingLot form fields. Every row is
+    validated before anything is written. Returns the created lots.
+    """
+    parsed = [_parse_lot(row, line) for line, row in enumerate(rows, start=1)]
+
+    lots = [ParkingLot(**fields) for fields in parsed]
+    db.session.add_all(lots)
+    db.session.flush()  # To get the lot ids
+
+    for lot in lots:
+        add_spots(lot.id, lot.max_spots)
+    db.session.commit()
+    return lots
@@ -0,0 +1,210 @@
+import re
+from datetime import date, datetime, timedelta
+from sqlalchemy import exists, func, select, update
+from models.booking import Booking
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot, Reservation
+from models.rollup import DailyRevenue, UserDailyRevenue
+from models.user import User
+from services import occupancy_series
+from services.bookings import overlapping, upcoming_bookings_query
+from services.exports import KEY_COLUMNS as RESERVATION_KEY, reservation_query
+from services.overstays import SWEEP_ORDER
+from services.pagination import after
+from services.reservations import history_query
+from services.search import search_index, SEARCH_PAGE_SIZE
+
+# Placeholder ids used to build the audited statements; only the plan matters
+SAMPLE_LOT_ID = 1
+SAMPLE_SPOT_ID = 1
+SAMPLE_USER_ID = 1
+SAMPLE_TIME = datetime(2025, 1, 1)
+# Local day numbers (days since 1970-01-01) bounding the sampled analytics range
+SAMPLE_DAYS = (20089, 20454)
+SAMPLE_PAGE_SIZE = 50
+
+# Queries whose plans may sort, with what they sort
+SORTS_EXPECTED = {
+    'user.summary: favorite lots',  # one user's lots, by visit count
+    'admin.search / user.search: ranked lots',  # the matches, by rank
+    'admin.search: ranked users',  # the matches, by rank
+    'bookings.index: upcoming bookings of lot (booking availability, walk-in held spots)',  # once per lot and worker
+    'api.analytics_utilization: occupancy months',  # the range's lot-months, 13 per lot for a year
+}
+
+
+def _keyset(query, columns):
+    """The statement of a keyset_page() of ``query`` past a sample cursor"""
+    return query.filter(after(columns, [1] * len(columns))).order_by(None).order_by(*columns) \
+        .limit(SAMPLE_PAGE_SIZE + 1).statement
+
+
+def _audited_queries():
+    """(name, statement, full scan expected) for the queries the controllers and jobs run.
+
+    Add an entry with every controller query that is added or changed.
+    """
+    return [
+        ('auth.login: user by email',
+         select(User).where(User.email == 'user@example.com'), False),
+        ('user.dashboard: active reservation',
+         select(Reservation).where(Reservation.user_id == SAMPLE_USER_ID, Reservation.is_active == True).limit(1), False),
+        ('user.dashboard: recent reservations',
+         select(Reservation).where(Reservation.user_id == SAMPLE_USER_ID, Reservation.is_active == False)
+         .order_by(Reservation.parking_time.desc()).limit(5), False),
+        ('user.reserve: claim spot',
+         update(ParkingSpot).where(ParkingSpot.id == SAMPLE_SPOT_ID, ParkingSpot.status == 'A').values(status='O'), False),
+        ('user.release: lot of spot',
+         select(ParkingLot).join(ParkingSpot).where(ParkingSpot.id == SAMPLE_SPOT_ID), False),
+        ('user.release: close reservation',
+         update(Reservation).where(Reservation.id == 1, Reservation.is_active == True).values(is_active=False), False),
+        ('user.history: page',
+         history_query(SAMPLE_USER_ID).limit(10).statement, False),
+        ('user.summary: reservation count',
+         select(func.count()).select_from(Reservation).where(Reservation.user_id == SAMPLE_USER_ID), False),
+        ('user.summary: monthly rollup',
+         select(UserDailyRevenue).where(UserDailyRevenue.user_id == SAMPLE_USER_ID).order_by(UserDailyRevenue.day), False),
+        ('user.summary: favorite lots',
+         select(ParkingLot.name, func.count()).join(ParkingSpot, ParkingLot.id == ParkingSpot.lot_id)
+         .join(Reservation, ParkingSpot.id == Reservation.spot_id).where(Reservation.user_id == SAMPLE_USER_ID)
+         .group_by(ParkingLot.id).order_by(func.count().desc()).limit(5), False),
+        ('admin.dashboard: lot list',
+         select(ParkingLot), True),
+        ('admin.dashboard: occupancy summary',
+         select(ParkingSpot.lot_id, ParkingSpot.status, func.count()).group_by(ParkingSpot.lot_id, ParkingSpot.status), True),
+        ('admin.dashboard: active reservation count',
+         select(func.count()).select_from(Reservation).where(Reservation.is_active == True), False),
+        ('admin.dashboard: user count',
+         select(func.count()).select_from(User).where(User.is_admin == False), True),
+        ('admin.edit_parking_lot: spot count',
+         select(func.count()).select_from(ParkingSpot).where(ParkingSpot.lot_id == SAMPLE_LOT_ID), False),
+        ('admin.edit_parking_lot: spots to remove',
+         select(ParkingSpot).where(ParkingSpot.lot_id == SAMPLE_LOT_ID, ParkingSpot.status == 'A')
+         .order_by(ParkingSpot.spot_number.desc()).limit(10), False),
+        ('admin.delete_parking_lot: occupied count',
+         select(func.count()).select_from(ParkingSpot).where(ParkingSpot.lot_id == SAMPLE_LOT_ID, ParkingSpot.status == 'O'), False),
+        ('admin.parking_lots: keyset page',
+         _keyset(ParkingLot.query, (ParkingLot.id,)), False),
+        ('admin.parking_spots: keyset page',
+         _keyset(ParkingSpot.query.filter_by(lot_id=SAMPLE_LOT_ID), (ParkingSpot.spot_number, ParkingSpot.id)), False),
+        ('admin.parking_spots: active reservation of spot',
+         select(Reservation).where(Reservation.spot_id == SAMPLE_SPOT_ID, Reservation.is_active == True).limit(1), False),
+        ('admin.users: keyset page',
+         _keyset(User.query.filter_by(is_admin=False), (User.id,)), False),
+        ('admin.summary: daily revenue rollup',
+         select(DailyRevenue.day, DailyRevenue.revenue).where(DailyRevenue.day >= date.today() - timedelta(days=30)), False),
+        ('api.available_spots: free spots of lot',
+         select(ParkingSpot).where(ParkingSpot.lot_id == SAMPLE_LOT_ID, ParkingSpot.status == 'A'), False),
+        ('jobs.overstay_sweep: next overdue reservations',
+         select(*SWEEP_ORDER).where(
+             Reservation.is_active == True, Reservation.parking_time < SAMPLE_TIME,
+             after(SWEEP_ORDER, (SAMPLE_TIME - timedelta(days=1), 1))
+         ).order_by(*SWEEP_ORDER).limit(500), False),
+        ('api.reservations: page of lot',
+         reservation_query(lot_id=SAMPLE_LOT_ID).where(after(RESERVATION_KEY, (SAMPLE_TIME, 1))).limit(101), False),
+        ('api.reservations: page of user',
+         reservation_query(user_id=SAMPLE_USER_ID).where(after(RESERVATION_KEY, (SAMPLE_TIME, 1))).limit(101), False),
+        ('api.export_reservations: lot',
+         reservation_query(lot_id=SAMPLE_LOT_ID), False),
+        ('api.export_reservations: date range',
+         reservation_query(since='2025-01-01', until='2025-02-01'), False),
+        ('api.create_booking: user overlap',
+         select(exists().where(Booking.user_id == SAMPLE_USER_ID,
+                               overlapping(SAMPLE_TIME, SAMPLE_TIME + timedelta(hours=2)))), False),
+        ('api.create_booking: spot overlap',
+         select(exists().where(Booking.spot_id == SAMPLE_SPOT_ID,
+                               overlapping(SAMPLE_TIME, SAMPLE_TIME + timedelta(hours=2)))), False),
+        ('api.list_bookings: open bookings of user',
+         select(Booking).where(Booking.user_id == SAMPLE_USER_ID, Booking.status == 'B', Booking.ends_at > SAMPLE_TIME)
+         .order_by(Booking.starts_at), False),
+        ('bookings.index: upcoming bookings of lot (booking availability, walk-in held spots)',
+         upcoming_bookings_query(SAMPLE_LOT_ID, SAMPLE_TIME), False),
+        ('api.analytics_utilization: occupancy months',
+         occupancy_series.series_query(*SAMPLE_DAYS, None, ['occupied']), False),
+        ('api.lot_occupancy: occupancy months of lot',
+         occupancy_series.series_query(*SAMPLE_DAYS, [SAMPLE_LOT_ID], ['occupied']), False),
+        ('jobs.occupancy_series: stays of month',
+         occupancy_series.stays_query(Reservation.parking_time >= SAMPLE_TIME,
+                                      Reservation.parking_time < SAMPLE_TIME + timedelta(days=31)), False),
+        ('api.user_stats: aggregates',
+         select(Reservation.user_id, func.count(), func.sum(Reservation.parking_cost))
+         .where(Reservation.user_id.in_([SAMPLE_USER_ID])).group_by(Reservation.user_id), False),
+    ] + _search_queries()
+
+
+def _search_queries():
+    search_index.ensure_installed()
+    if search_index.backend != 'fts':
+        # The in-process fallback only fetches the page's rows by primary key
+        return [('admin.search / user.search: lots of page',
+                 select(ParkingLot).where(ParkingLot.id.in_([SAMPLE_LOT_ID])), False)]
+    return [
+        ('admin.search / user.search: ranked lots',
+         search_index.fts_lots('parking').limit(SEARCH_PAGE_SIZE), False),
+        ('admin.search: ranked users',
+         search_index.fts_users('parking').limit(SEARCH_PAGE_SIZE), False),
+    ]
+
+
+def _explain(statement):
+    """Return the backend's plan for a statement as a list of text lines"""
+    bind = db.session.get_bind()
+    compiled = statement.compile(dialect=bind.dialect, compile_kwargs={'render_postcompile': True})
+    connection = db.session.connection()
+    if bind.dialect.name == 'sqlite':
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+        return [row[-1] for row in rows]
+    if bind.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params).all()
+        return [row[0] for row in rows]
+    raise NotImplementedError(f'Query plan audit does not support {bind.dialect.name}')
+
+
+def _full_scans(plan):
+    """Tables read front to back without an index"""
+    scans = []
+    for line in plan:
+        sqlite_scan = re.match(r'\s*SCAN (?:TABLE )?(\w+)(.*)', line)
+        # An EXISTS (...) select reads one constant row around its indexed subquery
+        if sqlite_scan and sqlite_scan.group(1) == 'CONSTANT':
+            continue
+        # FTS5 lookups show up as a scan of the virtual table with a MATCH index
+        if sqlite_scan and 'USING' not in sqlite_scan.group(2) and 'VIRTUAL TABLE INDEX' not in sqlite_scan.group(2):
+            scans.append(sqlite_scan.group(1))
+        postgres_scan = re.search(r'Seq Scan on (\w+)', line)
+        if postgres_scan:
+            scans.append(postgres_scan.group(1))
+    return scans
+
+
+def _sorts(plan):
+    """Steps that sort rows instead of reading them in index order"""
+    sorts = []
+    for line in plan:
+        if 'USE TEMP B-TREE' in line or re.match(r'\s*(->\s*)?(Incremental )?Sort\b', line):
+            sorts.append(line.strip())
+    return sorts
+
+
+def audited_statements():
+    """(name, statement) pairs of the audited read queries, e.g. for benchmarking"""
+    return [(name, statement) for name, statement, _ in _audited_queries() if statement.is_select]
+
+
+def audit_query_plans():
+    """Explain every audited controller query and flag unexpected full table scans and sorts"""
+    results = []
+    for name, statement, scan_expected in _audited_queries():
+        plan = _explain(statement)
+        scans = _full_scans(plan)
+        sorts = _sorts(plan)
+        results.append({
+            'name': name,
+            'plan': plan,
+            'full_scans': scans,
+            'sorts': sorts,
+            'flagged': (bool(scans) and not scan_expected) or (bool(sorts) and name not in SORTS_EXPECTED),
+        })
+    db.session.rollback()
+    return results
@@ -0,0 +1,153 @@
+from flask import g
+from sqlalchemy import func, case, select, update
+from sqlalchemy.orm import joinedload
+from models.database import db
+from models.functions import hours_between
+from models.parking import ParkingSpot, Reservation
+from models.rollup import UserDailyRevenue
+from services.pagination import keyset_page
+from services.rollups import record_release
+
+
+def _empty_stats(user_id):
+    return {
+        'user_id': user_id,
+        'total_reservations': 0,
+        'completed_reservations': 0,
+        'active_reservations': 0,
+        'total_spent': 0,
+        'avg_duration_hours': 0
+    }
+
+
+def active_reservation_for(user_id):
+    """The user's active reservation with its spot and lot, looked up once per request"""
+    memo = g.setdefault('active_reservations', {})
+    if user_id not in memo:
+        memo[user_id] = Reservation.query.options(
+            joinedload(Reservation.parking_spot).joinedload(ParkingSpot.parking_lot)
+        ).filter_by(user_id=user_id, is_active=True).first()
+    return memo[user_id]
+
+
+def forget_active_reservation(user_id):
+    """Drop the memo after reserving or releasing within the same request"""
+    g.setdefault('active_reservations', {}).pop(user_id, None)
+
+
+def fill_reservation_lots():
+    """Copy the spot's lot onto reservations inserted without one, e.g. bulk-loaded rows"""
+    spot_lot = select(ParkingSpot.lot_id).where(ParkingSpot.id == Reservation.spot_id).scalar_subquery()
+    return db.session.execute(
+        update(Reservation).where(Reservation.lot_id.is_(None)).values(lot_id=spot_lot)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def close_reservation(reservation_id, user_id, spot_id, lot_id, parking_time, leaving_time, cost, rollups=True):
+    """End an active reservation: free its spot and fold the visit into the revenue rollups.
+
+    Runs in the caller's transaction; returns False, having changed nothing,
+    if somebody released the reservation in the meantime. Callers closing
+    many at once pass ``rollups=False`` and hand the visits to
+    ``record_releases`` instead. After committing, the caller reports the
+    spot to ``occupancy_index.release_spot``.
+    """
+    released = Reservation.query.filter_by(id=reservation_id, is_active=True).update({
+        'is_active': False,
+        'leaving_time': leaving_time,
+        'parking_cost': cost
+    }, synchronize_session=False)
+    if not released:
+        return False
+    ParkingSpot.query.filter_by(id=spot_id).update({'status': 'A'}, synchronize_session=False)
+    if rollups:
+        record_release(user_id, lot_id, parking_time, leaving_time, cost)
+    return True
+
+
+def user_reservation_stats(user_ids):
+    """Reservation count, active count, total spent and average duration per user.
+
+    Computed with one GROUP BY query; users without reservations get zeros.
+    """
+    user_ids = list(user_ids)
+    stats = {user_id: _empty_stats(user_id) for user_id in user_ids}
+    if not user_ids:
+        return stats
+
+    rows = db.session.query(
+        Reservation.user_id,
+        func.count(Reservation.id),
+        func.sum(case((Reservation.is_active == True, 1), else_=0)),
+        func.coalesce(func.sum(Reservation.parking_cost), 0),
+        func.avg(hours_between(Reservation.parking_time, Reservation.leaving_time))
+    ).filter(
+        Reservation.user_id.in_(user_ids)
+    ).group_by(Reservation.user_id).all()
+
+    for user_id, total, active, spent, avg_hours in rows:
+        active = int(active or 0)
+        stats[user_id].update({
+            'total_reservations': total,
+            'completed_reservations': total - active,
+            'active_reservations': active,
+            'total_spent': float(spent),
+            'avg_duration_hours': float(avg_hours or 0)
+        })
+    return stats
+
+
+def recent_reservations_by_user(user_ids, limit=5):
+    """Latest ``limit`` reservations per user (newest first), with spot and lot loaded"""
+    user_ids = list(user_ids)
+    recent = {user_id: [] for user_id in user_ids}
+    if not user_ids:
+        return recent
+
+    # Rank each user's reservations by recency and keep the top N in SQL
+    ranked = db.session.query(
+        Reservation.id.label('id'),
+        func.row_number().over(
+            partition_by=Reservation.user_id,
+            order_by=(Reservation.parking_time.desc(), Reservation.id.desc())
+        ).label('rank')
+    ).filter(Reservation.user_id.in_(user_ids)).subquery()
+
+    reservations = Reservation.query.join(
+        ranked, Reservation.id == ranked.c.id
+    ).filter(
+        ranked.c.rank <= limit
+    ).options(
+        joinedload(Reservation.parking_spot).joinedload(ParkingSpot.parking_lot)
+    ).order_by(Reservation.user_id, ranked.c.rank).all()
+
+    for reservation in reservations:
+        recent[reservation.user_id].append(reservation)
+    return recent
+
+
+def history_query(user_id):
+    """A user's reservations, newest first, with spot and lot eager-loaded"""
+    return Reservation.query.filter_by(
+        user_id=user_id
+    ).options(
+        joinedload(Reservation.parking_spot).joinedload(ParkingSpot.parking_lot)
+    ).order_by(Reservation.parking_time.desc(), Reservation.id.desc())
+
+
+def approximate_history_total(user_id):
+    """Completed visits from the per-user rollups plus the active reservation, without counting rows"""
+    visits = db.session.query(
+        func.coalesce(func.sum(UserDailyRevenue.visits), 0)
+    ).filter(UserDailyRevenue.user_id == user_id).scalar()
+    return int(visits) + (1 if active_reservation_for(user_id) else 0)
+
+
+def history_page(user_id, per_page, after=None, before=None):
+    """A KeysetPage of the user's reservations, newest first"""
+    return keyset_page(
+        history_query(user_id), (Reservation.parking_time, Reservation.id), per_page,
+        after_cursor=after, before_cursor=before, descending=True,
+        estimate=lambda: approximate_history_total(user_id)
+    )
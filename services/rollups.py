@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from sqlalchemy import func, insert, delete, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.database import db
+from models.functions import day_of
+from models.parking import ParkingSpot, Reservation
+from models.rollup import DailyRevenue, LotDailyRevenue, UserDailyRevenue
+
+ROLLUP_MODELS = (DailyRevenue, LotDailyRevenue, UserDailyRevenue)
+
+
+def _increment(model, keys, revenue, visits):
+    """Add revenue/visits to a rollup row, creating it if needed (single upsert)"""
+    table = model.__table__
+    values = dict(keys, revenue=revenue, visits=visits)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite_insert if dialect == 'sqlite' else postgresql_insert)(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={'revenue': table.c.revenue + stmt.excluded.revenue,
+                  'visits': table.c.visits + stmt.excluded.visits}
+        )
+        db.session.execute(stmt)
+    elif dialect == 'mysql':
+        stmt = mysql_insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            revenue=table.c.revenue + stmt.inserted.revenue,
+            visits=table.c.visits + stmt.inserted.visits
+        )
+        db.session.execute(stmt)
+    else:
+        updated = db.session.query(model).filter_by(**keys).update({
+            'revenue': model.revenue + revenue,
+            'visits': model.visits + visits
+        }, synchronize_session=False)
+        if not updated:
+            db.session.execute(insert(table).values(**values))
+
+
+def record_release(user_id, lot_id, parking_time, leaving_time, cost):
+    """Fold a completed reservation into the rollups, in the caller's transaction"""
+    cost = cost or 0
+    _increment(DailyRevenue, {'day': leaving_time.date()}, cost, 1)
+    _increment(LotDailyRevenue, {'lot_id': lot_id, 'day': leaving_time.date()}, cost, 1)
+    _increment(UserDailyRevenue, {'user_id': user_id, 'day': parking_time.date()}, cost, 1)
+
+
+def record_releases(visits):
+    """record_release for many (user_id, lot_id, parking_time, leaving_time, cost) at once, one upsert per row touched"""
+    totals = OrderedDict()
+    for user_id, lot_id, parking_time, leaving_time, cost in visits:
+        for model, keys in (
+            (DailyRevenue, (('day', leaving_time.date()),)),
+            (LotDailyRevenue, (('lot_id', lot_id), ('day', leaving_time.date()))),
+            (UserDailyRevenue, (('user_id', user_id), ('day', parking_time.date()))),
+        ):
+            revenue, count = totals.get((model, keys), (0, 0))
+            totals[(model, keys)] = (revenue + (cost or 0), count + 1)
+    for (model, keys), (revenue, count) in totals.items():
+        _increment(model, dict(keys), revenue, count)
+
+
+def _recompute_queries():
+    """GROUP BY queries over reservations that produce each rollup table from scratch"""
+    completed = Reservation.leaving_time.isnot(None)
+    leaving_day = day_of(Reservation.leaving_time)
+    parking_day = day_of(Reservation.parking_time)
+    revenue = func.coalesce(func.sum(Reservation.parking_cost), 0)
+
+    return {
+        DailyRevenue: select(
+            leaving_day, revenue, func.count()
+        ).where(completed).group_by(leaving_day),
+        LotDailyRevenue: select(
+            ParkingSpot.lot_id, leaving_day, revenue, func.count()
+        ).select_from(Reservation).join(
+            ParkingSpot, ParkingSpot.id == Reservation.spot_id
+        ).where(completed).group_by(ParkingSpot.lot_id, leaving_day),
+        UserDailyRevenue: select(
+            Reservation.user_id, parking_day, revenue, func.count()
+        ).where(completed).group_by(Reservation.user_id, parking_day),
+    }
+
+
+def _key_columns(model):
+    return [column.name for column in model.__table__.primary_key.columns]
+
+
+def backfill():
+    """Rebuild every rollup table from the reservations table in one transaction"""
+    counts = {}
+    for model, query in _recompute_queries().items():
+        table = model.__table__
+        db.session.execute(delete(table))
+        columns = _key_columns(model) + ['revenue', 'visits']
+        db.session.execute(insert(table).from_select(columns, query))
+        counts[table.name] = db.session.query(model).count()
+    db.session.commit()
+    return counts
+
+
+def verify(tolerance=0.01):
+    """Diff the rollup tables against a full recompute; returns a list of mismatches"""
+    mismatches = []
+    for model, query in _recompute_queries().items():
+        key_names = _key_columns(model)
+        expected = {
+            tuple(str(value) for value in row[:-2]): (float(row[-2]), row[-1])
+            for row in db.session.execute(query)
+        }
+        actual = {
+            tuple(str(getattr(row, name)) for name in key_names): (float(row.revenue), row.visits)
+            for row in db.session.query(model)
+        }
+        for key in sorted(set(expected) | set(actual)):
+            want = expected.get(key, (0.0, 0))
+            got = actual.get(key, (0.0, 0))
+            if abs(want[0] - got[0]) > tolerance or want[1] != got[1]:
+                mismatches.append({
+                    'table': model.__tablename__,
+                    'key': dict(zip(key_names, key)),
+                    'expected': {'revenue': want[0], 'visits': want[1]},
+                    'actual': {'revenue': got[0], 'visits': got[1]},
+                })
+    return mismatches
+
+
+def daily_revenue_query(since):
+    return select(
+        DailyRevenue.day, DailyRevenue.revenue
+    ).where(
+        DailyRevenue.day >= since
+    ).order_by(DailyRevenue.day)
+
+
+def daily_revenue(since):
+    """[(day, revenue)] for days on or after ``since`` (a date), oldest first"""
+    return db.session.execute(daily_revenue_query(since)).all()
+
+
+def _by_month(rows):
+    months = OrderedDict()
+    for day, revenue, visits in rows:
+        month = day.strftime('%Y-%m')
+        total_revenue, total_visits = months.get(month, (0, 0))
+        months[month] = (total_revenue + (revenue or 0), total_visits + (visits or 0))
+    return months
+
+
+def monthly_revenue_query():
+    return select(DailyRevenue.day, DailyRevenue.revenue, DailyRevenue.visits).order_by(DailyRevenue.day)
+
+
+def months_from_rows(rows, limit=12):
+    """[(month, revenue)] of the rows of monthly_revenue_query(), latest ``limit`` months first"""
+    months = _by_month(rows)
+    return [(month, revenue) for month, (revenue, _) in reversed(months.items())][:limit]
+
+
+def monthly_revenue(limit=12):
+    """[(month, revenue)] for the latest ``limit`` months with revenue, newest first"""
+    return months_from_rows(db.session.execute(monthly_revenue_query()).all(), limit)
+
+
+def user_monthly_activity(user_id):
+    """[(month, visits, spent)] of a user's completed reservations by month parked, oldest first"""
+    rows = db.session.query(
+        UserDailyRevenue.day, UserDailyRevenue.revenue, UserDailyRevenue.visits
+    ).filter(
+        UserDailyRevenue.user_id == user_id
+    ).order_by(UserDailyRevenue.day).all()
+    months = _by_month(rows)
+    return [(month, visits, revenue) for month, (revenue, visits) in months.items()]
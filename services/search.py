@@ -0,0 +1,348 @@
+import bisect
+import math
+import re
+import threading
+from sqlalchemy import column, event, func, select, table, text
+from sqlalchemy.exc import OperationalError
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot
+from models.user import User
+
+SEARCH_PAGE_SIZE = 20
+PIN_CODE_LENGTH = 6
+
+# Searchable columns and their ranking weights, in FTS column order
+LOT_FIELDS = (('name', 10.0), ('address', 2.0), ('pin_code', 5.0))
+USER_FIELDS = (('name', 10.0), ('email', 5.0), ('address', 2.0), ('pin_code', 5.0))
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(value):
+    return _TOKEN.findall((value or '').lower())
+
+
+def parse_query(query):
+    """Split a search box query into terms; a lone 6-digit term is looked up as a PIN code"""
+    terms = tokenize(query)
+    if len(terms) == 1 and terms[0].isdigit() and len(terms[0]) == PIN_CODE_LENGTH:
+        return terms, terms[0]
+    return terms, None
+
+
+class SearchPage:
+    """One page of ranked results, shaped like Flask-SQLAlchemy's Pagination"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+class FtsTable:
+    """External-content FTS5 table over ``source``, kept in sync by triggers"""
+
+    def __init__(self, name, source, fields):
+        self.name = name
+        self.source = source
+        self.fields = fields
+        self.table = table(name, column('rowid'), column('rank'), column(name))
+
+    def match(self, expression):
+        return self.table.c[self.name].match(expression)
+
+    def install(self, connection):
+        """Create the table and its triggers; returns False if SQLite lacks FTS5"""
+        columns = ', '.join(field for field, _ in self.fields)
+        new_values = ', '.join(f'new.{field}' for field, _ in self.fields)
+        old_values = ', '.join(f'old.{field}' for field, _ in self.fields)
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': self.name}
+        ).first()
+        try:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} USING fts5("
+                f"{columns}, content='{self.source}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            ))
+        except OperationalError:
+            return False
+
+        delete_old = (f"INSERT INTO {self.name}({self.name}, rowid, {columns}) "
+                      f"VALUES ('delete', old.id, {old_values});")
+        insert_new = f"INSERT INTO {self.name}(rowid, {columns}) VALUES (new.id, {new_values});"
+        for suffix, timing, body in (('ai', 'AFTER INSERT', insert_new),
+                                     ('ad', 'AFTER DELETE', delete_old),
+                                     ('au', 'AFTER UPDATE', delete_old + ' ' + insert_new)):
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {self.name}_{suffix} {timing} ON {self.source} "
+                f"BEGIN {body} END"
+            ))
+
+        weights = ', '.join(str(weight) for _, weight in self.fields)
+        connection.execute(text(
+            f"INSERT INTO {self.name}({self.name}, rank) VALUES ('rank', 'bm25({weights})')"
+        ))
+        if not exists:
+            self.rebuild(connection)
+        return True
+
+    def rebuild(self, connection):
+        connection.execute(text(f"INSERT INTO {self.name}({self.name}) VALUES ('rebuild')"))
+
+
+def match_expression(terms, pin_code):
+    """FTS5 query: an exact PIN code, or every term as a prefix"""
+    if pin_code:
+        return f'pin_code : "{pin_code}"'
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class InvertedIndex:
+    """In-process token index with prefix lookups, used where FTS5 is unavailable"""
+
+    def __init__(self, fields):
+        self.weights = dict(fields)
+        self._postings = {}  # token -> {doc_id: weight}
+        self._docs = {}  # doc_id -> tokens
+        self._pins = {}  # pin_code -> {doc_id}
+        self._pin_of = {}
+        self._sorted_tokens = None
+
+    def add(self, doc_id, values):
+        self.remove(doc_id)
+        tokens = {}
+        for field, value in values.items():
+            for token in tokenize(value):
+                tokens[token] = max(tokens.get(token, 0), self.weights[field])
+        for token, weight in tokens.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._sorted_tokens = None
+            self._postings[token][doc_id] = weight
+        self._docs[doc_id] = list(tokens)
+        pin_code = (values.get('pin_code') or '').strip()
+        if pin_code:
+            self._pins.setdefault(pin_code, set()).add(doc_id)
+            self._pin_of[doc_id] = pin_code
+
+    def remove(self, doc_id):
+        for token in self._docs.pop(doc_id, ()):
+            self._postings[token].pop(doc_id, None)
+        pin_code = self._pin_of.pop(doc_id, None)
+        if pin_code:
+            self._pins[pin_code].discard(doc_id)
+
+    def _tokens_with_prefix(self, prefix):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        for token in self._sorted_tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def search(self, terms, pin_code=None):
+        """Matching doc ids, best first"""
+        if pin_code:
+            return sorted(self._pins.get(pin_code, ()))
+        scores = None
+        for term in terms:
+            term_scores = {}
+            for token in self._tokens_with_prefix(term):
+                for doc_id, weight in self._postings[token].items():
+                    if weight > term_scores.get(doc_id, 0):
+                        term_scores[doc_id] = weight
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {doc_id: score + term_scores[doc_id] for doc_id, score in scores.items() if doc_id in term_scores}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+
+def _available_spots():
+    """Correlated count of free spots, evaluated only for the rows of the page"""
+    return select(func.count(ParkingSpot.id)).where(
+        ParkingSpot.lot_id == ParkingLot.id, ParkingSpot.status == 'A'
+    ).correlate(ParkingLot).scalar_subquery()
+
+
+class SearchIndex:
+    """Ranked, paginated search over parking lots and (non-admin) users.
+
+    On SQLite with FTS5 the lots and users tables get external-content FTS5
+    tables that triggers keep in sync with every write. Other databases fall
+    back to in-process inverted indexes, loaded on first use and updated from
+    ORM events, so like the occupancy index they are per worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None  # 'fts' or 'memory'
+        self._lot_fts = FtsTable('lots_fts', 'parking_lots', LOT_FIELDS)
+        self._user_fts = FtsTable('users_fts', 'users', USER_FIELDS)
+        self._lots = InvertedIndex(LOT_FIELDS)
+        self._users = InvertedIndex(USER_FIELDS)
+
+    @property
+    def backend(self):
+        return self._backend
+
+    def install(self):
+        """Create the FTS5 tables if the database supports them, else load the fallback"""
+        with self._lock:
+            backend = 'memory'
+            if db.engine.dialect.name == 'sqlite':
+                with db.engine.begin() as connection:
+                    if self._lot_fts.install(connection) and self._user_fts.install(connection):
+                        backend = 'fts'
+            if backend == 'memory':
+                self._load_memory()
+            self._backend = backend
+
+    def ensure_installed(self):
+        if self._backend is None:
+            self.install()
+
+    def rebuild(self):
+        """Re-index every lot and user from their tables"""
+        self.ensure_installed()
+        with self._lock:
+            if self._backend == 'fts':
+                with db.engine.begin() as connection:
+                    self._lot_fts.rebuild(connection)
+                    self._user_fts.rebuild(connection)
+            else:
+                self._load_memory()
+
+    def _load_memory(self):
+        lots = InvertedIndex(LOT_FIELDS)
+        for lot_id, *values in db.session.query(ParkingLot.id, ParkingLot.name, ParkingLot.address, ParkingLot.pin_code):
+            lots.add(lot_id, dict(zip(('name', 'address', 'pin_code'), values)))
+        users = InvertedIndex(USER_FIELDS)
+        for user_id, *values in db.session.query(User.id, User.name, User.email, User.address, User.pin_code).filter(
+            User.is_admin == False
+        ):
+            users.add(user_id, dict(zip(('name', 'email', 'address', 'pin_code'), values)))
+        self._lots, self._users = lots, users
+
+    def on_lot_change(self, lot, deleted=False):
+        if self._backend != 'memory':
+            return
+        with self._lock:
+            if deleted:
+                self._lots.remove(lot.id)
+            else:
+                self._lots.add(lot.id, {field: getattr(lot, field) for field, _ in LOT_FIELDS})
+
+    def on_user_change(self, user, deleted=False):
+        if self._backend != 'memory':
+            return
+        with self._lock:
+            if deleted or user.is_admin:
+                self._users.remove(user.id)
+            else:
+                self._users.add(user.id, {field: getattr(user, field) for field, _ in USER_FIELDS})
+
+    def fts_lots(self, query):
+        """FTS5 select of (lot, available spots) rows matching ``query``, best first"""
+        fts = self._lot_fts
+        return select(ParkingLot, _available_spots().label('available')).join(
+            fts.table, fts.table.c.rowid == ParkingLot.id
+        ).where(fts.match(match_expression(*parse_query(query)))).order_by(fts.table.c.rank, ParkingLot.id)
+
+    def fts_users(self, query):
+        """FTS5 select of non-admin users matching ``query``, best first"""
+        fts = self._user_fts
+        return select(User).join(fts.table, fts.table.c.rowid == User.id).where(
+            fts.match(match_expression(*parse_query(query))), User.is_admin == False
+        ).order_by(fts.table.c.rank, User.id)
+
+    def search_lots(self, query, page=1, per_page=SEARCH_PAGE_SIZE):
+        """A SearchPage of (lot, available spots) pairs, best match first"""
+        terms, pin_code = parse_query(query)
+        if not terms:
+            return SearchPage([], page, per_page, 0)
+        self.ensure_installed()
+        offset = (page - 1) * per_page
+
+        if self._backend == 'fts':
+            matched = self.fts_lots(query)
+            total = db.session.scalar(select(func.count()).select_from(matched.order_by(None).subquery()))
+            items = db.session.execute(matched.limit(per_page).offset(offset)).all()
+            return SearchPage([tuple(row) for row in items], page, per_page, total)
+
+        with self._lock:
+            lot_ids = self._lots.search(terms, pin_code)
+        page_ids = lot_ids[offset:offset + per_page]
+        rows = select(ParkingLot, _available_spots().label('available')).where(ParkingLot.id.in_(page_ids))
+        found = {lot.id: (lot, available) for lot, available in db.session.execute(rows).all()} if page_ids else {}
+        return SearchPage([found[lot_id] for lot_id in page_ids if lot_id in found], page, per_page, len(lot_ids))
+
+    def search_users(self, query, page=1, per_page=SEARCH_PAGE_SIZE):
+        """A SearchPage of non-admin users, best match first"""
+        terms, pin_code = parse_query(query)
+        if not terms:
+            return SearchPage([], page, per_page, 0)
+        self.ensure_installed()
+        offset = (page - 1) * per_page
+
+        if self._backend == 'fts':
+            matched = self.fts_users(query)
+            total = db.session.scalar(select(func.count()).select_from(matched.order_by(None).subquery()))
+            items = db.session.scalars(matched.limit(per_page).offset(offset)).all()
+            return SearchPage(items, page, per_page, total)
+
+        with self._lock:
+            user_ids = self._users.search(terms, pin_code)
+        page_ids = user_ids[offset:offset + per_page]
+        found = {user.id: user for user in User.query.filter(User.id.in_(page_ids))} if page_ids else {}
+        return SearchPage([found[user_id] for user_id in page_ids if user_id in found], page, per_page, len(user_ids))
+
+
+search_index = SearchIndex()
+
+
+@event.listens_for(ParkingLot, 'after_insert')
+@event.listens_for(ParkingLot, 'after_update')
+def _lot_saved(mapper, connection, lot):
+    search_index.on_lot_change(lot)
+
+
+@event.listens_for(ParkingLot, 'after_delete')
+def _lot_deleted(mapper, connection, lot):
+    search_index.on_lot_change(lot, deleted=True)
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_update')
+def _user_saved(mapper, connection, user):
+    search_index.on_user_change(user)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, user):
+    search_index.on_user_change(user, deleted=True)
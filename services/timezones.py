@@ -0,0 +1,77 @@
+from datetime import datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from flask import current_app, has_app_context
+
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """The ZoneInfo for an IANA zone name, looked up once per process"""
+    return ZoneInfo(name)
+
+
+def display_zone():
+    """The zone datetimes are shown in (DISPLAY_TIMEZONE)"""
+    name = current_app.config.get('DISPLAY_TIMEZONE', DEFAULT_TIMEZONE) if has_app_context() else DEFAULT_TIMEZONE
+    return get_zone(name)
+
+
+def to_local(value, zone=None):
+    """A stored datetime (naive UTC) as an aware datetime in the display zone"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(zone or display_zone())
+
+
+def day_offset(zone, day):
+    """The zone's UTC offset throughout a UTC day, or None if it changes that day"""
+    start = datetime.combine(day, time.min, timezone.utc)
+    first = start.astimezone(zone).utcoffset()
+    last = (start + timedelta(days=1)).astimezone(zone).utcoffset()
+    return first if first == last else None
+
+
+def to_local_many(values, zone=None):
+    """to_local over a list of naive UTC datetimes, e.g. one column of a page of rows.
+
+    The zone's offset is worked out once per UTC day; values on a day
+    without a DST transition are just shifted by it.
+    """
+    zone = zone or display_zone()
+    offsets = {}
+    result = []
+    for value in values:
+        if value is None or value.tzinfo is not None:
+            result.append(to_local(value, zone))
+            continue
+        day = value.date()
+        if day not in offsets:
+            offsets[day] = day_offset(zone, day)
+        offset = offsets[day]
+        if offset is None:
+            result.append(to_local(value, zone))
+        else:
+            result.append((value + offset).replace(tzinfo=zone))
+    return result
+
+
+def init_app(app):
+    """Register the ``localtime`` template filter for app's DISPLAY_TIMEZONE.
+
+    ``{{ reservation.parking_time|localtime('%d/%m/%Y %H:%M') }}`` formats a
+    stored UTC datetime in the display zone; values already converted with
+    to_local_many are only formatted, and None renders as ''.
+    """
+    zone = get_zone(app.config.get('DISPLAY_TIMEZONE', DEFAULT_TIMEZONE))
+
+    @app.template_filter('localtime')
+    def localtime(value, fmt='%d/%m/%Y %H:%M'):
+        if value is None:
+            return ''
+        if value.tzinfo is not zone:
+            value = to_local(value, zone)
+        return value.strftime(fmt)
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models.database import db  # noqa: E402
+from models.parking import ParkingLot, ParkingSpot  # noqa: E402
+from models.user import User, create_admin_user  # noqa: E402
+from services.availability_cache import availability_cache  # noqa: E402
+from services.bookings import booking_index  # noqa: E402
+from services.identity import user_cache  # noqa: E402
+from services.occupancy import occupancy_index  # noqa: E402
+from services.search import search_index  # noqa: E402
+
+
+def forget_process_state():
+    """Drop what this process cached about the previous test's database"""
+    with occupancy_index._lock:
+        occupancy_index._lots = {}
+        occupancy_index._loaded = False
+    with booking_index._lock:
+        booking_index._lots = {}
+    with search_index._lock:
+        search_index._backend = None
+    availability_cache.invalidate()
+    user_cache.invalidate()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh SQLite database with the tables and the admin user (id 1)"""
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        # Tests reconcile explicitly; a thread would outlive the test's database
+        'OCCUPANCY_RECONCILE_SECONDS': 0,
+    })
+    with app.app_context():
+        db.create_all()
+        create_admin_user()
+    forget_process_state()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    forget_process_state()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.test_client(), 1)
+
+
+def add_lot(spots, lot_id=None, price=20.0):
+    """A lot with ``spots`` free spots numbered from 1; call inside an app context"""
+    lot = ParkingLot(id=lot_id, name=f'Lot {lot_id or ""}'.strip(), price=price, address='1 Main Road',
+                     pin_code='560001', max_spots=spots)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.add_all([ParkingSpot(lot_id=lot.id, spot_number=n, status='A') for n in range(1, spots + 1)])
+    db.session.commit()
+    return lot.id
+
+
+def add_user(n):
+    """User ``n`` (user{n}@example.com); call inside an app context"""
+    user = User(name=f'User {n}', email=f'user{n}@example.com', address='1 Main Road', pin_code='560001')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot
+
+pytest.importorskip('aiosqlite')
+h11 = pytest.importorskip('h11')
+
+
+def serve(asgi_app, path, headers=(), method='GET'):
+    """(status, headers, body) of one request through the ASGI app, checked by h11 as an ASGI server would"""
+    messages = []
+
+    async def receive():
+        if not messages:
+            messages.append(None)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected
+        await asyncio.Event().wait()
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http', 'path': path,
+        'root_path': '', 'query_string': b'', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+    asyncio.run(asgi_app(scope, receive, send))
+
+    connection = h11.Connection(h11.SERVER)
+    connection.receive_data(f'{method} {path} HTTP/1.1\r\nHost: testserver\r\n\r\n'.encode())
+    assert isinstance(connection.next_event(), h11.Request)
+    start = sent[0]
+    # uvicorn adds its own Date header to every response
+    connection.send(h11.Response(status_code=start['status'], headers=start['headers'] + [(b'date', b'now')]))
+    body = b''
+    for message in sent[1:]:
+        if message['body']:
+            connection.send(h11.Data(data=message['body']))
+            body += message['body']
+    connection.send(h11.EndOfMessage())
+    response_headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in start['headers']]
+    return start['status'], response_headers, body
+
+
+@pytest.fixture
+def asgi_app(app):
+    from asgi import AsgiApp
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from models.database import async_database_uri
+    with app.app_context():
+        db.session.add(ParkingLot(id=1, name='Lot 1', price=20.0, address='1 Main Road', pin_code='560001', max_spots=2))
+        db.session.add_all([ParkingSpot(lot_id=1, spot_number=n, status='A') for n in (1, 2)])
+        db.session.commit()
+    engine = create_async_engine(async_database_uri(app.config['SQLALCHEMY_DATABASE_URI']))
+    yield AsgiApp(app, engine)
+    asyncio.run(engine.dispose())
+
+
+def test_conditional_get_answers_304_without_a_body(asgi_app):
+    status, headers, body = serve(asgi_app, '/api/available-spots/1')
+    assert status == 200 and body
+    etag = dict(headers)['etag']
+
+    status, headers, body = serve(asgi_app, '/api/available-spots/1', [('If-None-Match', etag)])
+    assert status == 304
+    assert body == b''
+    names = [name.lower() for name, _ in headers]
+    assert 'content-length' not in names
+    # The server adds Date
+    assert 'date' not in names
+
+
+def test_head_sends_no_body(asgi_app):
+    status, headers, body = serve(asgi_app, '/api/available-spots/1', method='HEAD')
+    assert status == 200
+    assert body == b''
@@ -0,0 +1,69 @@
+from datetime import datetime, time
+
+import pytest
+
+from services import billing
+from services.billing import Tariff, price_batch, to_epoch
+
+HOUR = 3600
+DAY = 24 * HOUR
+# A Monday, midnight UTC
+MONDAY = to_epoch(datetime(2025, 1, 6))
+
+FLAT = Tariff(20.0)
+STEPPED = Tariff(20.0, increment_minutes=15, minimum_charge=10)
+CAPPED = Tariff(20.0, daily_cap=100)
+MORNING_PEAK = Tariff(20.0, peak_start=time(8), peak_end=time(10), peak_rate=50.0)
+OVERNIGHT = Tariff(10.0, peak_start=time(22), peak_end=time(6), peak_rate=40.0)
+OVERNIGHT_CAPPED = Tariff(10.0, daily_cap=150, peak_start=time(22), peak_end=time(6), peak_rate=40.0)
+
+# (tariff, start, end, local UTC offset, expected cost)
+STAYS = {
+    'flat': (FLAT, MONDAY, MONDAY + 90 * 60, 0, 30.0),
+    'increment rounds up': (STEPPED, MONDAY, MONDAY + 61 * 60, 0, 25.0),
+    'minimum charge': (STEPPED, MONDAY, MONDAY + 5 * 60, 0, 10.0),
+    'daily cap': (CAPPED, MONDAY, MONDAY + 10 * HOUR, 0, 100.0),
+    'cap per started day': (CAPPED, MONDAY, MONDAY + 30 * HOUR, 0, 200.0),
+    'enters the peak': (MORNING_PEAK, MONDAY + 7 * HOUR, MONDAY + 9 * HOUR, 0, 70.0),
+    'peak on both days': (MORNING_PEAK, MONDAY + 9 * HOUR, MONDAY + DAY + 9 * HOUR, 0, 22 * 20.0 + 2 * 50.0),
+    'peak in local time': (MORNING_PEAK, MONDAY + 2 * HOUR, MONDAY + 4 * HOUR, 6 * HOUR, 100.0),
+    'wrapping peak before midnight': (OVERNIGHT, MONDAY + 21 * HOUR, MONDAY + 23 * HOUR, 0, 50.0),
+    'wrapping peak across midnight': (OVERNIGHT, MONDAY + 23 * HOUR, MONDAY + DAY + 7 * HOUR, 0, 7 * 40.0 + 10.0),
+    'overnight capped': (OVERNIGHT_CAPPED, MONDAY + 20 * HOUR, MONDAY + DAY + 8 * HOUR, 0, 150.0),
+}
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def vectorized(request, monkeypatch):
+    """Runs a test with price_batch on NumPy (when installed) and on the pure Python path"""
+    if request.param == 'numpy':
+        if billing.np is None:
+            pytest.skip('NumPy is not installed')
+    else:
+        monkeypatch.setattr(billing, 'np', None)
+    return request.param
+
+
+@pytest.mark.parametrize('name', STAYS)
+def test_price_batch(vectorized, name):
+    tariff, start, end, offset, expected = STAYS[name]
+    assert price_batch({1: tariff}, [1], [start], [end], [offset]) == [expected]
+
+
+def test_price_batch_mixes_tariffs(vectorized):
+    tariffs = {lot_id: stay[0] for lot_id, stay in enumerate(STAYS.values(), start=1)}
+    lot_ids = list(tariffs)
+    starts, ends, offsets, expected = zip(*[stay[1:] for stay in STAYS.values()])
+    assert price_batch(tariffs, lot_ids, starts, ends, offsets) == list(expected)
+
+
+@pytest.mark.parametrize('name', STAYS)
+def test_single_stay_matches_the_batch(name):
+    tariff, start, end, offset, expected = STAYS[name]
+    assert billing._price(tariff, start, end, offset) == expected
+
+
+def test_price_uses_the_display_zone():
+    # 02:30-04:30 UTC is 08:00-10:00 in Asia/Kolkata, the default display zone
+    parking = datetime(2025, 1, 6, 2, 30)
+    assert MORNING_PEAK.price(parking, datetime(2025, 1, 6, 4, 30)) == 100.0
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from conftest import add_lot, add_user, login
+from models.database import db
+from models.parking import ParkingSpot, Reservation
+
+
+def book_soon(client, lot_id, minutes=10):
+    """Book the lot for two hours starting ``minutes`` from now, so check-in is already open"""
+    start = (datetime.utcnow() + timedelta(minutes=minutes)).replace(second=0, microsecond=0)
+    response = client.post('/api/bookings', json={
+        'lot_id': lot_id, 'vehicle_number': 'KA01 AB 1234',
+        'start': start.isoformat(), 'end': (start + timedelta(hours=2)).isoformat(),
+    })
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def walk_in(app, user_id, lot_id):
+    return login(app.test_client(), user_id).post(
+        '/user/reserve', data={'lot_id': lot_id, 'vehicle_number': 'KA02 CD 5678'})
+
+
+def test_walk_in_before_check_in_leaves_the_booked_spot(app):
+    with app.app_context():
+        lot_id = add_lot(2, lot_id=1)
+        booker, walker = add_user(1), add_user(2)
+    client = login(app.test_client(), booker)
+    booking = book_soon(client, lot_id)
+
+    assert walk_in(app, walker, lot_id).status_code == 302
+    with app.app_context():
+        walked_to = Reservation.query.filter_by(user_id=walker).one().spot_id
+    assert walked_to != booking['spot_id']
+
+    response = client.post(f'/api/bookings/{booking["id"]}/check-in')
+    assert response.status_code == 200
+    assert response.get_json()['reservation_id'] is not None
+    with app.app_context():
+        assert Reservation.query.filter_by(user_id=booker).one().spot_id == booking['spot_id']
+
+
+def test_walk_in_is_refused_when_only_booked_spots_are_free(app):
+    with app.app_context():
+        lot_id = add_lot(1, lot_id=1)
+        booker, walker = add_user(1), add_user(2)
+    book_soon(login(app.test_client(), booker), lot_id)
+
+    walk_in(app, walker, lot_id)
+    with app.app_context():
+        assert Reservation.query.filter_by(user_id=walker).count() == 0
+        assert db.session.get(ParkingSpot, 1).status == 'A'
+
+
+def test_booking_later_than_check_in_does_not_hold_the_spot(app):
+    with app.app_context():
+        lot_id = add_lot(1, lot_id=1)
+        booker, walker = add_user(1), add_user(2)
+    book_soon(login(app.test_client(), booker), lot_id, minutes=120)
+
+    walk_in(app, walker, lot_id)
+    with app.app_context():
+        assert Reservation.query.filter_by(user_id=walker).count() == 1
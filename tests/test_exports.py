@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from conftest import add_lot, add_user, login
+from models.database import db
+from models.parking import ParkingSpot, Reservation
+
+
+def test_lot_filter_pages_through_reservations_made_by_reserving(app, admin_client):
+    with app.app_context():
+        lot_id, other_lot = add_lot(3, lot_id=1), add_lot(1, lot_id=2)
+        users = [add_user(n) for n in range(1, 4)]
+    for user_id, lot in zip(users, (lot_id, other_lot, lot_id)):
+        login(app.test_client(), user_id).post('/user/reserve', data={'lot_id': lot, 'vehicle_number': 'KA01 AB 1234'})
+    with app.app_context():
+        assert {reservation.lot_id for reservation in Reservation.query} == {lot_id, other_lot}
+
+    first = admin_client.get(f'/api/reservations?lot_id={lot_id}&limit=1').get_json()
+    second = admin_client.get(f'/api/reservations?lot_id={lot_id}&limit=1&cursor={first["next_cursor"]}').get_json()
+    rows = first['reservations'] + second['reservations']
+    assert [row['user_id'] for row in rows] == [users[0], users[2]]
+    assert {row['lot_id'] for row in rows} == {lot_id}
+    assert second['next_cursor'] is None
+
+
+def test_lot_filter_finds_bulk_loaded_reservations_once_filled(app, admin_client):
+    from services.reservations import fill_reservation_lots
+    with app.app_context():
+        lot_id = add_lot(2, lot_id=1)
+        user_id = add_user(1)
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id).first()
+        parked = datetime.utcnow() - timedelta(hours=2)
+        db.session.execute(Reservation.__table__.insert(), [
+            {'spot_id': spot.id, 'user_id': user_id, 'vehicle_number': 'KA01 AB 1234', 'parking_time': parked,
+             'leaving_time': parked + timedelta(hours=1), 'parking_cost': 20.0, 'is_active': False},
+        ])
+        assert fill_reservation_lots() == 1
+        db.session.commit()
+
+    rows = admin_client.get(f'/api/reservations?lot_id={lot_id}').get_json()['reservations']
+    assert [row['user_id'] for row in rows] == [user_id]
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from conftest import add_lot, add_user, login
+from models.booking import Booking
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot, Reservation
+
+
+def test_delete_lot_without_history(app, admin_client):
+    with app.app_context():
+        lot_id = add_lot(3)
+
+    response = admin_client.post(f'/admin/parking-lot/{lot_id}/delete')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(ParkingLot, lot_id) is None
+        assert ParkingSpot.query.filter_by(lot_id=lot_id).count() == 0
+
+
+def test_delete_lot_with_reservation_history_is_refused(app, admin_client):
+    with app.app_context():
+        lot_id = add_lot(2)
+        user_id = add_user(1)
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id).first()
+        parked = datetime.utcnow() - timedelta(hours=3)
+        db.session.add(Reservation(spot_id=spot.id, user_id=user_id, vehicle_number='KA01 AB 1234',
+                                   parking_time=parked, leaving_time=parked + timedelta(hours=1),
+                                   parking_cost=20.0, is_active=False))
+        db.session.commit()
+
+    response = admin_client.post(f'/admin/parking-lot/{lot_id}/delete')
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.get(ParkingLot, lot_id) is not None
+        assert ParkingSpot.query.filter_by(lot_id=lot_id).count() == 2
+
+    # The user's history still renders
+    assert login(app.test_client(), user_id).get('/user/dashboard').status_code == 200
+
+
+def test_delete_lot_with_open_bookings_is_refused(app, admin_client):
+    with app.app_context():
+        lot_id = add_lot(2)
+        user_id = add_user(1)
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).first().id
+        start = datetime.utcnow() + timedelta(days=1)
+        db.session.add(Booking(spot_id=spot_id, user_id=user_id, vehicle_number='KA01 AB 1234',
+                               starts_at=start, ends_at=start + timedelta(hours=2)))
+        db.session.commit()
+
+    response = admin_client.post(f'/admin/parking-lot/{lot_id}/delete', follow_redirects=True)
+    assert 'it has open bookings' in response.get_data(as_text=True)
+    with app.app_context():
+        assert db.session.get(ParkingLot, lot_id) is not None
+        assert Booking.query.filter_by(spot_id=spot_id, status='B').count() == 1
+
+
+def test_delete_lot_drops_cancelled_bookings(app, admin_client):
+    with app.app_context():
+        lot_id = add_lot(1)
+        user_id = add_user(1)
+        spot = ParkingSpot.query.filter_by(lot_id=lot_id).first()
+        start = datetime.utcnow() + timedelta(days=1)
+        db.session.add(Booking(spot_id=spot.id, user_id=user_id, vehicle_number='KA01 AB 1234',
+                               starts_at=start, ends_at=start + timedelta(hours=2), status='C'))
+        db.session.commit()
+
+    admin_client.post(f'/admin/parking-lot/{lot_id}/delete')
+    with app.app_context():
+        assert db.session.get(ParkingLot, lot_id) is None
+        assert Booking.query.count() == 0
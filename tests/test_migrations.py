@@ -0,0 +1,98 @@
+import os
+
+import pytest
+import sqlalchemy as sa
+
+from app import create_app
+from models.database import db
+
+flask_migrate = pytest.importorskip('flask_migrate')
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# The schema databases had before any migration existed, as the original models created it: no indexes
+# beyond the unique email
+BASELINE_DDL = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        email VARCHAR(120) NOT NULL,
+        password_hash VARCHAR(256) NOT NULL,
+        address VARCHAR(200),
+        pin_code VARCHAR(20),
+        is_admin BOOLEAN,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (email)
+    )""",
+    """CREATE TABLE parking_lots (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        price FLOAT NOT NULL,
+        address VARCHAR(200) NOT NULL,
+        pin_code VARCHAR(20) NOT NULL,
+        max_spots INTEGER NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""",
+    """CREATE TABLE parking_spots (
+        id INTEGER NOT NULL,
+        lot_id INTEGER NOT NULL,
+        spot_number INTEGER NOT NULL,
+        status VARCHAR(1),
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(lot_id) REFERENCES parking_lots (id)
+    )""",
+    """CREATE TABLE reservations (
+        id INTEGER NOT NULL,
+        spot_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        vehicle_number VARCHAR(20) NOT NULL,
+        parking_time DATETIME,
+        leaving_time DATETIME,
+        parking_cost FLOAT,
+        is_active BOOLEAN,
+        PRIMARY KEY (id),
+        FOREIGN KEY(spot_id) REFERENCES parking_spots (id),
+        FOREIGN KEY(user_id) REFERENCES users (id)
+    )""",
+]
+
+
+def schema(engine):
+    """{table: (columns, index names)} of a database, leaving out Alembic's and the search index's tables"""
+    inspector = sa.inspect(engine)
+    return {
+        table: (
+            # Columns added by a migration come last, so compare them by name
+            sorted((column['name'], column['nullable']) for column in inspector.get_columns(table)),
+            sorted(index['name'] for index in inspector.get_indexes(table)),
+        )
+        for table in inspector.get_table_names()
+        if table != 'alembic_version' and '_fts' not in table
+    }
+
+
+def test_upgrade_brings_a_baseline_database_up_to_the_models(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "old.db"}'})
+    flask_migrate.Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for statement in BASELINE_DDL:
+                connection.exec_driver_sql(statement)
+        assert all(not indexes for _, indexes in schema(db.engine).values())
+
+        flask_migrate.upgrade()
+        migrated = schema(db.engine)
+        db.engine.dispose()
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            assert index.name in migrated[table.name][1], f'{index.name} was not created by the migrations'
+
+    fresh = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "new.db"}'})
+    with fresh.app_context():
+        db.create_all()
+        assert migrated == schema(db.engine)
+        db.engine.dispose()
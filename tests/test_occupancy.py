@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from conftest import add_lot, add_user, login
+from models.database import db
+from models.parking import ParkingSpot, Reservation
+from services.occupancy import occupancy_index
+
+
+def release_elsewhere(reservation_id):
+    """Free a reservation's spot the way another process would, without this worker's index knowing"""
+    reservation = db.session.get(Reservation, reservation_id)
+    reservation.is_active = False
+    reservation.leaving_time = datetime.utcnow()
+    db.session.get(ParkingSpot, reservation.spot_id).status = 'A'
+    db.session.commit()
+
+
+def test_lot_freed_by_another_process_is_offered_again(app):
+    with app.app_context():
+        lot_id = add_lot(1, lot_id=1)
+        parker, other = add_user(1), add_user(2)
+    response = login(app.test_client(), parker).post(
+        '/user/reserve', data={'lot_id': lot_id, 'vehicle_number': 'KA01 AB 1234'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert occupancy_index.available_lot_ids() == []
+        release_elsewhere(Reservation.query.filter_by(user_id=parker).one().id)
+
+    page = login(app.test_client(), other).get('/user/reserve').get_data(as_text=True)
+    assert 'Lot 1 - ' in page
+
+
+def test_reconcile_picks_up_spots_released_by_another_process(app):
+    with app.app_context():
+        lot_id = add_lot(2, lot_id=1)
+        user_id = add_user(1)
+    login(app.test_client(), user_id).post('/user/reserve', data={'lot_id': lot_id, 'vehicle_number': 'KA01 AB 1234'})
+    with app.app_context():
+        assert occupancy_index.counts(lot_id) == (1, 1)
+        assert occupancy_index.reconcile() == []
+
+        release_elsewhere(Reservation.query.filter_by(user_id=user_id).one().id)
+        assert occupancy_index.reconcile() == [lot_id]
+        assert occupancy_index.counts(lot_id) == (2, 0)
@@ -0,0 +1,56 @@
+"""SQL statement budget per admin/API page, independent of the number of lots.
+
+An N+1 query in a view or template shows up as a count that grows with LOTS.
+"""
+import pytest
+from sqlalchemy import event
+
+from models.database import db
+from models.parking import ParkingLot, ParkingSpot
+
+LOTS = 1000
+SPOTS = 5
+# Maximum statements per request, including the flask_login user lookup
+BUDGETS = {
+    '/admin/dashboard': 8,
+    '/admin/parking-lots': 8,
+    '/admin/parking-spots/1': 8,
+    '/admin/users': 8,
+    '/admin/summary': 8,
+    '/api/parking-stats': 8,
+    '/api/analytics/utilization': 8,
+}
+
+
+@pytest.fixture
+def seeded(app):
+    with app.app_context():
+        db.session.execute(ParkingLot.__table__.insert(), [
+            {'id': i, 'name': f'Lot {i}', 'price': 20.0, 'address': f'{i} Main Road',
+             'pin_code': '560001', 'max_spots': SPOTS}
+            for i in range(1, LOTS + 1)
+        ])
+        db.session.execute(ParkingSpot.__table__.insert(), [
+            {'lot_id': lot_id, 'spot_number': n, 'status': 'O' if n % 3 == 0 else 'A'}
+            for lot_id in range(1, LOTS + 1) for n in range(1, SPOTS + 1)
+        ])
+        db.session.commit()
+    return app
+
+
+@pytest.mark.parametrize('url, budget', BUDGETS.items())
+def test_statement_budget(seeded, admin_client, url, budget):
+    with seeded.app_context():
+        engine = db.engine
+    statements = []
+
+    def count(*args, **kwargs):
+        statements.append(args[2])
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = admin_client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    assert len(statements) <= budget, '\n'.join(statements)
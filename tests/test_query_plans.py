@@ -0,0 +1,15 @@
+from services import query_audit
+
+
+def flagged(app):
+    with app.app_context():
+        return {result['name'] for result in query_audit.audit_query_plans() if result['flagged']}
+
+
+def test_audited_queries_use_indexes(app):
+    assert flagged(app) == set()
+
+
+def test_audit_flags_an_unexpected_sort(app, monkeypatch):
+    monkeypatch.setattr(query_audit, 'SORTS_EXPECTED', set())
+    assert 'api.analytics_utilization: occupancy months' in flagged(app)